@@ -13,6 +13,46 @@ class Settings(BaseSettings):
     EMBEDDING_NAME: str = os.getenv("EMBEDDING_NAME", "default_ambeddings")
     LLM_NAME: str = os.getenv("LLM_NAME", "default_LLM")
     MONGO_DB_KEY: str = os.getenv("MONGO_DB_KEY", "default_MONGO_DB_KEY")
+    VECTOR_STORE: str = os.getenv("VECTOR_STORE", "pinecone")  # pinecone or local
+    LOCAL_STORE_PATH: str = os.getenv("LOCAL_STORE_PATH", "local_store")
+    EMBEDDING_CACHE_PATH: str = os.getenv(
+        "EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite"
+    )
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = int(
+        os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", 1024)
+    )
+    EMBEDDING_CACHE_MAX_MB: int = int(os.getenv("EMBEDDING_CACHE_MAX_MB", 256))
+    ANSWER_CACHE_SIMILARITY: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+    ANSWER_CACHE_TTL: float = float(os.getenv("ANSWER_CACHE_TTL", 3600))
+    ANSWER_CACHE_MAX_ITEMS: int = int(os.getenv("ANSWER_CACHE_MAX_ITEMS", 1000))
+    STREAM_FLUSH_BYTES: int = int(os.getenv("STREAM_FLUSH_BYTES", 64))
+    STREAM_FLUSH_INTERVAL: float = float(os.getenv("STREAM_FLUSH_INTERVAL", 0.05))
+    RETRIEVAL_FILTERS: bool = os.getenv("RETRIEVAL_FILTERS", "false").lower() == "true"
+    CHAT_HISTORY_WRITE_BEHIND: bool = (
+        os.getenv("CHAT_HISTORY_WRITE_BEHIND", "false").lower() == "true"
+    )
+    CHAT_HISTORY_FLUSH_TURNS: int = int(os.getenv("CHAT_HISTORY_FLUSH_TURNS", 500))
+    CHAT_HISTORY_FLUSH_INTERVAL: float = float(
+        os.getenv("CHAT_HISTORY_FLUSH_INTERVAL", 0.05)
+    )
+    SUMMARY_ENABLED: bool = os.getenv("SUMMARY_ENABLED", "true").lower() == "true"
+    SUMMARY_LLM_NAME: str = os.getenv("SUMMARY_LLM_NAME", "gpt-3.5-turbo")
+    SUMMARY_THRESHOLD_TOKENS: int = int(os.getenv("SUMMARY_THRESHOLD_TOKENS", 1000))
+    SUMMARY_KEEP_TURNS: int = int(os.getenv("SUMMARY_KEEP_TURNS", 1))
+    THUMBNAIL_CACHE_PATH: str = os.getenv("THUMBNAIL_CACHE_PATH", "cache/thumbnails")
+    THUMBNAIL_SOURCE_DIR: str = os.getenv("THUMBNAIL_SOURCE_DIR", "")
+    THUMBNAIL_ALLOWED_HOSTS: str = os.getenv("THUMBNAIL_ALLOWED_HOSTS", "i.pinimg.com")
+    THUMBNAIL_CACHE_MAX_MB: int = int(os.getenv("THUMBNAIL_CACHE_MAX_MB", 512))
+    FAST_PATH_ENABLED: bool = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+    FAST_PATH_MARGIN: float = float(os.getenv("FAST_PATH_MARGIN", 0.02))
+    SEARCH_CACHE_TTL: float = float(os.getenv("SEARCH_CACHE_TTL", 3600))
+    SEARCH_CACHE_MAX_ITEMS: int = int(os.getenv("SEARCH_CACHE_MAX_ITEMS", 1000))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", 4))
+    BATCH_ITEM_TIMEOUT: float = float(os.getenv("BATCH_ITEM_TIMEOUT", 120))
+    BATCH_MAX_QUERIES: int = int(os.getenv("BATCH_MAX_QUERIES", 1000))
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", 20))
+    RERANK_TOP_K: int = int(os.getenv("RERANK_TOP_K", 4))
 
 
 # Instantiate settings to be imported by other modules
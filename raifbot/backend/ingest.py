@@ -0,0 +1,424 @@
+"""
+Loads the Pinterest fashion catalog into the configured vector store.
+
+Usage (from the raifbot directory):
+    python -m backend.ingest ../research/data/pinterest-fashion-dataset_preprocessed.csv
+
+The CSV is streamed, embedded in batches by concurrent workers and upserted in order. After each upserted batch
+a checkpoint is written, so a crashed run resumes with the first batch that was not stored yet.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from backend.config import settings
+from backend.utils.catalog import NEGATIVE_SOURCE
+from backend.utils.catalog import NEGATIVE_TEXTS
+from backend.utils.catalog import product_document
+
+Document = Tuple[str, str, dict]  # id, text, metadata
+
+
+def document_id(text: str) -> str:
+    """
+    Derives a stable document id from the document text, so re-ingesting a document overwrites it.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def read_documents(csv_path: str) -> Iterator[Document]:
+    """
+    Streams the product documents of the catalog followed by the off-topic documents.
+
+    Args:
+        csv_path (str): Path to `pinterest-fashion-dataset_preprocessed.csv`.
+
+    Yields:
+        tuple: The document id, text and metadata.
+
+    Like the Upload_to_VectorDB notebook, rows producing the same text are stored once with the shortest image URL.
+    The first pass only remembers that URL per text hash, the second pass builds the documents.
+    """
+    shortest = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            text, metadata = product_document(row)
+            key = document_id(text)
+            if key not in shortest or len(metadata["source"]) < len(shortest[key]):
+                shortest[key] = metadata["source"]
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            text, metadata = product_document(row)
+            key = document_id(text)
+            source = shortest.pop(key, None)
+            if source is None:
+                continue
+            metadata["source"] = source
+            yield key, text, metadata
+
+    for text in NEGATIVE_TEXTS:
+        yield document_id(text), text, {"source": NEGATIVE_SOURCE}
+
+
+def batched(documents: Iterator[Document], size: int) -> Iterator[List[Document]]:
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@dataclass
+class StageStats:
+    """
+    Throughput of one stage of the pipeline. `seconds` is the time during which at least one batch was in the
+    stage, so concurrent batches are not counted twice.
+    """
+
+    docs: int = 0
+    tokens: int = 0
+    seconds: float = 0.0
+    _active: int = field(default=0, repr=False)
+    _since: float = field(default=0.0, repr=False)
+
+    def enter(self) -> None:
+        if self._active == 0:
+            self._since = time.perf_counter()
+        self._active += 1
+
+    def exit(self, docs: int, tokens: int) -> None:
+        self._active -= 1
+        if self._active == 0:
+            self.seconds += time.perf_counter() - self._since
+        self.docs += docs
+        self.tokens += tokens
+
+    def report(self) -> str:
+        seconds = self.seconds or float("nan")
+        return (
+            f"{self.docs} docs, {self.tokens} tokens in {self.seconds:.1f}s "
+            f"({self.docs / seconds:.1f} docs/s, {self.tokens / seconds:.0f} tokens/s)"
+        )
+
+
+class TokenRateLimiter:
+    """
+    A token bucket keeping the embedding requests under a tokens per minute limit of the provider.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.available = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int) -> None:
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(
+                    self.capacity,
+                    self.available + (now - self.updated) * self.capacity / 60,
+                )
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                await asyncio.sleep((tokens - self.available) * 60 / self.capacity)
+
+
+class Checkpoint:
+    """
+    Number of batches already stored, saved as JSON together with the parameters of the run. A checkpoint of a
+    run with a different input, store or batch size is ignored.
+    """
+
+    def __init__(self, path: str, run: dict):
+        self.path = path
+        self.run = run
+
+    def load(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state["batches"] if state.get("run") == self.run else 0
+
+    def save(self, batches: int) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"run": self.run, "batches": batches}, f)
+        os.replace(tmp, self.path)
+
+
+async def embed_with_retry(
+    embeddings: object,
+    texts: List[str],
+    max_retries: int = 6,
+    backoff: float = 1.0,
+) -> List[List[float]]:
+    """
+    Embeds a batch, retrying failed requests (typically HTTP 429 rate limit errors) with exponential backoff and jitter.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await embeddings.aembed_documents(texts)
+        except Exception:
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(backoff * 2**attempt * (1 + random.random()))
+
+
+async def ingest(
+    documents: Iterator[Document],
+    embeddings: object,
+    upsert: Callable[[List[Document], List[List[float]]], None],
+    checkpoint: Optional[Checkpoint] = None,
+    batch_size: int = 256,
+    concurrency: int = 4,
+    tokens_per_minute: Optional[int] = None,
+    count_tokens: Optional[Callable[[str], int]] = None,
+    log: Callable[[str], None] = print,
+) -> dict:
+    """
+    Embeds and stores documents in batches.
+
+    Args:
+        documents (Iterator): The documents as (id, text, metadata) tuples.
+        embeddings (object): The embeddings model, its `aembed_documents` is called once per batch.
+        upsert (Callable): Stores a batch of documents with their vectors, called in the order of the batches.
+        checkpoint (Checkpoint, optional): Progress of the run, batches stored by a previous run are skipped.
+        batch_size (int): Number of documents per embedding request and upsert.
+        concurrency (int): Maximum number of batches being embedded at the same time.
+        tokens_per_minute (int, optional): Token rate limit of the embedding provider.
+        count_tokens (Callable, optional): Counts the tokens of a text, tiktoken `cl100k_base` by default.
+        log (Callable): Receives the progress lines.
+
+    Returns:
+        dict: Throughput statistics per stage ("read", "embed", "upsert").
+    """
+    if count_tokens is None:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("cl100k_base")
+        count_tokens = lambda text: len(encoding.encode(text))
+    limiter = TokenRateLimiter(tokens_per_minute) if tokens_per_minute else None
+    stats = {"read": StageStats(), "embed": StageStats(), "upsert": StageStats()}
+    skip = checkpoint.load() if checkpoint else 0
+    if skip:
+        log(f"Resuming after {skip} stored batches")
+
+    async def embed(batch: List[Document], tokens: int) -> List[List[float]]:
+        if limiter:
+            await limiter.acquire(tokens)
+        stats["embed"].enter()
+        try:
+            return await embed_with_retry(embeddings, [text for _, text, _ in batch])
+        finally:
+            stats["embed"].exit(len(batch), tokens)
+
+    in_flight = {}
+    committed = skip
+
+    async def commit_next() -> None:
+        nonlocal committed
+        batch, tokens, task = in_flight.pop(committed)
+        vectors = await task
+        stats["upsert"].enter()
+        await asyncio.to_thread(upsert, batch, vectors)
+        stats["upsert"].exit(len(batch), tokens)
+        committed += 1
+        if checkpoint:
+            checkpoint.save(committed)
+        log(f"Batch {committed}: {stats['upsert'].docs} docs stored")
+
+    batches = batched(documents, batch_size)
+    try:
+        for _ in range(skip):
+            next(batches, None)
+        index = skip
+        while True:
+            stats["read"].enter()
+            batch = next(batches, None)
+            tokens = sum(count_tokens(text) for _, text, _ in batch or [])
+            stats["read"].exit(len(batch or []), tokens)
+            if batch is None:
+                break
+            in_flight[index] = (
+                batch,
+                tokens,
+                asyncio.create_task(embed(batch, tokens)),
+            )
+            index += 1
+            if len(in_flight) >= concurrency:
+                await commit_next()
+        while in_flight:
+            await commit_next()
+    finally:
+        for _, _, task in in_flight.values():
+            task.cancel()
+
+    for name, stage in stats.items():
+        log(f"{name}: {stage.report()}")
+    return stats
+
+
+def local_upsert(path: str, embeddings: object):
+    """
+    Returns an upsert into the local vector store. Documents already stored, e.g. by a run which crashed before
+    saving its checkpoint, are skipped.
+    """
+    from backend.utils.local_vector_store import LocalVectorStore
+
+    store = LocalVectorStore(path, embeddings)
+    stored = set(store.ids)
+
+    def upsert(batch: List[Document], vectors: List[List[float]]) -> None:
+        new = [
+            (document, vector)
+            for document, vector in zip(batch, vectors)
+            if document[0] not in stored
+        ]
+        if new:
+            store.add_vectors(
+                [text for (_, text, _), _ in new],
+                [vector for _, vector in new],
+                metadatas=[metadata for (_, _, metadata), _ in new],
+                ids=[id_ for (id_, _, _), _ in new],
+            )
+            stored.update(id_ for (id_, _, _), _ in new)
+
+    return upsert
+
+
+def pinecone_upsert(index_name: str):
+    """
+    Returns an upsert into the Pinecone index. The text is stored under the "text" metadata key read by the
+    langchain Pinecone vector store.
+
+    The index is opened with the first embedded batch: a missing index is created with the cosine metric and the
+    dimension of the vectors, so it fits the configured embedding model. An existing index of another dimension
+    is an error.
+    """
+    import pinecone
+
+    pinecone.init(api_key=settings.PINECONE_API_KEY, environment=settings.PINECONE_ENV)
+    index = None
+
+    def open_index(dimension: int):
+        if index_name not in pinecone.list_indexes():
+            pinecone.create_index(name=index_name, dimension=dimension, metric="cosine")
+        elif pinecone.describe_index(index_name).dimension != dimension:
+            raise ValueError(
+                f"The Pinecone index {index_name} doesn't have the dimension {dimension} of the embeddings"
+            )
+        return pinecone.Index(index_name)
+
+    def upsert(batch: List[Document], vectors: List[List[float]]) -> None:
+        nonlocal index
+        if index is None:
+            index = open_index(len(vectors[0]))
+        index.upsert(
+            vectors=[
+                (id_, vector, {**metadata, "text": text})
+                for (id_, text, metadata), vector in zip(batch, vectors)
+            ],
+            batch_size=100,
+        )
+
+    return upsert
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Embeds the Pinterest fashion catalog into the configured vector store."
+    )
+    parser.add_argument("csv_path", help="Path to the preprocessed dataset CSV.")
+    parser.add_argument(
+        "--store", default=settings.VECTOR_STORE, choices=["pinecone", "local"]
+    )
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tokens-per-minute", type=int, default=None)
+    parser.add_argument("--checkpoint", default="cache/ingest_checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint.")
+    parser.add_argument(
+        "--thumbnails",
+        action="store_true",
+        help="Also create the product thumbnails served by the backend.",
+    )
+    args = parser.parse_args(argv)
+
+    from langchain_openai import OpenAIEmbeddings
+
+    embeddings = OpenAIEmbeddings(
+        model=settings.EMBEDDING_NAME, openai_api_key=settings.OPENAI_API_KEY
+    )
+    if args.store == "local":
+        target = os.path.abspath(settings.LOCAL_STORE_PATH)
+        upsert = local_upsert(settings.LOCAL_STORE_PATH, embeddings)
+    else:
+        target = settings.INDEX_NAME
+        upsert = pinecone_upsert(settings.INDEX_NAME)
+
+    checkpoint = Checkpoint(
+        args.checkpoint,
+        {
+            "csv": os.path.abspath(args.csv_path),
+            "store": args.store,
+            "target": target,
+            "embeddings": settings.EMBEDDING_NAME,
+            "batch_size": args.batch_size,
+        },
+    )
+    if args.restart:
+        checkpoint.save(0)
+
+    asyncio.run(
+        ingest(
+            read_documents(args.csv_path),
+            embeddings,
+            upsert,
+            checkpoint=checkpoint,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            tokens_per_minute=args.tokens_per_minute,
+        )
+    )
+
+    if args.thumbnails:
+        from backend.utils.thumbnail_cache import ThumbnailCache
+        from backend.utils.thumbnail_cache import create_fetcher
+        from backend.utils.thumbnail_cache import warm_thumbnails
+
+        cache = ThumbnailCache(
+            settings.THUMBNAIL_CACHE_PATH,
+            create_fetcher(
+                settings.THUMBNAIL_SOURCE_DIR, settings.THUMBNAIL_ALLOWED_HOSTS
+            ),
+        )
+        urls = [
+            metadata["source"]
+            for _, _, metadata in read_documents(args.csv_path)
+            if metadata["source"] != NEGATIVE_SOURCE
+        ]
+        failed = asyncio.run(warm_thumbnails(cache, urls))
+        print(f"Thumbnails: {len(urls) - failed} created, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
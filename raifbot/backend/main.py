@@ -1,6 +1,10 @@
 from fastapi import FastAPI
 from backend.routers.generation import router as chat_router
 from backend.routers.chat_history import router as chat_history_router
+from backend.routers.assets import router as assets_router
+from backend.routers.metrics import router as metrics_router
+from backend.utils.metrics import MetricsMiddleware
+from backend.utils.readiness import readiness
 
 app = FastAPI(
     title="Raiffeisen bank interview RAG chatbot",
@@ -11,3 +15,8 @@ app = FastAPI(
 
 app.include_router(chat_router, tags=["generation"])
 app.include_router(chat_history_router, tags=["mongo_db"])
+app.include_router(assets_router, tags=["assets"])
+app.include_router(metrics_router, tags=["metrics"])
+app.add_middleware(MetricsMiddleware)
+# background initializations still running are cancelled on shutdown
+app.add_event_handler("shutdown", readiness.close)
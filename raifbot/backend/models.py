@@ -1,14 +1,24 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 
 class ChatHistoryResponse(BaseModel):
     chat_history: List[List[str]]
+    total: Optional[int] = None
+    token_counts: Optional[List[int]] = None
+    summary: Optional[str] = None
+    summarized: Optional[int] = None
 
 
 class Query(BaseModel):
     text: str
 
 
+class BatchQuery(BaseModel):
+    queries: List[str]
+    concurrency: Optional[int] = None
+    timeout: Optional[float] = None
+
+
 class MessageResponse(BaseModel):
     message: str
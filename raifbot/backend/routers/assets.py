@@ -0,0 +1,64 @@
+from fastapi import APIRouter
+from fastapi import HTTPException
+from fastapi import Query
+from fastapi import Request
+from fastapi.responses import Response
+from backend.config import settings
+from backend.utils.thumbnail_cache import FORMATS
+from backend.utils.thumbnail_cache import ThumbnailCache
+from backend.utils.thumbnail_cache import create_fetcher
+import logging
+
+router = APIRouter()
+thumbnails = None
+
+
+def get_thumbnail_cache():
+    """
+    Returns the thumbnail store, created on first use.
+    """
+    global thumbnails
+    if thumbnails is None:
+        thumbnails = ThumbnailCache(
+            settings.THUMBNAIL_CACHE_PATH,
+            create_fetcher(
+                settings.THUMBNAIL_SOURCE_DIR, settings.THUMBNAIL_ALLOWED_HOSTS
+            ),
+            max_bytes=settings.THUMBNAIL_CACHE_MAX_MB * 1024**2,
+        )
+    return thumbnails
+
+
+@router.get("/thumbnail")
+async def get_thumbnail(
+    request: Request,
+    url: str,
+    width: int = Query(150, ge=16, le=1024),
+    format: str = Query("webp", pattern="^(webp|jpeg)$"),
+):
+    """
+    Serves a resized product image from the local thumbnail store.
+
+    Args:
+        url (str): URL of the original product image.
+        width (int): Width of the thumbnail in pixels, rounded up to the next stored width.
+        format (str): "webp" or "jpeg".
+
+    Returns:
+        Response: The thumbnail with immutable cache headers, or 304 if the client already has it.
+
+    Raises:
+        HTTPException: If the original image can't be fetched or decoded.
+    """
+    try:
+        key, data = await get_thumbnail_cache().get(url, width, format)
+    except Exception as e:
+        msg = f"Unexpected error during creating thumbnail of {url}: {str(e)}"
+        logging.error(msg)
+        raise HTTPException(status_code=502, detail=msg)
+
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=FORMATS[format][1], headers=headers)
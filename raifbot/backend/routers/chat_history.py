@@ -1,24 +1,36 @@
 from fastapi import APIRouter
 from fastapi import HTTPException
-from typing import List
+from fastapi import Query
+from typing import Dict, List, Optional
 from backend.models import ChatHistoryResponse
 from backend.models import MessageResponse
 from backend.utils.dependencies_chat_history import update_or_insert_chat_history
+from backend.utils.dependencies_chat_history import bulk_update_chat_histories
 from backend.utils.dependencies_chat_history import get_chat_history_item
 from backend.utils.dependencies_chat_history import delete_chat_history_item
 from backend.utils.dependencies_chat_history import delete_whole_chat_history
+from backend.utils.chat_history_writer import ChatHistoryWriter
+from backend.utils.history_summary import SummaryScheduler
+from backend.utils.history_summary import update_summary
 from backend.utils.error_handler import UpdateError
+from backend.utils.metrics import InstrumentedCollection
+from backend.utils.readiness import readiness
+from backend.config import settings
+from langchain_openai import ChatOpenAI
 import logging
 from backend.mongo_db import database
 
 router = APIRouter()
+writer = None
+summaries = None
 
 
 def init_mongo_DB():
     """
     Initializes the MongoDB connection for chat history storage.
 
-    This function sets up a global variable `db` which holds the chat history collection from the database.
+    This function sets up a global variable `db` which holds the chat history collection from the database,
+    wrapped so the durations of its operations are exposed on /metrics.
 
     Raises:
         HTTPException: If there is an unexpected error during database initialization.
@@ -26,7 +38,7 @@ def init_mongo_DB():
     global db
 
     try:
-        db = database.chat_history_collection
+        db = InstrumentedCollection(database.chat_history_collection)
     except Exception as e:
         msg = f"Unexpected error during database initialization: {str(e)}"
         logging.error(msg)
@@ -36,6 +48,86 @@ def init_mongo_DB():
 router.add_event_handler("startup", init_mongo_DB)
 
 
+async def ping_mongo_DB():
+    """
+    Pings MongoDB in the background, which opens the connection pool before the first request.
+    """
+    readiness.start("mongo", lambda: database.command("ping"))
+
+
+router.add_event_handler("startup", ping_mongo_DB)
+
+
+async def start_writer():
+    """
+    Starts the write-behind queue of chat history saves if it is enabled.
+    """
+    global writer
+    if settings.CHAT_HISTORY_WRITE_BEHIND:
+        writer = ChatHistoryWriter(
+            db,
+            max_batch=settings.CHAT_HISTORY_FLUSH_TURNS,
+            flush_interval=settings.CHAT_HISTORY_FLUSH_INTERVAL,
+        )
+        writer.start()
+
+
+async def stop_writer():
+    """
+    Flushes the queued chat history saves on shutdown.
+    """
+    global writer
+    if writer is not None:
+        await writer.close()
+        writer = None
+
+
+async def summarize_session(session_id: str):
+    """
+    Updates the rolling summary of a session with the cheap summary model.
+    """
+    if writer is not None and writer.pending(session_id):
+        await writer.flush()
+    llm = ChatOpenAI(
+        openai_api_key=settings.OPENAI_API_KEY,
+        model_name=settings.SUMMARY_LLM_NAME,
+        temperature=0,
+    )
+    await update_summary(
+        db,
+        session_id,
+        llm,
+        threshold_tokens=settings.SUMMARY_THRESHOLD_TOKENS,
+        keep_turns=settings.SUMMARY_KEEP_TURNS,
+    )
+
+
+async def start_summaries():
+    """
+    Starts the background updates of the rolling summaries if they are enabled.
+    """
+    global summaries
+    if settings.SUMMARY_ENABLED:
+        summaries = SummaryScheduler(summarize_session)
+
+
+async def stop_summaries():
+    """
+    Waits for the running summary updates on shutdown.
+    """
+    global summaries
+    if summaries is not None:
+        await summaries.close(timeout=30)
+        summaries = None
+
+
+router.add_event_handler("startup", start_writer)
+router.add_event_handler("startup", start_summaries)
+# summaries are stopped first, so a running update can still flush the writer
+router.add_event_handler("shutdown", stop_summaries)
+router.add_event_handler("shutdown", stop_writer)
+
+
 @router.post("/save_chat_history/{session_id}", response_model=MessageResponse)
 async def save_chat_history(session_id: str, history_items: List[List[str]]):
     """
@@ -48,12 +140,22 @@ async def save_chat_history(session_id: str, history_items: List[List[str]]):
     Returns:
         MessageResponse: A response indicating the success of the operation.
 
+    With the write-behind queue enabled, the items are acknowledged once queued and written by the next bulk flush.
+    The rolling summary of the session is updated in the background afterwards.
+
     Raises:
         HTTPException: If there's an error during the update/insert of chat history.
     """
     global db
     try:
-        return await update_or_insert_chat_history(db, session_id, history_items)
+        if writer is not None:
+            writer.put(session_id, history_items)
+            message = {"message": "Chat history successfully queued."}
+        else:
+            message = await update_or_insert_chat_history(db, session_id, history_items)
+        if summaries is not None:
+            summaries.schedule(session_id)
+        return message
 
     except UpdateError as e:
         raise HTTPException(status_code=e.status_code, detail=e.message)
@@ -63,23 +165,69 @@ async def save_chat_history(session_id: str, history_items: List[List[str]]):
         raise HTTPException(status_code=500, detail=msg)
 
 
+@router.post("/save_chat_histories", response_model=MessageResponse)
+async def save_chat_histories(histories: Dict[str, List[List[str]]]):
+    """
+    Saves new chat history items of several sessions at once.
+
+    Args:
+        histories (Dict[str, List[List[str]]]): Chat history items to be appended, per session ID.
+
+    Returns:
+        MessageResponse: A response indicating the success of the operation.
+
+    The items of all sessions are written with one bulk write (or queued, with the write-behind queue enabled).
+
+    Raises:
+        HTTPException: If there's an error during the update/insert of chat histories.
+    """
+    global db
+    try:
+        if writer is not None:
+            for session_id, history_items in histories.items():
+                writer.put(session_id, history_items)
+            message = {"message": "Chat histories successfully queued."}
+        else:
+            message = await bulk_update_chat_histories(db, histories)
+        if summaries is not None:
+            for session_id in histories:
+                summaries.schedule(session_id)
+        return message
+
+    except UpdateError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    except Exception as e:
+        msg = f"Unexpected error during update/insert of chat histories: {str(e)}"
+        logging.error(msg)
+        raise HTTPException(status_code=500, detail=msg)
+
+
 @router.get("/get_chat_history/{session_id}", response_model=ChatHistoryResponse)
-async def get_chat_history(session_id: str):
+async def get_chat_history(
+    session_id: str,
+    last: Optional[int] = Query(None, ge=1),
+    before: Optional[int] = Query(None, ge=0),
+):
     """
     Retrieves the chat history for a specific session.
 
     Args:
         session_id (str): The unique identifier for the chat session.
+        last (int, optional): Number of most recent turns to return. All turns are returned if not provided.
+        before (int, optional): Cursor for paging backwards, only turns with an index lower than `before` are returned.
 
     Returns:
-        ChatHistoryResponse: The chat history associated with the given session.
+        ChatHistoryResponse: The requested turns of the chat history and the total number of turns.
 
     Raises:
         HTTPException: If there's an error during the retrieval of chat history.
     """
     global db
     try:
-        return await get_chat_history_item(db, session_id)
+        # read your own writes
+        if writer is not None and writer.pending(session_id):
+            await writer.flush()
+        return await get_chat_history_item(db, session_id, last, before)
 
     except UpdateError as e:
         raise HTTPException(status_code=e.status_code, detail=e.message)
@@ -106,6 +254,8 @@ async def delete_chat_history(session_id: str):
     global db
     # Delete the chat history by session ID
     try:
+        if writer is not None:
+            await writer.discard(session_id)
         return await delete_chat_history_item(db, session_id)
 
     except UpdateError as e:
@@ -130,6 +280,8 @@ async def delete_all_chat_histories():
     global db
     # Very sensitive !
     try:
+        if writer is not None:
+            await writer.discard()
         return await delete_whole_chat_history(db)
 
     except UpdateError as e:
@@ -1,37 +1,89 @@
+from backend.models import BatchQuery
 from backend.models import Query
-from backend.utils.dependencies_generation import update_openai_api_key
+from backend.utils.dependencies_generation import openai_settings
+from backend.utils.dependencies_generation import probe_chain
 from backend.utils.dependencies_generation import setup_conversational_chain
 from backend.utils.dependencies_generation import get_source
+from backend.utils.dependencies_generation import warm_up
 from backend.utils.error_handler import UpdateError
 from backend.utils.callback_handler_agent import AsyncCallbackHandler
 from backend.utils.callback_handler_agent import create_gen
 from backend.utils.callback_handler_agent import run_call_no_stream
+from backend.utils.callback_handler_agent import create_event_gen
+from backend.utils.callback_handler_agent import create_sse_gen
+from backend.utils.answer_cache import AnswerCache
+from backend.utils.answer_cache import record_answer
+from backend.utils.answer_cache import replay_answer
+from backend.utils.answer_cache import record_events
+from backend.utils.answer_cache import replay_events
+from backend.utils.search_cache import get_search_cache
+from backend.utils.stream_fanout import StreamFanout
+from backend.utils.stream_fanout import fanout_key
+from backend.utils.chain_manager import ChainManager
+from backend.utils.batch_chat import BatchLimiter
+from backend.utils.batch_chat import run_batch
+from backend.utils.readiness import readiness
 from fastapi import APIRouter, HTTPException, Body
 from backend.config import settings
 from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
 from fastapi.responses import StreamingResponse
 import logging
+import json
 
 
 load_dotenv()
 
 router = APIRouter()
 
+answer_cache = AnswerCache(
+    None,
+    similarity=settings.ANSWER_CACHE_SIMILARITY,
+    ttl=settings.ANSWER_CACHE_TTL,
+    max_items=settings.ANSWER_CACHE_MAX_ITEMS,
+)
+# identical /chat requests in flight at the same time share one agent run
+fanout = StreamFanout()
+# batch items of all /chat_batch requests of the worker share this limit, interactive requests aren't limited
+batch_limiter = BatchLimiter(settings.BATCH_MAX_CONCURRENCY)
+
+
+def new_stream_handler(delay: float) -> AsyncCallbackHandler:
+    return AsyncCallbackHandler(
+        delay,
+        flush_bytes=settings.STREAM_FLUSH_BYTES,
+        flush_interval=settings.STREAM_FLUSH_INTERVAL,
+    )
+
+
+def use_chain(chain):
+    """
+    Points the settings and the answer cache to a chain which was just swapped in.
+    Cached answers of another model or API key are dropped.
+    """
+    settings.OPENAI_API_KEY = chain.api_key
+    settings.LLM_NAME = chain.model
+    answer_cache.reset(
+        chain.retriever.vectorstore.embeddings, chain.model, chain.api_key
+    )
+
+
+# the agent, retriever and LLM serving the requests, replaced as a whole by update_api_key
+chains = ChainManager(setup_conversational_chain, on_swap=use_chain)
+
 
 def startup_event():
     """
     Event handler for application startup. Initializes the conversational agent, retriever, and LLM.
     This function sets up the conversational chain by calling `setup_conversational_chain` with the settings.
+    The state and the step timings of the initialization are reported by /ready.
 
     Raises:
         HTTPException: An exception with the appropriate status code and message is raised if there is an error during initialization.
     """
-    global agent
-    global retriever
-    global llm
-
     try:
-        agent, retriever, llm = setup_conversational_chain(settings)
+        with readiness.track("chain") as component:
+            component["steps"] = chains.load(settings).steps
 
     except UpdateError as e:
         raise HTTPException(status_code=400, detail=e.message)
@@ -41,14 +93,25 @@ def startup_event():
         raise HTTPException(status_code=500, detail=msg)
 
 
+async def start_warm_up():
+    """
+    Warms the chain up in the background, the backend is ready once it's done.
+    """
+    readiness.start("warmup", lambda: warm_up(chains.current))
+
+
 router.add_event_handler("startup", startup_event)
+router.add_event_handler("startup", start_warm_up)
 
 
 @router.post("/update_api_key_and_openai_model/", status_code=200)
-def update_api_key(api_key: str, model: str):
+async def update_api_key(api_key: str, model: str):
     """
     Updates the OpenAI API key and model. It reinitializes the agent, retriever, and LLM with the new settings.
 
+    The new chain is built in a worker thread while the current one keeps serving, checked with a probe
+    and then swapped in at once. Requests already streaming finish on the chain they started with.
+
     Args:
         api_key (str): The new API key for OpenAI.
         model (str): The model to be used with the new API key.
@@ -59,13 +122,8 @@ def update_api_key(api_key: str, model: str):
     Raises:
         HTTPException: If there's a failure in updating the API Key and model.
     """
-    global agent
-    global retriever
-    global llm
-
     try:
-        settings = update_openai_api_key(api_key, model)
-        agent, retriever, llm = setup_conversational_chain(settings)
+        await chains.rebuild(openai_settings(api_key, model), probe_chain)
         return {"message": f"Your API Key and model are updated successfully."}
 
     except UpdateError as e:
@@ -102,6 +160,20 @@ async def health():
     return {"status": "🤙"}
 
 
+@router.get("/ready")
+async def ready():
+    """
+    Readiness check endpoint for the load balancer.
+    Unlike /health, it only succeeds once the chain is built, the database is reachable and the warm-up is done.
+
+    Returns:
+        JSONResponse: The state, the initialization duration and the error of every component,
+        with status 200 when all of them are ready and 503 otherwise.
+    """
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
 @router.get("/get_current_model/", status_code=200)
 def get_current_model():
     """
@@ -113,9 +185,8 @@ def get_current_model():
     Raises:
         HTTPException: If there's an error in retrieving the current model.
     """
-    global llm
-
     try:
+        llm = chains.current.llm
         return {"message": f"Current model is {str(llm.llm.model_name)}"}
 
     except UpdateError as e:
@@ -140,9 +211,8 @@ def get_current_token():
     Raises:
         HTTPException: If there's an error in retrieving the current token.
     """
-    global llm
-
     try:
+        llm = chains.current.llm
         return {"message": f"Current token is {str(llm.llm.openai_api_key)}"}
 
     except UpdateError as e:
@@ -156,6 +226,46 @@ def get_current_token():
         raise HTTPException(status_code=500, detail=msg)
 
 
+@router.get("/get_chain_info/", status_code=200)
+def get_chain_info():
+    """
+    Retrieves the generation of the chain serving the requests and the duration of its build.
+
+    Returns:
+        dict: Generation, model, build time and duration of the current chain and the number of rebuilds.
+    """
+    return chains.info()
+
+
+@router.get("/get_cache_stats/", status_code=200)
+def get_cache_stats():
+    """
+    Retrieves hit and miss statistics of the caches used by the conversational chain.
+
+    Returns:
+        dict: Statistics of the query embedding cache, the answer cache and the web search cache, including
+            the search time the cached results saved, and the agent runs shared by identical /chat requests.
+
+    Raises:
+        HTTPException: If there's an error in retrieving the statistics.
+    """
+    try:
+        retriever = chains.current.retriever
+        return {
+            "embeddings": retriever.vectorstore.embeddings.cache.stats(),
+            "answers": answer_cache.stats(),
+            "search": get_search_cache(
+                settings.SEARCH_CACHE_TTL, settings.SEARCH_CACHE_MAX_ITEMS
+            ).stats(),
+            "fanout": fanout.stats(),
+        }
+
+    except Exception as e:
+        msg = f"Unexpected error during cache statistics getting: {str(e)}"
+        logging.error(msg)
+        raise HTTPException(status_code=500, detail=msg)
+
+
 @router.get("/chat_no_stream", status_code=200)
 async def chat_nostream(query: str):
     """
@@ -170,10 +280,15 @@ async def chat_nostream(query: str):
     Raises:
         HTTPException: If there's an error during the conversation generation.
     """
-    global agent
-
     try:
-        return await run_call_no_stream(agent=agent, query=query)
+        agent = chains.current.agent
+        cached = await answer_cache.aget(query, "text")
+        if cached is not None:
+            return {"input": query, "chat_history": [], "output": cached}
+
+        response = await run_call_no_stream(agent=agent, query=query)
+        await answer_cache.aput(query, response["output"], "text")
+        return response
 
     except UpdateError as e:
         raise HTTPException(status_code=400, detail=e.message)
@@ -185,14 +300,75 @@ async def chat_nostream(query: str):
         raise HTTPException(status_code=500, detail=msg)
 
 
+@router.post("/chat_batch", status_code=200)
+async def chat_batch(batch: BatchQuery):
+    """
+    Answers a batch of queries without streaming, for offline evaluations and bulk jobs.
+
+    Args:
+        batch (BatchQuery): The queries, the number of them answered at the same time (at most
+            `settings.BATCH_MAX_CONCURRENCY`) and the time limit of one query in seconds.
+
+    Returns:
+        StreamingResponse: One JSON line per query in the order they complete, with the `index` of the query,
+        its `status`, the `output` or the `error`, the latency and the token usage.
+
+    Raises:
+        HTTPException: If the batch is empty or larger than `settings.BATCH_MAX_QUERIES`.
+    """
+    if not batch.queries or len(batch.queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch must contain 1 to {settings.BATCH_MAX_QUERIES} queries.",
+        )
+    try:
+        # the whole batch is answered by the chain serving at its start
+        agent = chains.current.agent
+        limit = batch_limiter.concurrency
+        concurrency = max(1, min(batch.concurrency or limit, limit))
+
+        async def answer(query: str, callbacks: list) -> str:
+            cached = await answer_cache.aget(query, "text")
+            if cached is not None:
+                return cached
+            response = await run_call_no_stream(agent, query, callbacks)
+            await answer_cache.aput(query, response["output"], "text")
+            return response["output"]
+
+        async def lines():
+            results = run_batch(
+                batch.queries,
+                answer,
+                batch_limiter,
+                concurrency,
+                batch.timeout or settings.BATCH_ITEM_TIMEOUT,
+            )
+            try:
+                async for result in results:
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+            finally:
+                await results.aclose()
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    except Exception as e:
+        msg = f"Unexpected error during batch text generation: {str(e)}"
+        logging.error(msg)
+        raise HTTPException(status_code=500, detail=msg)
+
+
 @router.get("/chat", status_code=200)
-async def chat(query: Query = Body(...), delay: float = 0.0):
+async def chat(query: Query = Body(...), delay: float = 0.0, sse: bool = False):
     """
-    Handles conversational queries with streaming.
+    Handles conversational queries with streaming. Answers found in the answer cache are replayed as a token stream.
+    Identical requests arriving while an answer is being generated subscribe to its stream instead of running
+    the agent again: they receive the tokens produced so far and then the live ones.
 
     Args:
         query (Query): The query object containing the query string.
         delay (float, optional): Delay before sending the response. Defaults to 0.0.
+        sse (bool, optional): Stream typed server-sent events (`token`, `sources`, `timing`, `done`) instead of
+            raw answer text. Defaults to False, the raw text stream kept for backward compatibility.
 
     Returns:
         StreamingResponse: A streaming response for real-time conversation feedback.
@@ -200,11 +376,41 @@ async def chat(query: Query = Body(...), delay: float = 0.0):
     Raises:
         HTTPException: If there's an error during the conversation generation.
     """
-    global agent
-
     try:
-        stream_it = AsyncCallbackHandler(delay)
-        gen = create_gen(agent, query, stream_it)
+        agent = chains.current.agent
+        kind = "events" if sse else "stream"
+        cached = await answer_cache.aget(query.text, kind)
+        key = fanout_key(kind, query.text, answer_cache.fingerprint, delay=delay)
+
+        if sse:
+            if cached is not None:
+                events = replay_events(cached, delay)
+            else:
+                events = fanout.subscribe(
+                    key,
+                    lambda: record_events(
+                        create_event_gen(agent, query, new_stream_handler(delay)),
+                        answer_cache,
+                        query.text,
+                    ),
+                )
+            return StreamingResponse(
+                create_sse_gen(events),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache"},
+            )
+
+        if cached is not None:
+            gen = replay_answer(cached, delay)
+        else:
+            gen = fanout.subscribe(
+                key,
+                lambda: record_answer(
+                    create_gen(agent, query, new_stream_handler(delay)),
+                    answer_cache,
+                    query.text,
+                ),
+            )
         return StreamingResponse(gen, media_type="text/event-stream")
 
     except UpdateError as e:
@@ -229,9 +435,8 @@ async def get_document_source(query: str):
     Raises:
         HTTPException: If there's an error during the document retrieval.
     """
-    global retriever
-
     try:
+        retriever = chains.current.retriever
         return await get_source(retriever, query)
     except Exception as e:
         msg = f"Unexpected error during document retrieval: {str(e)}"
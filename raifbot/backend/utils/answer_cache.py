@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.utils.constraint_extraction import extract_filter
+from backend.utils.query_router import current_question
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a query for the exact match lookup: lower case, collapsed whitespace and no trailing punctuation.
+    """
+    return re.sub(r"[\s?!.]+$", "", " ".join(query.lower().split()))
+
+
+@dataclass
+class CachedAnswer:
+    answer: Any
+    vector: Optional[np.ndarray]
+    created_at: float
+    constraints: Optional[dict] = None
+
+
+class AnswerCache:
+    """
+    A semantic cache of agent answers placed in front of the /chat and /chat_no_stream endpoints.
+
+    Args:
+        embeddings (object): Embeddings model used for the similarity lookup (the cached query embeddings).
+        similarity (float): Minimum cosine similarity of two queries to share an answer. Values above 1 disable
+            the similarity lookup and leave only the exact match of normalized queries.
+        ttl (float): Time to live of an answer in seconds.
+        max_items (int): Maximum number of answers kept per kind, the oldest are evicted first.
+
+    Answers are stored per kind ("stream" for the raw token stream of /chat, "events" for the answer and the
+    sources of the server-sent events stream and "text" for the output of /chat_no_stream), because the
+    endpoints return differently formatted answers.
+
+    A similar query only shares an answer if its constraints (price, brand, category, ...) are the same, because
+    queries differing only in e.g. the budget embed nearly identically but need different products. The
+    constraints are taken from the current question, not from the chat history in front of it.
+    """
+
+    def __init__(
+        self,
+        embeddings: object,
+        similarity: float = 0.95,
+        ttl: float = 3600,
+        max_items: int = 1000,
+    ):
+        self.embeddings = embeddings
+        self.similarity = similarity
+        self.ttl = ttl
+        self.max_items = max_items
+        self.fingerprint = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries: Dict[str, "OrderedDict[str, CachedAnswer]"] = {}
+        self._matrices: Dict[str, Optional[tuple]] = {}
+
+    def reset(self, embeddings: object, model: str, api_key: str) -> None:
+        """
+        Points the cache to a rebuilt chain and drops all answers if the model or the API key changed.
+        """
+        fingerprint = hashlib.sha256(f"{model}\x00{api_key}".encode("utf-8")).hexdigest()
+        if fingerprint != self.fingerprint:
+            self.invalidate()
+        self.fingerprint = fingerprint
+        self.embeddings = embeddings
+
+    def invalidate(self) -> None:
+        """
+        Drops all cached answers.
+        """
+        self._entries = {}
+        self._matrices = {}
+
+    def _semantic_enabled(self) -> bool:
+        return self.similarity <= 1.0 and self.embeddings is not None
+
+    def _expire(self, kind: str) -> "OrderedDict[str, CachedAnswer]":
+        entries = self._entries.setdefault(kind, OrderedDict())
+        deadline = time.monotonic() - self.ttl
+        expired = [key for key, entry in entries.items() if entry.created_at < deadline]
+        for key in expired:
+            del entries[key]
+        if expired:
+            self._matrices[kind] = None
+        return entries
+
+    def _matrix(self, kind: str, entries: "OrderedDict[str, CachedAnswer]"):
+        # The stacked matrix is rebuilt lazily, only after the entries changed
+        if self._matrices.get(kind) is None:
+            keys = [key for key, entry in entries.items() if entry.vector is not None]
+            matrix = (
+                np.stack([entries[key].vector for key in keys])
+                if keys
+                else np.empty((0, 0), dtype=np.float32)
+            )
+            self._matrices[kind] = (keys, matrix)
+        return self._matrices[kind]
+
+    async def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(await self.embeddings.aembed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def aget(self, query: str, kind: str) -> Optional[Any]:
+        """
+        Looks up an answer by the exact normalized query first and by embedding similarity second.
+
+        Returns:
+            The cached answer, or None on a miss.
+        """
+        entries = self._expire(kind)
+        key = normalize_query(query)
+
+        if key in entries:
+            self.exact_hits += 1
+            return entries[key].answer
+
+        if self._semantic_enabled() and entries:
+            vector = await self._embed(query)
+            # answers may have been evicted or expired during the embedding, the snapshot is taken afterwards
+            entries = self._expire(kind)
+            keys, matrix = self._matrix(kind, entries)
+            if keys:
+                constraints = extract_filter(current_question(query))
+                same = np.array([entries[k].constraints == constraints for k in keys])
+                scores = np.where(same, matrix @ vector, -np.inf)
+                best = int(np.argmax(scores))
+                entry = entries.get(keys[best])
+                if scores[best] >= self.similarity and entry is not None:
+                    self.semantic_hits += 1
+                    return entry.answer
+
+        self.misses += 1
+        return None
+
+    async def aput(self, query: str, answer: Any, kind: str) -> None:
+        """
+        Stores an answer for the query, evicting the oldest answers above `max_items`.
+        """
+        if not answer:
+            return
+        vector = await self._embed(query) if self._semantic_enabled() else None
+        entries = self._expire(kind)
+        entries[normalize_query(query)] = CachedAnswer(
+            answer, vector, time.monotonic(), extract_filter(current_question(query))
+        )
+        while len(entries) > self.max_items:
+            entries.popitem(last=False)
+        self._matrices[kind] = None
+
+    def stats(self) -> dict:
+        """
+        Returns the hit counters, the hit rate and the number of cached answers.
+        """
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "items": sum(len(entries) for entries in self._entries.values()),
+        }
+
+
+async def record_answer(
+    gen: AsyncIterator[str], answer_cache: AnswerCache, query: str, kind: str = "stream"
+) -> AsyncIterator[str]:
+    """
+    Passes the tokens of a stream through and caches the whole answer once the stream completed.
+    A failed or disconnected stream is not cached.
+    """
+    tokens: List[str] = []
+    async for token in gen:
+        tokens.append(token)
+        yield token
+    await answer_cache.aput(query, "".join(tokens), kind)
+
+
+async def replay_answer(answer: str, delay: float = 0.0) -> AsyncIterator[str]:
+    """
+    Replays a cached answer as a token stream, so cache hits look to the client like a generated answer.
+    """
+    for token in re.findall(r"\S+\s*|\s+", answer):
+        if delay:
+            await asyncio.sleep(delay)
+        yield token
+
+
+async def record_events(
+    events: AsyncIterator[Tuple[str, dict]], answer_cache: AnswerCache, query: str
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Passes typed stream events through and caches the answer with its sources once the stream is done.
+    Streams which ended with an error are not cached.
+    """
+    tokens: List[str] = []
+    products = []
+    failed = False
+    async for event, data in events:
+        if event == "token":
+            tokens.append(data["text"])
+        elif event == "sources":
+            products = data["products"]
+        elif event == "error":
+            failed = True
+        elif event == "done" and not failed:
+            await answer_cache.aput(
+                query, {"text": "".join(tokens), "products": products}, "events"
+            )
+        yield event, data
+
+
+async def replay_events(cached: dict, delay: float = 0.0) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Replays a cached answer and its sources as typed stream events.
+    """
+    start = time.monotonic()
+    async for token in replay_answer(cached["text"], delay):
+        yield "token", {"text": token}
+    yield "sources", {"products": cached["products"]}
+    yield "timing", {"time_to_first_token": 0.0, "total": time.monotonic() - start}
+    yield "done", {}
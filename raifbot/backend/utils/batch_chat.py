@@ -0,0 +1,159 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from uuid import UUID
+
+from langchain.schema import LLMResult
+from langchain_core.callbacks import BaseCallbackHandler
+
+from backend.utils.metrics import BATCH_ITEMS
+from backend.utils.token_counting import count_tokens
+
+# Answers one query, using the callbacks of the item (e.g. its usage counter) and returning the answer text
+Answer = Callable[[str, List[BaseCallbackHandler]], Awaitable[str]]
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """
+    Counts the LLM calls and tokens of one batch item.
+
+    The streaming chat model reports no token usage, so the prompt and completion tokens are counted with the
+    tokenizer, unless the model returned its own usage.
+    """
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._prompts: Dict[UUID, int] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self._prompts[run_id] = sum(count_tokens(prompt) for prompt in prompts)
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._prompts[run_id] = sum(
+            count_tokens(str(message.content))
+            for batch in messages
+            for message in batch
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = self._prompts.pop(run_id, 0)
+        self.llm_calls += 1
+        self.prompt_tokens += usage.get("prompt_tokens") or prompt_tokens
+        self.completion_tokens += usage.get("completion_tokens") or sum(
+            count_tokens(generation.text)
+            for generations in response.generations
+            for generation in generations
+        )
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._prompts.pop(run_id, None)
+
+    def usage(self) -> dict:
+        return {
+            "llm_calls": self.llm_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+        }
+
+
+class BatchLimiter:
+    """
+    Caps the batch items answered at the same time in the worker process, across all running batches.
+
+    Args:
+        concurrency (int): Maximum number of batch items in progress.
+
+    Interactive requests don't go through the limiter, so a large batch leaves the rest of the capacity
+    (e.g. the OpenAI rate limit) to them.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # created on first use, inside the event loop serving the requests
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+
+async def answer_item(
+    index: int, query: str, answer: Answer, limiter: BatchLimiter, timeout: float
+) -> dict:
+    """
+    Answers one batch item once the limiter lets it through.
+
+    Returns:
+        dict: The `index` and `query` of the item, its `status` ("ok", "timeout" or "error"), the `output` or the
+        `error`, the `latency_seconds` of the answer without the wait for the limiter, the `queued_seconds` and
+        the token `usage`.
+    """
+    queued = time.perf_counter()
+    async with limiter.semaphore:
+        start = time.perf_counter()
+        usage = UsageCallbackHandler()
+        result = {"index": index, "query": query}
+        try:
+            result["output"] = await asyncio.wait_for(answer(query, [usage]), timeout)
+            result["status"] = "ok"
+        except asyncio.TimeoutError:
+            result.update(status="timeout", error=f"No answer within {timeout} s")
+        except Exception as e:
+            result.update(status="error", error=str(e))
+        result["latency_seconds"] = round(time.perf_counter() - start, 3)
+    result["queued_seconds"] = round(start - queued, 3)
+    result["usage"] = usage.usage()
+    BATCH_ITEMS.inc(status=result["status"])
+    return result
+
+
+async def run_batch(
+    queries: List[str],
+    answer: Answer,
+    limiter: BatchLimiter,
+    concurrency: int,
+    timeout: float,
+) -> AsyncIterator[dict]:
+    """
+    Answers the queries with at most `concurrency` of them in progress and yields the results as they complete.
+
+    Args:
+        queries (List[str]): The queries of the batch.
+        answer (Answer): Answers one query.
+        limiter (BatchLimiter): The limiter shared by all batches of the process.
+        concurrency (int): Maximum number of items of this batch in progress.
+        timeout (float): Time limit of one item in seconds, a timed out item is reported and the batch goes on.
+
+    Only `concurrency` workers run, each taking the next query when it's done, so the number of tasks doesn't
+    grow with the size of the batch. The workers are cancelled when the consumer stops, e.g. when the client
+    disconnected.
+    """
+    pending = iter(enumerate(queries))
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        for index, query in pending:
+            await results.put(await answer_item(index, query, answer, limiter, timeout))
+
+    workers = [
+        asyncio.create_task(worker()) for _ in range(min(concurrency, len(queries)))
+    ]
+    try:
+        for _ in queries:
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -1,7 +1,159 @@
 import asyncio
-from typing import Any
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
 from langchain.callbacks.streaming_aiter import AsyncIteratorCallbackHandler
 from langchain.schema import LLMResult
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from backend.utils.dependencies_generation import describe_documents
+from backend.utils.metrics import AGENT_ITERATIONS
+from backend.utils.metrics import AGENT_RUNS_IN_FLIGHT
+from backend.utils.metrics import LLM_SECONDS
+from backend.utils.metrics import LLM_TIME_TO_FIRST_TOKEN_SECONDS
+from backend.utils.metrics import RETRIEVAL_SECONDS
+from backend.utils.metrics import TOOL_SECONDS
+from backend.utils.query_router import FAST_PATH_TAG
+
+
+JSON_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+def failure_table(pattern: str) -> List[int]:
+    """
+    Returns the Knuth-Morris-Pratt failure table of a pattern: for every prefix length, the length of its longest
+    proper prefix which is also its suffix.
+    """
+    table = [0] * (len(pattern) + 1)
+    k = 0
+    for i in range(1, len(pattern)):
+        while k and pattern[i] != pattern[k]:
+            k = table[k]
+        if pattern[i] == pattern[k]:
+            k += 1
+        table[i + 1] = k
+    return table
+
+
+class FinalAnswerParser:
+    """
+    A streaming state machine extracting the final answer from the structured chat agent output.
+
+    The agent answers with a JSON blob such as `{"action": "Final Answer", "action_input": "..."}`.
+    The parser looks for `Final Answer`, then for the `"action_input"` key and its opening quote, and then
+    decodes the JSON string value (including escapes and surrogate pairs) until the closing quote.
+    Every character is inspected exactly once, so the work per token doesn't depend on the length of the answer.
+    """
+
+    FINAL_ANSWER = "Final Answer"
+    ACTION_INPUT = '"action_input"'
+    FAILURE = {pattern: failure_table(pattern) for pattern in (FINAL_ANSWER, ACTION_INPUT)}
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.state = "final_answer"
+        self.matched = 0
+        self.unicode = ""
+        self.high_surrogate: Optional[int] = None
+
+    @property
+    def found_final_answer(self) -> bool:
+        return self.state != "final_answer"
+
+    @property
+    def finished(self) -> bool:
+        return self.state == "done"
+
+    def _match(self, char: str, pattern: str) -> bool:
+        # a mismatch falls back to the longest matched suffix which is a prefix of the pattern, so matches
+        # overlapping a partial match are found, e.g. when the closing quote of a key opens '"action_input"'
+        failure = self.FAILURE[pattern]
+        while self.matched and char != pattern[self.matched]:
+            self.matched = failure[self.matched]
+        if char == pattern[self.matched]:
+            self.matched += 1
+        if self.matched == len(pattern):
+            self.matched = 0
+            return True
+        return False
+
+    def _code_unit(self, code: int) -> str:
+        if 0xD800 <= code <= 0xDBFF:
+            self.high_surrogate = code
+            return ""
+        if 0xDC00 <= code <= 0xDFFF and self.high_surrogate is not None:
+            high, self.high_surrogate = self.high_surrogate, None
+            return chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00))
+        return self._flush_surrogate() + chr(code)
+
+    def _flush_surrogate(self) -> str:
+        if self.high_surrogate is None:
+            return ""
+        self.high_surrogate = None
+        return "\ufffd"
+
+    def feed(self, token: str) -> str:
+        """
+        Consumes a token of the LLM output.
+
+        Returns:
+            str: The decoded part of the final answer contained in the token, possibly empty.
+        """
+        out = []
+        for char in token:
+            state = self.state
+            if state == "final_answer":
+                if self._match(char, self.FINAL_ANSWER):
+                    self.state = "key"
+            elif state == "key":
+                if self._match(char, self.ACTION_INPUT):
+                    self.state = "colon"
+            elif state == "colon":
+                if char == ":":
+                    self.state = "value"
+                elif not char.isspace():
+                    self.state = "key"
+            elif state == "value":
+                if char == '"':
+                    self.state = "string"
+                elif not char.isspace():
+                    self.state = "key"
+            elif state == "string":
+                if char == "\\":
+                    self.state = "escape"
+                elif char == '"':
+                    out.append(self._flush_surrogate())
+                    self.state = "done"
+                else:
+                    out.append(self._flush_surrogate() + char)
+            elif state == "escape":
+                if char == "u":
+                    self.unicode = ""
+                    self.state = "unicode"
+                else:
+                    out.append(self._flush_surrogate() + JSON_ESCAPES.get(char, char))
+                    self.state = "string"
+            elif state == "unicode":
+                self.unicode += char
+                if len(self.unicode) == 4:
+                    try:
+                        out.append(self._code_unit(int(self.unicode, 16)))
+                    except ValueError:
+                        out.append(self._flush_surrogate() + "\ufffd")
+                    self.state = "string"
+        return "".join(out)
 
 
 class AsyncCallbackHandler(AsyncIteratorCallbackHandler):
@@ -9,57 +161,216 @@ class AsyncCallbackHandler(AsyncIteratorCallbackHandler):
     A custom callback handler for asynchronous streaming of tokens from the language model.
 
     Attributes:
-        content (str): Accumulates the tokens received from the language model.
-        final_answer (bool): Flag indicating if the final answer has been reached.
+        parser (FinalAnswerParser): Extracts the decoded final answer from the streamed tokens.
+        buffer (str): Decoded text waiting to be flushed to the queue as one chunk.
+        documents (list): Documents returned by the product_search retriever during the run.
 
     Args:
         delay (float): Delay in seconds before processing each new token. Defaults to 1.0.
+        flush_bytes (int): A chunk is flushed once it holds at least this many UTF-8 bytes. Defaults to 64.
+        flush_interval (float): A chunk is flushed once this many seconds passed since the last flush. Defaults to 0.05.
 
     This class extends AsyncIteratorCallbackHandler and implements custom logic for handling new tokens and the end of a language model's response.
+    Tokens are coalesced into chunks, which cuts the per-chunk overhead of the StreamingResponse and of the client.
     """
 
-    content: str = ""
-    final_answer: bool = False
-
-    def __init__(self, delay: float = 1.0) -> None:
+    def __init__(
+        self, delay: float = 1.0, flush_bytes: int = 64, flush_interval: float = 0.05
+    ) -> None:
         super().__init__()
         self.delay = delay
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.parser = FinalAnswerParser()
+        self.buffer = ""
+        self.buffer_bytes = 0
+        self.last_flush = time.monotonic()
+        self.documents = []
+        self.plain_text = False
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.queue.put_nowait(self.buffer)
+        self.buffer = ""
+        self.buffer_bytes = 0
+        self.last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """
+        Flushes the pending chunk and ends the stream returned by `aiter`.
+        """
+        self.flush()
+        self.queue.put_nowait(None)
+        self.done.set()
+
+    async def on_llm_start(self, serialized: dict, prompts: list, **kwargs: Any) -> None:
+        await super().on_llm_start(serialized, prompts, **kwargs)
+        # the answer of the fast path is plain text instead of the JSON actions of the agent
+        self.plain_text = FAST_PATH_TAG in (kwargs.get("tags") or [])
 
     async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
-        await asyncio.sleep(self.delay)
-        self.content += token
-        # if we passed the final answer, we put tokens in queue
-        if self.final_answer:
-            if '"action_input": "' in self.content:
-                if token not in ['"', "}"]:
-                    self.queue.put_nowait(token)
-        elif "Final Answer" in self.content:
-            self.final_answer = True
-            self.content = ""
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        text = token if self.plain_text else self.parser.feed(token)
+        if text:
+            self.buffer += text
+            self.buffer_bytes += len(text.encode("utf-8"))
+        if self.buffer and (
+            self.buffer_bytes >= self.flush_bytes
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
 
     async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
-        if self.final_answer:
-            self.content = ""
-            self.final_answer = False
-            self.done.set()
-        else:
-            self.content = ""
+        if self.plain_text or self.parser.found_final_answer:
+            self.close()
+        self.parser.reset()
+
+    async def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        self.close()
+
+    async def on_retriever_end(self, documents: Sequence[Document], **kwargs: Any) -> None:
+        self.documents.extend(documents)
 
+    async def aiter(self) -> AsyncIterator[str]:
+        # The stream ends with a None sentinel, so chunks flushed right before the end are never lost
+        while True:
+            chunk = await self.queue.get()
+            if chunk is None:
+                break
+            yield chunk
 
-async def run_call_no_stream(agent: object, query: str):
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records the stages of agent runs in the metrics exposed on /metrics: LLM time to first token and duration,
+    tool calls by tool name, retrievals and the number of agent iterations.
+
+    One instance is shared by all runs, the start times are kept per run ID. The callbacks only read the clock
+    and update dictionaries, so they run inline instead of in a thread of the executor.
+    """
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.llm_starts: Dict[UUID, float] = {}
+        self.waiting_for_token: set = set()
+        self.tool_starts: Dict[UUID, Tuple[str, float]] = {}
+        self.retriever_starts: Dict[UUID, float] = {}
+        self.iterations: Dict[UUID, int] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self.llm_starts[run_id] = time.perf_counter()
+        self.waiting_for_token.add(run_id)
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self.on_llm_start(serialized, messages, run_id=run_id)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id in self.waiting_for_token:
+            self.waiting_for_token.discard(run_id)
+            LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(
+                time.perf_counter() - self.llm_starts[run_id]
+            )
+
+    def _end_llm(self, run_id: UUID, status: str) -> None:
+        self.waiting_for_token.discard(run_id)
+        start = self.llm_starts.pop(run_id, None)
+        if start is not None:
+            LLM_SECONDS.observe(time.perf_counter() - start, status=status)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_llm(run_id, "ok")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_llm(run_id, "error")
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self.tool_starts[run_id] = (name, time.perf_counter())
+
+    def _end_tool(self, run_id: UUID) -> None:
+        name, start = self.tool_starts.pop(run_id, (None, None))
+        if start is not None:
+            TOOL_SECONDS.observe(time.perf_counter() - start, tool=name)
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id)
+
+    def on_retriever_start(self, serialized, query, *, run_id: UUID, **kwargs: Any) -> None:
+        self.retriever_starts[run_id] = time.perf_counter()
+
+    def _end_retriever(self, run_id: UUID) -> None:
+        start = self.retriever_starts.pop(run_id, None)
+        if start is not None:
+            RETRIEVAL_SECONDS.observe(time.perf_counter() - start)
+
+    def on_retriever_end(self, documents, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_retriever(run_id)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_retriever(run_id)
+
+    def on_chain_start(
+        self,
+        serialized,
+        inputs,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        tags: Optional[list] = None,
+        **kwargs: Any,
+    ) -> None:
+        # only the root chain, the agent executor, counts iterations
+        if parent_run_id is None and FAST_PATH_TAG not in (tags or []):
+            self.iterations[run_id] = 0
+            AGENT_RUNS_IN_FLIGHT.inc()
+
+    def on_agent_action(self, action, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id in self.iterations:
+            self.iterations[run_id] += 1
+
+    def _end_chain(self, run_id: UUID) -> None:
+        iterations = self.iterations.pop(run_id, None)
+        if iterations is not None:
+            AGENT_ITERATIONS.observe(iterations)
+            AGENT_RUNS_IN_FLIGHT.dec()
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_chain(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_chain(run_id)
+
+
+metrics_handler = MetricsCallbackHandler()
+
+
+async def run_call_no_stream(
+    agent: object, query: str, callbacks: Optional[list] = None
+):
     """
     Executes a non-streaming call to the language model.
 
     Args:
         agent (object): The conversational agent object.
         query (str): The input query to be processed by the agent.
+        callbacks (list, optional): Additional run-scoped callbacks, e.g. counting the tokens of the call.
 
     Returns:
         The result from processing the input query by the agent.
 
     This function makes an asynchronous call to the agent with the given query and an empty chat history.
     """
-    return await agent.acall(inputs={"input": query, "chat_history": []})
+    return await agent.acall(
+        inputs={"input": query, "chat_history": []},
+        callbacks=[metrics_handler, *(callbacks or [])],
+    )
 
 
 async def run_acall(agent: object, query: str, stream_it: AsyncCallbackHandler):
@@ -71,13 +382,13 @@ async def run_acall(agent: object, query: str, stream_it: AsyncCallbackHandler):
         query (str): The input query to be processed by the agent.
         stream_it (AsyncCallbackHandler): The callback handler for streaming the response.
 
-    This function sets the callback handler for the agent and initiates an asynchronous call with the given query.
+    The callback handler is passed as a run-scoped callback instead of being assigned to the shared LLM,
+    so concurrent calls on the global agent never receive each other's tokens.
     """
-    agent.agent.llm_chain.llm.callbacks = [stream_it]
-    # now query
     await agent.acall(
-        inputs={"input": query, "chat_history": []},  # chat_history=[]
-    )  # , chat_history=[]
+        inputs={"input": query, "chat_history": []},
+        callbacks=[stream_it, metrics_handler],
+    )
 
 
 async def create_gen(agent: object, query: str, stream_it: AsyncCallbackHandler):
@@ -93,9 +404,65 @@ async def create_gen(agent: object, query: str, stream_it: AsyncCallbackHandler)
         An asynchronous generator yielding tokens from the language model.
 
     This function initiates an asynchronous call with streaming and yields tokens as they are received.
+    The agent run is cancelled when the generator is closed early, e.g. after the client disconnected.
     """
     task = asyncio.create_task(run_acall(agent, query, stream_it))
+    # the stream must end even if the agent fails or stops without a final answer
+    task.add_done_callback(lambda _: stream_it.close())
+
+    try:
+        async for token in stream_it.aiter():
+            yield token
+        await task
+    finally:
+        if not task.done():
+            task.cancel()
 
-    async for token in stream_it.aiter():
-        yield token
-    await task
+
+async def create_event_gen(
+    agent: object, query: str, stream_it: AsyncCallbackHandler
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Creates an asynchronous generator of typed stream events for a single agent run.
+
+    Args:
+        agent (object): The conversational agent object.
+        query (str): The input query to be processed by the agent.
+        stream_it (AsyncCallbackHandler): The callback handler for streaming the response.
+
+    Returns:
+        An asynchronous generator yielding `(event, data)` tuples: `token` events with the answer text, then
+        `sources` with the products returned by product_search, `timing` and finally `done`.
+        A failed run yields an `error` event before `done`.
+    """
+    start = time.monotonic()
+    first_token = None
+    try:
+        async for token in create_gen(agent, query, stream_it):
+            if first_token is None:
+                first_token = time.monotonic() - start
+            yield "token", {"text": token}
+        yield "sources", {"products": describe_documents(stream_it.documents)}
+    except Exception as e:
+        yield "error", {"detail": str(e)}
+    yield "timing", {
+        "time_to_first_token": first_token,
+        "total": time.monotonic() - start,
+    }
+    yield "done", {}
+
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    Formats an event in the `text/event-stream` wire format. The data is JSON encoded, so newlines in the
+    answer never break the framing.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def create_sse_gen(events: AsyncIterator[Tuple[str, dict]]) -> AsyncIterator[str]:
+    """
+    Turns a generator of typed events into a server-sent events stream.
+    """
+    async for event, data in events:
+        yield format_sse(event, data)
@@ -0,0 +1,89 @@
+from typing import Tuple
+
+# Vocabularies of the Pinterest fashion dataset
+GENDERS = ["Female", "Male"]
+AVAILABILITIES = ["Available", "Out of Stock"]
+CATEGORIES = [
+    "Coats & Jackets",
+    "Earrings",
+    "Handbags, Wallets & Cases",
+    "Necklaces",
+    "Pants",
+    "Shirts & Tops",
+    "Shoes",
+    "Shorts",
+    "Skirts",
+    "Sunglasses",
+]
+# fmt: off
+LOCATIONS = [
+    "Adelaide", "Albany", "Albury", "Albury-Wodonga", "Alice Springs", "Armidale",
+    "Bendigo", "Bunbury", "Bundaberg", "Busselton", "Canberra", "Coffs Harbour",
+    "Devonport", "Dubbo", "Geraldton", "Gladstone", "Gold Coast", "Goulburn",
+    "Hervey Bay", "Hobart", "Kalgoorlie-Boulder", "Karratha", "Launceston", "Lismore",
+    "Mackay", "Melbourne", "Mildura", "Mount Gambier", "Newcastle", "Nowra-Bomaderry",
+    "Perth", "Rockhampton", "Shepparton", "Sunshine Coast", "Sydney", "Tamworth",
+    "Toowoomba", "Townsville", "Wagga Wagga", "Warrnambool", "Whyalla", "Wollongong",
+]
+BRANDS = [
+    "ASICS", "ASOS", "Abercrombie & Fitch", "Adidas", "Alex and Ani", "Alexander McQueen",
+    "American Eagle", "Arc'teryx", "Armani", "Balenciaga", "BaubleBar", "Birkenstock",
+    "Boohoo", "Bottega Veneta", "Brooks", "Burberry", "Bvlgari", "Calvin Klein",
+    "Canada Goose", "Cartier", "Champion", "Chanel", "Charlotte Russe", "Clarks", "Coach",
+    "Columbia", "Converse", "Crocs", "David Yurman", "Dickies", "Dior", "Dockers",
+    "Dr. Martens", "Ecco", "Express", "Fendi", "Fila", "Forever 21", "Fossil",
+    "Free People", "Gap", "Givenchy", "Gucci", "Guess", "H&M", "Helly Hansen", "Hermès",
+    "J.Crew", "Jimmy Choo", "Kate Spade", "Kendra Scott", "Lee", "Levi's",
+    "Louis Vuitton", "Lululemon", "Lulus", "Mango", "Marc Jacobs", "Marmot", "Merrell",
+    "Michael Kors", "Missguided", "ModCloth", "Moncler", "New Balance", "Nike",
+    "North Face", "Oakley", "Pandora", "Patagonia", "Prada", "PrettyLittleThing", "Puma",
+    "Ralph Lauren", "Ray-Ban", "Reebok", "River Island", "Salomon", "Shein", "Skechers",
+    "Swarovski", "The North Face", "Tiffany & Co.", "Timberland", "Tom Ford",
+    "Tommy Hilfiger", "Topshop", "Under Armour", "Uniqlo", "Urban Outfitters",
+    "Valentino", "Van Cleef & Arpels", "Vans", "Versace", "Wrangler",
+    "Yves Saint Laurent", "Zara",
+]
+# fmt: on
+
+NEGATIVE_SOURCE = "xxx"
+# Off-topic documents of the index, the agent recognizes the question is unrelated to fashion when they match
+NEGATIVE_TEXTS = [
+    '"Focus on everything not related to the fashion Pinterest dataset. This includes subjects like advanced robotics, the latest developments in quantum computing, \ndetailed explorations of Mars’ geology, historical analyses of the Roman Empire, and deep dives into marine biology. Avoid topics such as clothing trends, fashion accessories, \noutfit ideas, or any fashion-related photography. The goal is to enrich understanding in areas like technology, science, history, nature, and others which are completely unrelated to fashion.',
+    "Concentrate on topics completely unrelated to the fashion Pinterest dataset. This involves exploring fields such as advanced robotics, the newest breakthroughs in quantum computing, comprehensive studies of Martian geology, historical examination of the Roman Empire, and thorough research in marine biology. Refrain from discussing subjects such as clothing trends, fashion accessories, outfit suggestions, or fashion-related imagery, aiming to enhance knowledge in areas of technology, science, history, and nature.",
+    "Shift your attention away from the fashion Pinterest dataset towards a variety of unrelated fields. Delve into areas like advanced robotics, cutting-edge quantum computing innovations, in-depth analysis of Mars’ geological features, the history of the Roman Empire, and detailed studies of marine life. Exclude any reference to clothing trends, fashion accessories, outfit compositions, or fashion photography, focusing instead on expanding comprehension in technology, science, historical studies, and natural sciences.",
+    "Focus your research and discussions on topics that have nothing to do with the fashion Pinterest dataset. Engage with subjects including advanced robotics, recent advancements in quantum computing, detailed examinations of the geology of Mars, historical insights into the Roman Empire, and extensive analysis of marine biology. Steer clear of fashion-related topics like clothing trends, accessories, and outfit ideas, with the aim of broadening understanding in distinct areas such as technology, history, science, and nature.",
+    "Direct your attention to areas completely detached from the fashion Pinterest dataset, such as advanced robotics, the latest updates in quantum computing, Mars’ geological composition, historical studies of the Roman Empire, and in-depth explorations of marine biology. Stay away from discussing clothing trends, fashion accessories, outfit proposals, or any type of fashion photography, with the objective to foster a richer knowledge base in fields like technology, science, and history.",
+    "Investigate subjects unrelated to the fashion Pinterest dataset by focusing on areas like advanced robotics, quantum computing breakthroughs, Mars’ geology, the Roman Empire’s history, and marine biology. Avoid any discussion of fashion trends, accessories, or photographic depictions of outfits, aiming to deepen understanding in diverse fields such as technology, history, and natural sciences.",
+]
+
+
+def product_document(row: dict) -> Tuple[str, dict]:
+    """
+    Builds the text and the metadata of a product document from a row of the Pinterest fashion dataset.
+
+    Args:
+        row (dict): A row of `pinterest-fashion-dataset_preprocessed.csv`.
+
+    Returns:
+        tuple: The document text (the same text as in the Upload_to_VectorDB notebook) and its metadata.
+
+    The metadata carries the structured product fields, so retrieval can filter on them.
+    """
+    text = (
+        f"Product {row['brand']} {row['category']} priced at ${row['price in $']} and bought by {row['gender']} aged {row['age']} "
+        f"in location {row['location']} was rated {row['ratings']} and having click_rate {row['click_rate']}. Description of the product:{row['image_description']}"
+        f" It is {row['availability']}."
+    )
+    metadata = {
+        "source": row["image_url"],
+        "brand": row["brand"],
+        "category": row["category"],
+        "price": float(row["price in $"]),
+        "gender": row["gender"],
+        "age": int(float(row["age"])),
+        "location": row["location"],
+        "ratings": int(float(row["ratings"])),
+        "click_rate": int(float(row["click_rate"])),
+        "availability": row["availability"],
+    }
+    return text, metadata
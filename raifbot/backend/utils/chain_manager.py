@@ -0,0 +1,119 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from backend.utils.metrics import CHAIN_GENERATION
+from backend.utils.metrics import CHAIN_REBUILD_SECONDS
+
+
+@dataclass
+class Chain:
+    """
+    One fully built conversational chain, replaced as a whole and never modified after it was swapped in.
+    """
+
+    agent: Any
+    retriever: Any
+    llm: Any
+    model: str
+    api_key: str
+    generation: int = 0
+    built_at: float = 0.0
+    build_seconds: float = 0.0
+    steps: dict = field(default_factory=dict)
+
+
+class ChainManager:
+    """
+    Holds the chain serving the requests and rebuilds it off the request path.
+
+    Args:
+        build (Callable): Builds the agent, retriever and LLM chain from settings, i.e. `setup_conversational_chain`,
+            and records the durations of its steps into the dict passed second.
+        on_swap (Callable): Called with the new chain right when it's swapped in, e.g. to reset caches.
+
+    A rebuild runs in a worker thread into a new `Chain`, is warmed by a probe and is then swapped in with a
+    single assignment, so a request sees either the old or the new chain and never a half-built one.
+    Requests read `current` once, so the ones already streaming finish on the chain they started with.
+    Concurrent rebuilds run one after the other.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[object, dict], tuple],
+        on_swap: Optional[Callable[[Chain], None]] = None,
+    ):
+        self.build = build
+        self.on_swap = on_swap
+        self.current: Optional[Chain] = None
+        self.rebuilds = 0
+        self.failed_rebuilds = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _build(self, settings: object) -> Chain:
+        start = time.perf_counter()
+        steps = {}
+        agent, retriever, llm = self.build(settings, steps)
+        return Chain(
+            agent,
+            retriever,
+            llm,
+            model=settings.LLM_NAME,
+            api_key=settings.OPENAI_API_KEY,
+            built_at=time.time(),
+            build_seconds=time.perf_counter() - start,
+            steps=steps,
+        )
+
+    def _swap(self, chain: Chain) -> Chain:
+        chain.generation = self.current.generation + 1 if self.current else 1
+        self.current = chain
+        if self.on_swap is not None:
+            self.on_swap(chain)
+        CHAIN_GENERATION.set(chain.generation)
+        return chain
+
+    def load(self, settings: object) -> Chain:
+        """
+        Builds the chain and swaps it in right away, at startup.
+        """
+        return self._swap(self._build(settings))
+
+    async def rebuild(
+        self, settings: object, probe: Callable[[Chain], Awaitable[None]]
+    ) -> Chain:
+        """
+        Builds a chain from the settings in a worker thread, awaits the probe on it and swaps it in.
+
+        Raises:
+            Exception: Whatever the build or the probe raised, the current chain is kept in that case.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            start = time.perf_counter()
+            try:
+                chain = await asyncio.to_thread(self._build, settings)
+                await probe(chain)
+            except BaseException:
+                self.failed_rebuilds += 1
+                CHAIN_REBUILD_SECONDS.observe(
+                    time.perf_counter() - start, status="error"
+                )
+                raise
+            CHAIN_REBUILD_SECONDS.observe(time.perf_counter() - start, status="ok")
+            self.rebuilds += 1
+            return self._swap(chain)
+
+    def info(self) -> dict:
+        chain = self.current
+        return {
+            "generation": chain.generation if chain else 0,
+            "model": chain.model if chain else None,
+            "built_at": chain.built_at if chain else None,
+            "build_seconds": round(chain.build_seconds, 3) if chain else None,
+            "steps": dict(chain.steps) if chain else {},
+            "rebuilds": self.rebuilds,
+            "failed_rebuilds": self.failed_rebuilds,
+        }
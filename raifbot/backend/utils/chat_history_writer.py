@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+
+from backend.utils.dependencies_chat_history import history_upserts
+from backend.utils.error_handler import UpdateError
+from backend.utils.metrics import CHAT_HISTORY_DROPPED_TURNS
+
+
+class ChatHistoryWriter:
+    """
+    A write-behind queue of chat history saves, flushed to MongoDB in bulk.
+
+    Args:
+        db (object): The chat history collection.
+        max_batch (int): Number of queued turns which triggers a flush right away.
+        flush_interval (float): Maximum time in seconds a queued turn waits for the flush.
+        max_retries (int): Number of later flushes retrying the turns of a failed flush.
+
+    Saves are acknowledged as soon as they are queued. Turns of one session are merged into a single upsert and
+    all sessions are written with one unordered `bulk_write`, so many small saves become a handful of bulk
+    operations. Turns of a failed flush are queued again, ahead of the turns saved meanwhile, and retried with
+    the next flushes. Turns still failing after `max_retries` retries, or left when the writer is closed, are
+    logged and counted as dropped.
+    """
+
+    def __init__(
+        self,
+        db: object,
+        max_batch: int = 500,
+        flush_interval: float = 0.05,
+        max_retries: int = 3,
+    ):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.saves = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped_turns = 0
+        self._pending: "OrderedDict[str, List]" = OrderedDict()
+        # the batch of the bulk write in progress, its sessions are pending until the write returns
+        self._writing: "OrderedDict[str, List]" = OrderedDict()
+        self._retries: Dict[str, int] = {}
+        self._count = 0
+        self._queued = asyncio.Event()
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Starts the background flushing task, must be called from the running event loop.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def put(self, session_id: str, new_history: List) -> None:
+        """
+        Queues turns of a session.
+
+        Raises:
+            UpdateError: If the session ID is not a valid ObjectId.
+        """
+        if not ObjectId.is_valid(session_id):
+            raise UpdateError(
+                f"Failed to save chat history: invalid session ID '{session_id}'", 500
+            )
+        self._pending.setdefault(session_id, []).extend(new_history)
+        self._count += len(new_history)
+        self.saves += 1
+        self._queued.set()
+        if self._count >= self.max_batch:
+            self._full.set()
+
+    def pending(self, session_id: str) -> bool:
+        """
+        Returns whether turns of the session are waiting for the flush or being written.
+        """
+        return session_id in self._pending or session_id in self._writing
+
+    async def discard(self, session_id: Optional[str] = None) -> None:
+        """
+        Drops queued turns of a deleted session, or of all sessions if no session ID is given.
+
+        A bulk write of the turns already in progress can't be cancelled, so it is waited for. Otherwise its
+        upsert would land after the deletion and bring the session back.
+        """
+        writing = (
+            bool(self._writing) if session_id is None else session_id in self._writing
+        )
+        # turns being written are not retried if their write fails
+        if session_id is None:
+            self._pending = OrderedDict()
+            self._count = 0
+            self._writing.clear()
+            self._retries.clear()
+        else:
+            self._writing.pop(session_id, None)
+            self._retries.pop(session_id, None)
+            if session_id in self._pending:
+                self._count -= len(self._pending.pop(session_id))
+        if writing:
+            async with self._lock:
+                pass
+
+    def _drop(self, batch: Dict[str, List], reason: str) -> None:
+        turns = sum(len(turns) for turns in batch.values())
+        if turns:
+            self.dropped_turns += turns
+            CHAT_HISTORY_DROPPED_TURNS.inc(turns)
+            logging.error(
+                f"Dropped {turns} chat history turns of {len(batch)} sessions: {reason}"
+            )
+
+    def _requeue(self, batch: "OrderedDict[str, List]", error: Exception) -> None:
+        retry, dropped = OrderedDict(), {}
+        for session_id, turns in batch.items():
+            self._retries[session_id] = self._retries.get(session_id, 0) + 1
+            if self._retries[session_id] > self.max_retries:
+                dropped[session_id] = turns
+                del self._retries[session_id]
+            else:
+                retry[session_id] = turns
+        self._drop(dropped, f"flush failed {self.max_retries + 1} times: {error}")
+        # failed turns go before the turns of the same session saved during the write
+        for session_id, turns in self._pending.items():
+            retry.setdefault(session_id, []).extend(turns)
+        self._pending = retry
+        self._count = sum(len(turns) for turns in retry.values())
+        if retry:
+            self._queued.set()
+
+    async def flush(self) -> None:
+        """
+        Writes all queued turns with one bulk write, the turns are queued again if it fails.
+        """
+        async with self._lock:
+            self._writing, self._pending, self._count = self._pending, OrderedDict(), 0
+            self._queued.clear()
+            self._full.clear()
+            if not self._writing:
+                return
+            try:
+                await self.db.bulk_write(history_upserts(self._writing), ordered=False)
+                self.flushes += 1
+                for session_id in self._writing:
+                    self._retries.pop(session_id, None)
+            except Exception as e:
+                self.failed_flushes += 1
+                logging.error(f"Failed to flush chat history turns: {e}")
+                self._requeue(self._writing, e)
+            finally:
+                self._writing = OrderedDict()
+
+    async def _run(self) -> None:
+        while True:
+            await self._queued.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            # a flush in progress is completed even when the task is cancelled on shutdown
+            await asyncio.shield(self.flush())
+
+    async def close(self) -> None:
+        """
+        Stops the background task and flushes the remaining turns, turns of a failed last flush are dropped.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self._drop(self._pending, "the writer is closed")
+        await self.discard()
+
+    def stats(self) -> dict:
+        """
+        Returns the number of queued saves, successful and failed flushes, dropped turns and currently queued turns.
+        """
+        return {
+            "saves": self.saves,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped_turns": self.dropped_turns,
+            "queued_turns": self._count,
+        }
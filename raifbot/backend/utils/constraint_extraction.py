@@ -0,0 +1,181 @@
+import re
+from typing import List, Optional, Tuple
+
+from backend.utils.catalog import BRANDS
+from backend.utils.catalog import LOCATIONS
+
+
+# Brands which are also common English words only match with their original capitalization
+AMBIGUOUS_BRANDS = {
+    "Brooks",
+    "Champion",
+    "Coach",
+    "Express",
+    "Gap",
+    "Guess",
+    "Lee",
+    "Mango",
+    "Vans",
+}
+
+CATEGORY_WORDS = {
+    "Coats & Jackets": r"coats?|jackets?|parkas?|blazers?",
+    "Earrings": r"earrings?",
+    "Handbags, Wallets & Cases": r"(?:hand)?bags?|wallets?|purses?|clutch(?:es)?",
+    "Necklaces": r"necklaces?|pendants?",
+    "Pants": r"pants|trousers|jeans|leggings",
+    "Shirts & Tops": r"(?:t-)?shirts?|tops|blouses?|tees?",
+    "Shoes": r"shoes?|sneakers?|boots?|sandals?|heels|trainers?",
+    "Shorts": r"shorts",
+    "Skirts": r"skirts?",
+    "Sunglasses": r"sunglasses|shades",
+}
+
+NUMBER = r"\$?\s?(\d+(?:[.,]\d+)?)\s?(?:\$|usd|dollars?|eur|euros?)?"
+AMOUNT = r"\d+(?:[.,]\d+)?"
+CURRENCY = r"(?:\$|(?:usd|dollars?|eur|euros?)\b)"
+# "from" starts a price only with a currency next to its number(s), "shoes from 2023" asks for no price
+FROM_PRICE = rf"from\s+(?=\$|{AMOUNT}\s?{CURRENCY}|{AMOUNT}\s+(?:and|to|-)\s+\$?\s?{AMOUNT}\s?{CURRENCY})"
+
+
+def _compile(pattern: str, flags: int = re.IGNORECASE) -> re.Pattern:
+    return re.compile(pattern, flags)
+
+
+def _vocabulary(words: List[str]) -> str:
+    # longer names first, so "The North Face" wins over "North Face" inside one alternation
+    words = sorted(words, key=len, reverse=True)
+    return r"(?<!\w)(" + "|".join(re.escape(word) for word in words) + r")(?!\w)"
+
+
+FEMALE = _compile(
+    r"\b(?:women'?s?|woman|female|ladies|lady|girls?|her|wife|girlfriend|mother|mom)\b"
+)
+MALE = _compile(
+    r"\b(?:men'?s?|man|male|guys?|boys?|gentlemen|him|husband|boyfriend|father|dad)\b"
+)
+AVAILABLE = _compile(r"\b(?:in stock|available|availability)\b")
+AGE_PATTERNS = [
+    _compile(r"\b(\d{1,2})[\s-]*(?:years?|yrs?|y\.?o\.?)(?:[\s-]*old)?\b"),
+    _compile(r"\baged?\s+(?:of\s+)?(\d{1,2})\b"),
+    _compile(r"\bin (?:my|his|her|their|the) (\d)0s\b"),
+]
+PRICE_RANGE = _compile(rf"\b(?:between\s+|{FROM_PRICE}){NUMBER}\s+(?:and|to|-)\s+{NUMBER}")
+PRICE_MAX = _compile(
+    rf"(?:\b(?:under|below|less than|cheaper than|max(?:imum)?|up to|at most|no more than|budget(?: of)?)\s+|<=?\s*){NUMBER}"
+)
+PRICE_MIN = _compile(
+    rf"(?:\b(?:over|above|more than|at least|min(?:imum)?|(?:prices?|priced|costs?|costing) from)\s+|\b{FROM_PRICE}|>=?\s*){NUMBER}"
+)
+RATING_MIN = _compile(
+    r"\b(?:rated|rating|ratings)\s+(?:of\s+)?(?:at least\s+)?([1-5])(?:\s*(?:\+|or (?:more|higher|above)))?|\b([1-5])\+?\s*stars?\b"
+)
+BRANDS_ANY_CASE = _compile(_vocabulary([b for b in BRANDS if b not in AMBIGUOUS_BRANDS]))
+BRANDS_EXACT_CASE = _compile(_vocabulary(sorted(AMBIGUOUS_BRANDS)), 0)
+LOCATION = _compile(_vocabulary(LOCATIONS))
+CATEGORIES = {
+    category: _compile(rf"\b(?:{words})\b") for category, words in CATEGORY_WORDS.items()
+}
+BRAND_CANONICAL = {brand.lower(): brand for brand in BRANDS}
+# the dataset lists the same brand under two names
+BRAND_ALIASES = {"North Face": "The North Face", "The North Face": "North Face"}
+LOCATION_CANONICAL = {location.lower(): location for location in LOCATIONS}
+
+AGE_WINDOW = 10
+
+
+def _number(value: str) -> float:
+    return float(value.replace(",", "."))
+
+
+def _find_age(text: str) -> Tuple[Optional[int], str]:
+    for i, pattern in enumerate(AGE_PATTERNS):
+        match = pattern.search(text)
+        if match:
+            age = int(match.group(1))
+            # "in their 30s" means the middle of the decade
+            if i == 2:
+                age = age * 10 + 5
+            return age, text[: match.start()] + " " + text[match.end() :]
+    return None, text
+
+
+def _find_price(text: str) -> dict:
+    match = PRICE_RANGE.search(text)
+    if match:
+        low, high = sorted([_number(match.group(1)), _number(match.group(2))])
+        return {"$gte": low, "$lte": high}
+
+    price = {}
+    match = PRICE_MAX.search(text)
+    if match:
+        price["$lte"] = _number(match.group(1))
+    match = PRICE_MIN.search(text)
+    if match:
+        price["$gte"] = _number(match.group(1))
+    return price
+
+
+def _find_all(pattern: re.Pattern, text: str, canonical: dict) -> List[str]:
+    found = []
+    for match in pattern.finditer(text):
+        value = canonical[match.group(1).lower()]
+        if value not in found:
+            found.append(value)
+    return found
+
+
+def extract_filter(query: str) -> dict:
+    """
+    Turns the requirements of a product query into a metadata filter, without calling the LLM.
+
+    Args:
+        query (str): The query passed to the product_search tool.
+
+    Returns:
+        dict: A Pinecone style metadata filter, e.g. `{"price": {"$lte": 100}, "gender": {"$eq": "Female"},
+        "brand": {"$in": ["Adidas"]}}`. It is empty if the query carries no recognized constraint.
+
+    The extraction is rule based: prices and ages are parsed with regular expressions and brands, categories,
+    locations and genders are matched against the vocabularies of the dataset.
+    """
+    constraints = {}
+
+    age, text = _find_age(query)
+    if age is not None:
+        constraints["age"] = {"$gte": age - AGE_WINDOW, "$lte": age + AGE_WINDOW}
+
+    price = _find_price(text)
+    if price:
+        constraints["price"] = price
+
+    match = RATING_MIN.search(text)
+    if match:
+        constraints["ratings"] = {"$gte": int(match.group(1) or match.group(2))}
+
+    female = FEMALE.search(text) is not None
+    male = MALE.search(text) is not None
+    if female != male:
+        constraints["gender"] = {"$eq": "Female" if female else "Male"}
+
+    brands = _find_all(BRANDS_ANY_CASE, text, BRAND_CANONICAL) + _find_all(
+        BRANDS_EXACT_CASE, text, BRAND_CANONICAL
+    )
+    brands += [BRAND_ALIASES[b] for b in brands if b in BRAND_ALIASES and BRAND_ALIASES[b] not in brands]
+    if brands:
+        constraints["brand"] = {"$in": brands}
+
+    categories = [
+        category for category, pattern in CATEGORIES.items() if pattern.search(text)
+    ]
+    if categories:
+        constraints["category"] = {"$in": categories}
+
+    locations = _find_all(LOCATION, text, LOCATION_CANONICAL)
+    if locations:
+        constraints["location"] = {"$in": locations}
+
+    if AVAILABLE.search(text):
+        constraints["availability"] = {"$eq": "Available"}
+
+    return constraints
@@ -1,7 +1,9 @@
 # from mongo_db import db
 from backend.utils.error_handler import UpdateError
-from typing import List
+from backend.utils.token_counting import turn_tokens
+from typing import Dict, List, Optional
 from bson import ObjectId
+from pymongo import UpdateOne
 
 
 async def update_or_insert_chat_history(db: object, session_id: str, new_history: List):
@@ -16,49 +18,147 @@ async def update_or_insert_chat_history(db: object, session_id: str, new_history
     Returns:
         dict: A success message indicating whether the chat history was updated or inserted.
 
+    The document is created by the same upsert which appends the turns, so a save costs one round trip.
+    The prompt token count of each turn is stored in the parallel `token_counts` array.
+
     Raises:
         UpdateError: If there is an exception during database update or insert operations.
     """
-    existing_doc = await db.find_one({"_id": ObjectId(session_id)})
-    if existing_doc:
-        try:
-            await db.update_one(
-                {"_id": ObjectId(session_id)},
-                {"$push": {"chat_history": {"$each": new_history}}},
-            )
-            suc_message = "Chat history successfully updated."
+    try:
+        result = await db.update_one(
+            {"_id": ObjectId(session_id)},
+            {"$push": history_push(new_history)},
+            upsert=True,
+        )
 
-        except Exception as e:
-            raise UpdateError(f"Failed to update chat history: {e}", 500)
-    else:
-        try:
-            new_doc = {"_id": ObjectId(session_id), "chat_history": new_history}
-            await db.insert_one(new_doc)
-            suc_message = "Chat history successfully inserted."
+    except Exception as e:
+        raise UpdateError(f"Failed to save chat history: {e}", 500)
 
-        except Exception as e:
-            raise UpdateError(f"Failed to create chat history: {e}", 500)
+    if result.upserted_id is not None:
+        suc_message = "Chat history successfully inserted."
+    else:
+        suc_message = "Chat history successfully updated."
 
     return {"message": suc_message}
 
 
-async def get_chat_history_item(db: object, session_id: str):
+def history_push(new_history: List) -> dict:
+    """
+    Builds the `$push` appending turns together with their token counts.
+    """
+    return {
+        "chat_history": {"$each": new_history},
+        "token_counts": {"$each": [turn_tokens(turn) for turn in new_history]},
+    }
+
+
+def history_upserts(histories: Dict[str, List]) -> List[UpdateOne]:
+    """
+    Builds one upsert per session appending its turns, for a `bulk_write`.
+    """
+    return [
+        UpdateOne(
+            {"_id": ObjectId(session_id)}, {"$push": history_push(turns)}, upsert=True
+        )
+        for session_id, turns in histories.items()
+    ]
+
+
+async def bulk_update_chat_histories(db: object, histories: Dict[str, List]):
+    """
+    Appends turns to the chat histories of several sessions with a single bulk write.
+
+    Args:
+        db (object): The database object.
+        histories (Dict[str, List]): New turns per session ID, in the order they should be appended.
+
+    Returns:
+        dict: A success message with the number of saved sessions.
+
+    Raises:
+        UpdateError: If a session ID is invalid or the bulk write fails.
+    """
+    try:
+        operations = history_upserts(histories)
+        if operations:
+            await db.bulk_write(operations, ordered=False)
+
+    except Exception as e:
+        raise UpdateError(f"Failed to save chat histories: {e}", 500)
+
+    return {
+        "message": f"Chat histories of {len(operations)} sessions successfully saved."
+    }
+
+
+def history_window(
+    last: Optional[int] = None,
+    before: Optional[int] = None,
+    field: str = "$chat_history",
+):
+    """
+    Translates a tail window of the chat history into a Mongo `$slice` expression.
+
+    Args:
+        last (int, optional): Number of turns to return. All turns are returned if not provided.
+        before (int, optional): Cursor, only turns with an index lower than `before` are returned.
+        field (str): The array field to slice.
+
+    Returns:
+        The `$slice` expression, the field itself for the whole history, or a literal empty list if the window is empty.
+    """
+    if before is None:
+        return {"$slice": [field, -last]} if last else field
+    start = max(before - last, 0) if last else 0
+    count = before - start
+    if count <= 0:
+        return {"$literal": []}
+    return {"$slice": [field, start, count]}
+
+
+async def get_chat_history_item(
+    db: object,
+    session_id: str,
+    last: Optional[int] = None,
+    before: Optional[int] = None,
+):
     """
     Retrieves the chat history for a specific session ID from the database.
 
     Args:
         db (object): The database object.
         session_id (str): The session ID for which chat history needs to be retrieved.
+        last (int, optional): Number of most recent turns to return. All turns are returned if not provided.
+        before (int, optional): Cursor for paging backwards, only turns with an index lower than `before` are returned.
 
     Returns:
-        dict: The chat history associated with the given session ID.
+        dict: The requested turns of the chat history, the total number of turns of the session and its rolling
+        summary with the number of turns it covers. Tail windows also carry the token counts of the turns, aligned
+        to the end of the window (sessions saved before the counts were introduced have fewer counts than turns).
+
+    The window is cut on the server with a `$slice` projection, so the payload doesn't grow with the session length.
 
     Raises:
         UpdateError: If there is an exception during the database query.
     """
     try:
-        doc = await db.find_one({"_id": ObjectId(session_id)})
-        return {"chat_history": doc["chat_history"]}
+        projection = {
+            "_id": 0,
+            "chat_history": history_window(last, before),
+            "total": {"$size": "$chat_history"},
+            "summary": 1,
+            "summarized": 1,
+        }
+        if before is None:
+            projection["token_counts"] = {
+                "$ifNull": [history_window(last, field="$token_counts"), []]
+            }
+        pipeline = [
+            {"$match": {"_id": ObjectId(session_id)}},
+            {"$project": projection},
+        ]
+        docs = await db.aggregate(pipeline).to_list(length=1)
+        return docs[0]
 
     except Exception as e:
         raise UpdateError(
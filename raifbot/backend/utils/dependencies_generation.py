@@ -1,11 +1,24 @@
 from backend.config import settings
-import pinecone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import asyncio
+import logging
+import time
 import openai
 from backend.utils.error_handler import UpdateError
+from backend.utils.local_vector_store import LocalVectorStore
+from backend.utils.embeddings_cache import CachedEmbeddings
+from backend.utils.embeddings_cache import get_embedding_cache
+from backend.utils.product_retriever import ProductRetriever
+from backend.utils.product_retriever import indexed_fields
+from backend.utils.query_router import FastPathAgent
+from backend.utils.query_router import QueryRouter
+from backend.utils.reranker import Reranker
+from backend.utils.search_cache import CachedSearch
+from backend.utils.search_cache import get_search_cache
 from langchain_openai import OpenAIEmbeddings
 from langchain_openai import ChatOpenAI
-from langchain_community.vectorstores import Pinecone
-from langchain_community.tools import DuckDuckGoSearchRun, Tool
+from langchain_community.tools import Tool
 from langchain.agents import initialize_agent, AgentType
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 from langchain.agents.agent_toolkits import create_retriever_tool
@@ -14,91 +27,141 @@ from langchain.chains import LLMChain
 
 
 # Add your utility functions here. This is a placeholder.
-def update_openai_api_key(new_key: str, model: str):
+def openai_settings(new_key: str, model: str):
     """
-    Updates the OpenAI API key and model in the application settings.
+    Returns a copy of the application settings with a new OpenAI API key and model.
 
     Args:
         new_key (str): The new OpenAI API key.
         model (str): The model to be used with the new API key.
 
     Returns:
-        object: The updated application settings.
+        object: The settings to build the new chain with. The application settings are only updated once
+        the new chain is swapped in.
+    """
+    return settings.model_copy(update={"OPENAI_API_KEY": new_key, "LLM_NAME": model})
 
-    This function updates the OpenAI API key and model, and performs a test call to OpenAI's chat API to verify the new key.
-    If the test call fails, it raises an UpdateError.
 
-    Raises:
-        UpdateError: If the test call to OpenAI's API fails.
-    """
+PROBE_QUERY = "Recommend shoes"
 
-    try:
-        openai.api_key = new_key
-
-        # Making a simple test call to OpenAI's chat API
-        openai.ChatCompletion.create(
-            model=model,  # Specify the chat model here
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": "Hello, who are you?"},
-            ],
-        )
 
-        settings.OPENAI_API_KEY = new_key
-        settings.LLM_NAME = model
+async def probe_chain(chain: object):
+    """
+    Checks a freshly built chain before it serves requests.
 
-        # If the call is successful, the key is working
-        return settings
+    Args:
+        chain (object): The new chain.
 
-    except openai.error.OpenAIError as e:
+    A one token completion verifies the API key and the model, and a probe retrieval opens the connections
+    of the embeddings model and of the vector store, so the first request doesn't pay for them.
+
+    Raises:
+        UpdateError: If the test call to OpenAI's API or the probe retrieval fails.
+    """
+    try:
+        client = openai.AsyncOpenAI(api_key=chain.api_key)
+        await client.chat.completions.create(
+            model=chain.model,
+            messages=[{"role": "user", "content": "Hello, who are you?"}],
+            max_tokens=1,
+        )
+    except openai.OpenAIError as e:
         raise UpdateError(
             f"Failed to update API key and model due to OpenAI API error: {e}", 400
         )
 
+    try:
+        await chain.retriever.aget_relevant_documents(PROBE_QUERY)
+    except Exception as e:
+        raise UpdateError(f"Probe retrieval of the new chain failed: {e}", 401)
+
 
-def setup_conversational_chain(settings: object):
+async def warm_up(chain: object):
     """
-    Initializes the conversational chain with various tools and configurations.
+    Warms a chain up before it's reported ready, so the first requests don't pay for cold connections.
 
     Args:
-        settings (object): Application settings containing configuration details.
+        chain (object): The chain serving the requests.
 
-    Returns:
-        tuple: A tuple containing the agent, retriever, and language model chain.
+    Embeds a query with the embeddings model itself, past the embedding cache, which opens the connection
+    to OpenAI, runs a retrieval, which opens the vector store, and embeds the routing prototypes of the
+    fast path.
+    """
+    embeddings = chain.retriever.vectorstore.embeddings
+    steps = [
+        getattr(embeddings, "underlying", embeddings).aembed_query(PROBE_QUERY),
+        chain.retriever.aget_relevant_documents(PROBE_QUERY),
+    ]
+    if isinstance(chain.agent, FastPathAgent):
+        steps.append(chain.agent.router.centroids())
+    await asyncio.gather(*steps)
 
-    This function sets up the conversational agent with various tools (like retrievers and search functions)
-    and configures the language model chain. It handles the initialization of the database, vector database,
-    language model, and other components required for the conversational chain.
 
-    Raises:
-        UpdateError: If there is an error during the initialization of any component.
+def init_vector_store(settings: object, embeddings_model: object):
     """
-    global agent
-    global retriever
-    global llm
+    Opens the vector store selected by `settings.VECTOR_STORE`.
 
-    tools = []
+    Args:
+        settings (object): Application settings containing configuration details.
+        embeddings_model (object): The embeddings model used to embed queries.
 
-    # Initialize database
+    Returns:
+        object: The Pinecone index or the embedded local vector store.
 
-    try:
-        pinecone.init(
-            api_key=settings.PINECONE_API_KEY, environment=settings.PINECONE_ENV
+    The local store is read from `settings.LOCAL_STORE_PATH` and needs no external service,
+    any other value keeps the original Pinecone index `settings.INDEX_NAME`.
+    """
+    if settings.VECTOR_STORE == "local":
+        return LocalVectorStore.from_existing_index(
+            settings.LOCAL_STORE_PATH, embeddings_model
         )
 
-        embeddings_model = OpenAIEmbeddings(
-            model=settings.EMBEDDING_NAME, openai_api_key=settings.OPENAI_API_KEY
+    # imported only when used, the local store doesn't pay for the Pinecone client
+    import pinecone
+    from langchain_community.vectorstores import Pinecone
+
+    pinecone.init(api_key=settings.PINECONE_API_KEY, environment=settings.PINECONE_ENV)
+    return Pinecone.from_existing_index(settings.INDEX_NAME, embeddings_model)
+
+
+def init_vector_db(settings: object):
+    """
+    Initializes the cached embeddings model and the vector store.
+
+    Returns:
+        tuple: The embeddings model and the vector store.
+
+    Raises:
+        UpdateError: If the embeddings model or the vector store can't be opened.
+    """
+    try:
+        embeddings_model = CachedEmbeddings(
+            OpenAIEmbeddings(
+                model=settings.EMBEDDING_NAME, openai_api_key=settings.OPENAI_API_KEY
+            ),
+            settings.EMBEDDING_NAME,
+            get_embedding_cache(
+                settings.EMBEDDING_CACHE_PATH,
+                settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+                settings.EMBEDDING_CACHE_MAX_MB * 1024**2,
+            ),
         )
 
-        vectordb = Pinecone.from_existing_index(settings.INDEX_NAME, embeddings_model)
+        return embeddings_model, init_vector_store(settings, embeddings_model)
 
     except Exception as e:
         raise UpdateError(f"Error during initialization of vector database: {e}", 401)
 
-    # Initialize database LLM model
 
+def init_llm(settings: object):
+    """
+    Initializes the streaming chat model.
+
+    Raises:
+        UpdateError: If the chat model can't be initialized.
+    """
     try:
-        llm = ChatOpenAI(
+        return ChatOpenAI(
             openai_api_key=settings.OPENAI_API_KEY,
             model_name=settings.LLM_NAME,
             temperature=0,
@@ -107,12 +170,95 @@ def setup_conversational_chain(settings: object):
         )
     except Exception as e:
         raise UpdateError(f"Error during initialization of LLM: {e}", 402)
+
+
+def init_search_tool(settings: object):
+    """
+    Initializes the DuckDuckGo tool of the agent.
+
+    Raises:
+        UpdateError: If the search tool can't be initialized.
+    """
+    try:
+        # the DuckDuckGo client is the slowest import of the chain, it's loaded in parallel with the rest
+        from langchain_community.tools import DuckDuckGoSearchRun
+
+        # repeated and concurrent identical searches are served by one request to DuckDuckGo
+        search = CachedSearch(
+            DuckDuckGoSearchRun().run,
+            get_search_cache(settings.SEARCH_CACHE_TTL, settings.SEARCH_CACHE_MAX_ITEMS),
+        )
+        return Tool(
+            name="DuckDuckGo",
+            func=search.run,
+            coroutine=search.arun,
+            description="This tool is used when you need to do a search on the internet to find information that another tool product_search can't find.",
+        )
+    except Exception as e:
+        raise UpdateError(f"Error during initialization of toolls an agent: {e}", 404)
+
+
+def timed(timings: dict, name: str, init: Callable, settings: object):
+    start = time.perf_counter()
+    try:
+        return init(settings)
+    finally:
+        timings[name] = round(time.perf_counter() - start, 3)
+
+
+def setup_conversational_chain(settings: object, timings: Optional[dict] = None):
+    """
+    Initializes the conversational chain with various tools and configurations.
+
+    Args:
+        settings (object): Application settings containing configuration details.
+        timings (dict): Optional dict receiving the duration of every initialization step in seconds.
+
+    Returns:
+        tuple: A tuple containing the agent, retriever, and language model chain.
+
+    This function sets up the conversational agent with various tools (like retrievers and search functions)
+    and configures the language model chain. It handles the initialization of the database, vector database,
+    language model, and other components required for the conversational chain.
+    The vector store, the LLM and the web search tool don't depend on each other and are initialized in
+    parallel threads, the retriever and the agent are assembled from them afterwards.
+    With `settings.FAST_PATH_ENABLED` the returned agent routes clearly in-domain queries to the chain.
+
+    Raises:
+        UpdateError: If there is an error during the initialization of any component.
+    """
+    timings = {} if timings is None else timings
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        vector_db = pool.submit(timed, timings, "vector_store", init_vector_db, settings)
+        llm = pool.submit(timed, timings, "llm", init_llm, settings)
+        search_tool = pool.submit(timed, timings, "web_search", init_search_tool, settings)
+        embeddings_model, vectordb = vector_db.result()
+        llm = llm.result()
+        search_tool = search_tool.result()
+
+    start = time.perf_counter()
+
     # Prepare retriever
 
     try:
-        retriever = vectordb.as_retriever(
-            search_type="similarity_score_threshold",
-            search_kwargs={"score_threshold": 0.05},  # , "k": 1
+        # requirements of the query are pushed down to the vector store as metadata filters, the candidates
+        # are reranked by rating, click rate, price and availability and the best of them go to the prompt
+        search_kwargs = {"score_threshold": 0.05}  # , "k": 1
+        reranker = None
+        # an index uploaded without the product fields in its metadata would miss every filtered search
+        filter_fields = indexed_fields(vectordb) if settings.RETRIEVAL_FILTERS else set()
+        if settings.RETRIEVAL_FILTERS and not {"brand", "category", "price"} & filter_fields:
+            logging.warning("The vector store has no product metadata, queries are not filtered")
+        if settings.RERANK_ENABLED:
+            search_kwargs["k"] = settings.RERANK_CANDIDATES
+            reranker = Reranker(top_k=settings.RERANK_TOP_K)
+        retriever = ProductRetriever(
+            vectorstore=vectordb,
+            search_kwargs=search_kwargs,
+            use_filters=settings.RETRIEVAL_FILTERS,
+            filter_fields=filter_fields,
+            reranker=reranker,
         )
     except Exception as e:
         raise UpdateError(f"Error during initialization of retriever: {e}", 403)
@@ -126,15 +272,7 @@ def setup_conversational_chain(settings: object):
             "Searches and returns products regarding the pinterest fashion that meets all requirements (if provided) such as age, gender, location, brand, price, availability. Focus on high rating of products first and click_rate second!",
         )
 
-        search = DuckDuckGoSearchRun()
-        search_tool = Tool(
-            name="DuckDuckGo",
-            func=search,  # .run
-            description="This tool is used when you need to do a search on the internet to find information that another tool product_search can't find.",
-        )
-
-        tools.append(tool_retrieve)
-        tools.append(search_tool)
+        tools = [tool_retrieve, search_tool]
 
         #        Initialize tools
         agent = initialize_agent(
@@ -171,12 +309,49 @@ def setup_conversational_chain(settings: object):
 
     except Exception as e:
         raise UpdateError(f"Unable to set OpenAI chain: {e}", 406)
+
+    # clearly in-domain queries skip the agent and are answered by the chain from the retrieved products
+    if settings.FAST_PATH_ENABLED:
+        agent = FastPathAgent(
+            agent,
+            retriever,
+            llm_chain,
+            QueryRouter(embeddings_model, margin=settings.FAST_PATH_MARGIN),
+        )
+    timings["agent"] = round(time.perf_counter() - start, 3)
     return agent, retriever, llm_chain
 
 
 # Retrieve the relevant document
 
 
+def describe_documents(docs: list):
+    """
+    Describes retrieved product documents for the frontend.
+
+    Args:
+        docs (list): Documents returned by the retriever.
+
+    Returns:
+        list: One dict per distinct document with its `url` (image source), product `name` and `description`.
+    """
+    products = []
+    seen = set()
+    for doc in docs:
+        key = (doc.metadata.get("source"), doc.page_content)
+        if key in seen:
+            continue
+        seen.add(key)
+        products.append(
+            {
+                "url": doc.metadata["source"],
+                "name": doc.page_content.split("priced")[0].split("Product")[-1].strip(),
+                "description": doc.page_content,
+            }
+        )
+    return products
+
+
 async def get_source(retriever_obj: object, query: str):
     """
     Retrieves the relevant document source based on a given query.
@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.utils.metrics import EMBEDDING_SECONDS
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes a text before hashing so that trivially different queries share one cache entry.
+    Unicode is NFC normalized and whitespace is collapsed, the case is kept because it changes the embedding.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """
+    Returns the cache key for a text embedded by the given model.
+    """
+    payload = f"{model_name}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    A two tier cache of embedding vectors: an in-process LRU in front of an on-disk sqlite store.
+
+    Args:
+        path (str): Path of the sqlite database file.
+        memory_items (int): Maximum number of vectors held by the in-process LRU tier.
+        disk_max_bytes (int): Maximum size of vectors stored on disk. The least recently used entries
+            are evicted once the limit is exceeded.
+
+    The cache is thread safe and counts memory hits, disk hits and misses. The memory tier and the sqlite
+    connection have their own locks, so a lookup served from memory doesn't wait for a disk write. The async
+    methods run the sqlite work in a worker thread instead of the event loop.
+    """
+
+    def __init__(self, path: str, memory_items: int = 1024, disk_max_bytes: int = 256 * 1024**2):
+        self.path = path
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)"
+        )
+        self._connection.commit()
+        self._disk_bytes = self._connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _get_memory(self, keys: List[str]) -> Tuple[Dict[str, List[float]], List[str]]:
+        found, pending = {}, []
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    # a hit makes the entry the most recently used one
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.memory_hits += 1
+                else:
+                    pending.append(key)
+        return found, pending
+
+    def _get_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        if not keys:
+            return {}
+        placeholders = ",".join("?" for _ in keys)
+        with self._disk_lock:
+            rows = self._connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                keys,
+            ).fetchall()
+            if rows:
+                # one update and one commit for all hits of the lookup
+                now = time.time()
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key, _ in rows],
+                )
+                self._connection.commit()
+        found = {key: np.frombuffer(blob, dtype=np.float32).tolist() for key, blob in rows}
+        with self._lock:
+            for key, vector in found.items():
+                self._remember(key, vector)
+            self.disk_hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Looks up the keys in the memory tier first and in the disk tier second.
+
+        Returns:
+            dict: The vectors found, keyed by cache key. Missing keys are absent.
+        """
+        found, pending = self._get_memory(keys)
+        found.update(self._get_disk(pending))
+        return found
+
+    async def aget_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Async version of `get_many`, only the keys missing in memory are looked up on disk in a worker thread.
+        """
+        found, pending = self._get_memory(keys)
+        if pending:
+            found.update(await asyncio.to_thread(self._get_disk, pending))
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """
+        Stores the vectors in both tiers and evicts the least recently used disk entries if needed.
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+        placeholders = ",".join("?" for _ in rows)
+        with self._disk_lock:
+            # replaced vectors no longer count towards the size on disk
+            replaced = self._connection.execute(
+                f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({placeholders})",
+                [key for key, _, _ in rows],
+            ).fetchone()[0]
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._disk_bytes += sum(len(blob) for _, blob, _ in rows) - replaced
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict()
+            self._connection.commit()
+
+    async def aput_many(self, items: Dict[str, List[float]]) -> None:
+        """
+        Async version of `put_many`, the vectors are written to disk in a worker thread.
+        """
+        if items:
+            await asyncio.to_thread(self.put_many, items)
+
+    def _evict(self) -> None:
+        # Evict down to 90% of the limit so that eviction doesn't run on every insert
+        target = int(self.disk_max_bytes * 0.9)
+        size = self._connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        cursor = self._connection.execute(
+            "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access ASC"
+        )
+        evicted = []
+        for key, length in cursor:
+            if size <= target:
+                break
+            evicted.append((key,))
+            size -= length
+        self._connection.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+        self._disk_bytes = size
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters together with the current size of both tiers.
+        """
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    An embeddings wrapper that serves repeated texts from an `EmbeddingCache`.
+
+    Args:
+        underlying (Embeddings): The embeddings model called on cache misses.
+        model_name (str): Name of the embedding model, part of the cache key.
+        cache (EmbeddingCache): The cache shared by all wrappers of the process.
+
+    Only the texts missing in the cache are sent to the underlying model, in a single batch.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, cache: EmbeddingCache):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache = cache
+
+    def _split(self, texts: List[str]):
+        keys = [cache_key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        return keys, found, missing
+
+    async def _asplit(self, texts: List[str]):
+        keys = [cache_key(self.model_name, text) for text in texts]
+        found = await self.cache.aget_many(list(dict.fromkeys(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        return keys, found, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        keys, found, missing = self._split(texts)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+        observe_embedding(start, "documents", missing)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        keys, found, missing = self._split([text])
+        if missing:
+            vector = self.underlying.embed_query(text)
+            self.cache.put_many({keys[0]: vector})
+            observe_embedding(start, "query", missing)
+            return vector
+        observe_embedding(start, "query", missing)
+        return found[keys[0]]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        keys, found, missing = await self._asplit(texts)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            await self.cache.aput_many(computed)
+            found.update(computed)
+        observe_embedding(start, "documents", missing)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        keys, found, missing = await self._asplit([text])
+        if missing:
+            vector = await self.underlying.aembed_query(text)
+            await self.cache.aput_many({keys[0]: vector})
+            observe_embedding(start, "query", missing)
+            return vector
+        observe_embedding(start, "query", missing)
+        return found[keys[0]]
+
+
+def observe_embedding(start: float, operation: str, missing: dict) -> None:
+    EMBEDDING_SECONDS.observe(
+        time.perf_counter() - start,
+        operation=operation,
+        cache="miss" if missing else "hit",
+    )
+
+
+@lru_cache(maxsize=None)
+def get_embedding_cache(
+    path: str, memory_items: int, disk_max_bytes: int
+) -> EmbeddingCache:
+    """
+    Returns the process wide cache for the given path, so chain rebuilds keep the warm memory tier.
+    """
+    return EmbeddingCache(path, memory_items=memory_items, disk_max_bytes=disk_max_bytes)
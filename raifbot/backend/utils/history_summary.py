@@ -0,0 +1,144 @@
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+
+from bson import ObjectId
+from langchain.prompts import PromptTemplate
+
+from backend.utils.token_counting import format_turn
+from backend.utils.token_counting import turn_tokens
+
+SUMMARY_PROMPT = PromptTemplate.from_template(
+    """Progressively summarize the conversation between a user and a fashion shopping assistant, adding onto """
+    """the previous summary and returning a new summary. Keep the requirements of the user (age, gender, """
+    """location, brand, price, availability) and the recommended products, drop greetings and small talk.
+
+Previous summary:
+{summary}
+
+New lines of conversation:
+{turns}
+
+New summary:"""
+)
+
+
+async def update_summary(
+    db: object,
+    session_id: str,
+    llm: object,
+    threshold_tokens: int = 1000,
+    keep_turns: int = 1,
+) -> bool:
+    """
+    Folds the turns not yet covered by the rolling summary of a session into it.
+
+    Args:
+        db (object): The chat history collection.
+        session_id (str): The session ID.
+        llm (object): The (cheap) chat model writing the summary.
+        threshold_tokens (int): The summary is only updated once the un-summarized turns have at least this many tokens.
+        keep_turns (int): Number of most recent turns which are always left out of the summary, they are put
+            into the prompt verbatim.
+
+    Returns:
+        bool: Whether the summary was updated.
+
+    The summary is stored in the `summary` field of the session document and `summarized` counts the turns it
+    covers. The update is conditional on `summarized`, so a concurrent update of the same session is not overwritten.
+    """
+    oid = ObjectId(session_id)
+    docs = await db.aggregate(
+        [
+            {"$match": {"_id": oid}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "summary": {"$ifNull": ["$summary", ""]},
+                    "summarized": {"$ifNull": ["$summarized", 0]},
+                    "total": {"$size": "$chat_history"},
+                }
+            },
+        ]
+    ).to_list(length=1)
+    if not docs:
+        return False
+    summary, summarized, total = (
+        docs[0]["summary"],
+        docs[0]["summarized"],
+        docs[0]["total"],
+    )
+    count = total - keep_turns - summarized
+    if count <= 0:
+        return False
+
+    doc = await db.find_one(
+        {"_id": oid}, {"_id": 0, "chat_history": {"$slice": [summarized, count]}}
+    )
+    turns = doc["chat_history"]
+    if sum(turn_tokens(turn) for turn in turns) < threshold_tokens:
+        return False
+
+    message = await llm.ainvoke(
+        SUMMARY_PROMPT.format(
+            summary=summary or "(empty)",
+            turns="\n\n".join(format_turn(turn) for turn in turns),
+        )
+    )
+    # documents without a summary yet have no summarized field
+    expected = summarized if summarized else {"$in": [0, None]}
+    result = await db.update_one(
+        {"_id": oid, "summarized": expected},
+        {
+            "$set": {
+                "summary": message.content.strip(),
+                "summarized": summarized + len(turns),
+            }
+        },
+    )
+    return result.modified_count == 1
+
+
+class SummaryScheduler:
+    """
+    Runs the summary updates in background tasks, off the request path.
+
+    Args:
+        update (Callable): Coroutine function updating the summary of one session, called with the session ID.
+
+    At most one update per session runs at a time. A save arriving during the update schedules one more run,
+    so the turns it added are considered too.
+    """
+
+    def __init__(self, update: Callable):
+        self.update = update
+        self._running: Dict[str, asyncio.Task] = {}
+        self._again = set()
+
+    def schedule(self, session_id: str) -> None:
+        if session_id in self._running:
+            self._again.add(session_id)
+            return
+        self._running[session_id] = asyncio.create_task(self._run(session_id))
+
+    async def _run(self, session_id: str) -> None:
+        try:
+            while True:
+                try:
+                    await self.update(session_id)
+                except Exception as e:
+                    logging.error(
+                        f"Failed to update summary of session {session_id}: {e}"
+                    )
+                if session_id not in self._again:
+                    break
+                self._again.discard(session_id)
+        finally:
+            del self._running[session_id]
+
+    async def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Waits for the running updates on shutdown.
+        """
+        if self._running:
+            await asyncio.wait(list(self._running.values()), timeout=timeout)
@@ -0,0 +1,334 @@
+import json
+import os
+import uuid
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+INDEX_FILE = "index.json"
+MATRIX_FILE = "embeddings.f32"
+METADATA_FILE = "metadata.jsonl"
+
+
+class LocalVectorStore(VectorStore):
+    """
+    An embedded vector store used as a drop-in replacement for the Pinecone index.
+
+    The product embeddings are kept in a memory-mapped float32 matrix (one unit-normed row per document)
+    and the document texts and metadata in a JSON lines sidecar file. Search is an exact cosine top-k computed
+    with NumPy, so no external service is needed for a catalog of the size of the Pinterest dataset.
+
+    Args:
+        path (str): Directory holding the index files. It is created on the first write.
+        embedding (Embeddings): The embeddings model used to embed queries and added texts.
+
+    Scores follow the Pinecone conventions: `similarity_search_with_score` returns raw cosine similarity
+    in [-1, 1] and relevance scores used by `similarity_score_threshold` are mapped to [0, 1].
+    """
+
+    def __init__(self, path: str, embedding: Embeddings) -> None:
+        self.path = path
+        self._embedding = embedding
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._columns: dict = {}
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self) -> None:
+        """
+        Loads the index header, the metadata sidecar and memory-maps the embedding matrix if the index exists.
+        """
+        if not os.path.exists(self._file(INDEX_FILE)):
+            return
+
+        with open(self._file(INDEX_FILE), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        count, dimension = header["count"], header["dimension"]
+
+        self._ids, self._texts, self._metadatas = [], [], []
+        self._columns = {}
+        with open(self._file(METADATA_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                if len(self._ids) == count:
+                    break
+                row = json.loads(line)
+                self._ids.append(row["id"])
+                self._texts.append(row["text"])
+                self._metadatas.append(row["metadata"])
+
+        if count == 0:
+            self._matrix = np.empty((0, dimension), dtype=np.float32)
+        else:
+            self._matrix = np.memmap(
+                self._file(MATRIX_FILE),
+                dtype=np.float32,
+                mode="r",
+                shape=(count, dimension),
+            )
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _discard_uncommitted_rows(self, dimension: int) -> None:
+        """
+        Drops rows written after the last header update, e.g. by a write that crashed half way.
+        """
+        count = len(self._ids)
+        if os.path.exists(self._file(MATRIX_FILE)):
+            with open(self._file(MATRIX_FILE), "r+b") as f:
+                f.truncate(count * dimension * np.dtype(np.float32).itemsize)
+        if os.path.exists(self._file(METADATA_FILE)):
+            with open(self._file(METADATA_FILE), "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            if len(lines) != count:
+                with open(self._file(METADATA_FILE), "w", encoding="utf-8") as f:
+                    f.writelines(lines[:count])
+
+    def add_vectors(
+        self,
+        texts: List[str],
+        vectors: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """
+        Appends already embedded texts to the index files and remaps the matrix.
+
+        Args:
+            texts (List[str]): The document texts.
+            vectors (List[List[float]]): Embeddings of the texts, in the same order.
+            metadatas (List[dict], optional): Metadata stored with each document.
+            ids (List[str], optional): Document ids, random UUIDs are generated when not provided.
+
+        Returns:
+            List[str]: The ids of the added documents.
+        """
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        matrix = self._normalize(np.asarray(vectors, dtype=np.float32))
+        if len(self._ids) and matrix.shape[1] != self._matrix.shape[1]:
+            raise ValueError(
+                f"Embedding dimension {matrix.shape[1]} does not match index dimension {self._matrix.shape[1]}"
+            )
+
+        os.makedirs(self.path, exist_ok=True)
+        self._discard_uncommitted_rows(matrix.shape[1])
+        with open(self._file(MATRIX_FILE), "ab") as f:
+            f.write(np.ascontiguousarray(matrix).tobytes())
+        with open(self._file(METADATA_FILE), "a", encoding="utf-8") as f:
+            for id_, text, metadata in zip(ids, texts, metadatas):
+                f.write(
+                    json.dumps({"id": id_, "text": text, "metadata": metadata}) + "\n"
+                )
+        # The header is written last so a crashed write never exposes partial rows
+        with open(self._file(INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump(
+                {"count": len(self._ids) + len(ids), "dimension": matrix.shape[1]}, f
+            )
+
+        self._load()
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        vectors = self._embedding.embed_documents(texts)
+        return self.add_vectors(texts, vectors, metadatas=metadatas, ids=ids)
+
+    def _column(self, field: str) -> np.ndarray:
+        # Metadata fields are turned into arrays on first use, so filters are evaluated vectorized
+        if field not in self._columns:
+            column = np.empty(len(self._metadatas), dtype=object)
+            column[:] = [metadata.get(field) for metadata in self._metadatas]
+            self._columns[field] = column
+        return self._columns[field]
+
+    def _numeric_column(self, field: str) -> np.ndarray:
+        key = f"{field}#numeric"
+        if key not in self._columns:
+            self._columns[key] = np.array(
+                [
+                    value if isinstance(value, (int, float)) else np.nan
+                    for value in self._column(field)
+                ],
+                dtype=np.float64,
+            )
+        return self._columns[key]
+
+    def _filter_mask(self, filter: dict) -> np.ndarray:
+        """
+        Evaluates a Pinecone style metadata filter over the whole catalog.
+
+        Supported are implicit equality, `$eq`, `$ne`, `$gt`, `$gte`, `$lt`, `$lte`, `$in`, `$nin` and the
+        `$and` / `$or` combinations. Documents missing a field never match a condition on it.
+        """
+        mask = np.ones(len(self._ids), dtype=bool)
+        for field, condition in filter.items():
+            if field == "$and":
+                for sub_filter in condition:
+                    mask &= self._filter_mask(sub_filter)
+                continue
+            if field == "$or":
+                any_mask = np.zeros(len(self._ids), dtype=bool)
+                for sub_filter in condition:
+                    any_mask |= self._filter_mask(sub_filter)
+                mask &= any_mask
+                continue
+
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            column = self._column(field)
+            present = np.array([value is not None for value in column], dtype=bool)
+            for operator, value in condition.items():
+                if operator == "$eq":
+                    mask &= column == value
+                elif operator == "$ne":
+                    mask &= present & (column != value)
+                elif operator == "$in":
+                    mask &= np.isin(column, list(value))
+                elif operator == "$nin":
+                    mask &= present & ~np.isin(column, list(value))
+                elif operator in ("$gt", "$gte", "$lt", "$lte"):
+                    numeric = self._numeric_column(field)
+                    with np.errstate(invalid="ignore"):
+                        if operator == "$gt":
+                            mask &= numeric > value
+                        elif operator == "$gte":
+                            mask &= numeric >= value
+                        elif operator == "$lt":
+                            mask &= numeric < value
+                        else:
+                            mask &= numeric <= value
+                else:
+                    raise ValueError(f"Unsupported filter operator {operator}")
+        return mask
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        *,
+        k: int = 4,
+        filter: Optional[dict] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Returns the k documents most similar to the embedding together with their cosine similarity.
+        The optional metadata filter pre-filters the catalog before the top-k selection.
+        """
+        if len(self._ids) == 0 or k <= 0:
+            return []
+
+        query = self._normalize(np.asarray(embedding, dtype=np.float32))
+        scores = self._matrix @ query
+
+        if filter:
+            mask = self._filter_mask(filter)
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, int(mask.sum()))
+            if k == 0:
+                return []
+
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            (
+                Document(
+                    page_content=self._texts[i], metadata=dict(self._metadatas[i])
+                ),
+                float(scores[i]),
+            )
+            for i in top
+        ]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self._embedding.embed_query(query), k=k, filter=filter
+        )
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        **kwargs: Any,
+    ) -> List[Document]:
+        docs_and_scores = self.similarity_search_with_score(query, k=k, **kwargs)
+        return [doc for doc, _ in docs_and_scores]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        docs_and_scores = self.similarity_search_by_vector_with_score(
+            embedding, k=k, filter=kwargs.get("filter")
+        )
+        return [doc for doc, _ in docs_and_scores]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return self._cosine_relevance_score_fn
+
+    @staticmethod
+    def _cosine_relevance_score_fn(score: float) -> float:
+        """Cosine similarity in [-1, 1] is mapped to [0, 1] the same way as in Pinecone"""
+        return (score + 1) / 2
+
+    @classmethod
+    def from_existing_index(cls, path: str, embedding: Embeddings):
+        """
+        Opens an existing local index.
+
+        Raises:
+            FileNotFoundError: If there is no index at the given path.
+        """
+        if not os.path.exists(os.path.join(path, INDEX_FILE)):
+            raise FileNotFoundError(f"There is no local vector index at {path}")
+        return cls(path, embedding)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        path: str = "local_store",
+        **kwargs: Any,
+    ):
+        store = cls(path, embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=kwargs.get("ids"))
+        return store
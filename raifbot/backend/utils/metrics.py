@@ -0,0 +1,341 @@
+import bisect
+import contextlib
+import threading
+import time
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ITERATION_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10)
+# Operations of the chat history collection timed by InstrumentedCollection
+MONGO_OPERATIONS = {
+    "update_one",
+    "bulk_write",
+    "find_one",
+    "delete_one",
+    "delete_many",
+}
+
+registry: List["Metric"] = []
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{escape_label(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base class of the metrics of the process, registered for the text exposition format on creation.
+
+    Args:
+        name (str): Metric name.
+        help (str): Description shown in the `# HELP` line.
+        labelnames (Sequence[str]): Names of the labels, the values are passed as keyword arguments.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    A monotonically increasing count, e.g. of routing decisions.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+
+class Gauge(Counter):
+    """
+    A value going up and down, e.g. the number of streams in flight.
+    """
+
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """
+    Counts observations in cumulative buckets, e.g. durations of a stage.
+
+    An observation is a binary search of the bucket and two additions under a lock, so it can be recorded
+    on the hot path of every request.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: the counts of the buckets and of +Inf, then the sum of the observations
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str):
+        """
+        Observes the duration of the block in seconds, also when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = [(key, list(values)) for key, values in self._series.items()]
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                labels = format_labels(
+                    self.labelnames + ("le",), key + (format_value(bound),)
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {format_value(values[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+def render_metrics() -> str:
+    """
+    Renders all metrics of the process in the Prometheus text exposition format.
+    """
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "raifbot_http_request_duration_seconds",
+    "Duration of HTTP requests until the last byte of the response, including streams.",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "raifbot_http_requests_in_flight", "HTTP requests being processed.", ("method",)
+)
+STREAMS_IN_FLIGHT = Gauge(
+    "raifbot_streams_in_flight", "Event streams being sent.", ("route",)
+)
+EMBEDDING_SECONDS = Histogram(
+    "raifbot_embedding_duration_seconds",
+    "Duration of embedding calls, served from the embedding cache or from the model.",
+    ("operation", "cache"),
+)
+RETRIEVAL_SECONDS = Histogram(
+    "raifbot_retrieval_duration_seconds",
+    "Duration of vector store retrievals, including the query embedding.",
+)
+TOOL_SECONDS = Histogram(
+    "raifbot_tool_duration_seconds", "Duration of agent tool calls.", ("tool",)
+)
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "raifbot_llm_time_to_first_token_seconds",
+    "Time from an LLM call to its first streamed token.",
+)
+LLM_SECONDS = Histogram(
+    "raifbot_llm_duration_seconds", "Duration of LLM calls.", ("status",)
+)
+AGENT_ITERATIONS = Histogram(
+    "raifbot_agent_iterations",
+    "Number of tool calls of an agent run before its final answer.",
+    buckets=ITERATION_BUCKETS,
+)
+AGENT_RUNS_IN_FLIGHT = Gauge("raifbot_agent_runs_in_flight", "Agent runs in progress.")
+CHAT_ROUTES = Counter(
+    "raifbot_chat_routes_total",
+    "Chat queries answered by the retrieval fast path or by the agent.",
+    ("route",),
+)
+CHAIN_REBUILD_SECONDS = Histogram(
+    "raifbot_chain_rebuild_duration_seconds",
+    "Duration of conversational chain rebuilds, including the probe.",
+    ("status",),
+)
+CHAIN_GENERATION = Gauge(
+    "raifbot_chain_generation", "Generation of the conversational chain serving requests."
+)
+BATCH_ITEMS = Counter(
+    "raifbot_batch_items_total", "Items of /chat_batch answered, by status.", ("status",)
+)
+CHAT_HISTORY_DROPPED_TURNS = Counter(
+    "raifbot_chat_history_dropped_turns_total",
+    "Acknowledged chat history turns dropped after the write-behind flushes failed.",
+)
+MONGO_SECONDS = Histogram(
+    "raifbot_mongo_operation_duration_seconds",
+    "Duration of chat history database operations.",
+    ("operation",),
+)
+
+
+class TimedCursor:
+    """
+    Wraps a Motor cursor, so reading it into a list is timed as one operation.
+    """
+
+    def __init__(self, cursor: object, operation: str):
+        self._cursor = cursor
+        self._operation = operation
+
+    async def to_list(self, *args, **kwargs):
+        with MONGO_SECONDS.time(operation=self._operation):
+            return await self._cursor.to_list(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedCollection:
+    """
+    Wraps the chat history collection and records the duration of its operations by type.
+    """
+
+    def __init__(self, collection: object):
+        self._collection = collection
+
+    def aggregate(self, *args, **kwargs) -> TimedCursor:
+        return TimedCursor(self._collection.aggregate(*args, **kwargs), "aggregate")
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._collection, name)
+        if name not in MONGO_OPERATIONS:
+            return attribute
+
+        async def timed(*args, **kwargs):
+            with MONGO_SECONDS.time(operation=name):
+                return await attribute(*args, **kwargs)
+
+        return timed
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the duration of HTTP requests by route and the requests and streams in flight.
+
+    The duration is measured until the last chunk of the response body was sent, so streamed answers are
+    counted in full. The route is the path template (e.g. `/get_chat_history/{session_id}`), which keeps the
+    number of series bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        status = "500"
+        stream_route = None
+        finished = False
+
+        def route() -> str:
+            matched = scope.get("route")
+            return getattr(matched, "path", "unmatched")
+
+        def finish() -> None:
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method=method, route=route(), status=status
+            )
+            HTTP_REQUESTS_IN_FLIGHT.dec(method=method)
+            if stream_route is not None:
+                STREAMS_IN_FLIGHT.dec(route=stream_route)
+
+        async def send_with_metrics(message):
+            nonlocal status, stream_route
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+                headers = dict(message.get("headers", []))
+                if headers.get(b"content-type", b"").startswith(b"text/event-stream"):
+                    stream_route = route()
+                    STREAMS_IN_FLIGHT.inc(route=stream_route)
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                finish()
+
+        HTTP_REQUESTS_IN_FLIGHT.inc(method=method)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            # also ends requests failing or disconnected before their last chunk
+            finish()
@@ -0,0 +1,92 @@
+from typing import List, Optional, Set
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.pydantic_v1 import Field
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from backend.utils.constraint_extraction import extract_filter
+from backend.utils.reranker import Reranker
+
+
+def indexed_fields(vectorstore: VectorStore) -> Set[str]:
+    """
+    Returns the metadata fields of a document of the vector store, e.g. to check whether an index created before
+    the filters were introduced carries `brand`, `category` and `price` at all.
+    """
+    docs = vectorstore.similarity_search("product", k=1)
+    return set(docs[0].metadata) if docs else set()
+
+
+class ProductRetriever(BaseRetriever):
+    """
+    A product retriever pushing the requirements of the query down to the vector store as a metadata filter.
+
+    Attributes:
+        vectorstore (VectorStore): The Pinecone index or the local vector store.
+        search_kwargs (dict): Keyword arguments of the relevance score search, e.g. `k` and `score_threshold`.
+        use_filters (bool): Whether constraints extracted from the query are applied.
+        filter_fields (Set[str]): Optional metadata fields of the index, constraints on other fields are dropped,
+            so they don't empty every filtered search.
+        reranker (Reranker): Optional reranking of the candidates by similarity and business signals, keeping
+            its `top_k` of the `k` candidates searched.
+
+    When the filtered search finds nothing, the retriever falls back to the plain similarity search, so the agent
+    can still explain which requirement the closest products don't meet.
+    """
+
+    vectorstore: VectorStore
+    search_kwargs: dict = Field(default_factory=dict)
+    use_filters: bool = True
+    filter_fields: Optional[Set[str]] = None
+    reranker: Optional[Reranker] = None
+
+    def _filter(self, query: str):
+        if not self.use_filters:
+            return {}
+        return {
+            field: condition
+            for field, condition in extract_filter(query).items()
+            if self.filter_fields is None or field in self.filter_fields
+        }
+
+    def _select(self, query: str, docs_and_scores: list) -> List[Document]:
+        if self.reranker is None:
+            return [doc for doc, _ in docs_and_scores]
+        return self.reranker.rerank(docs_and_scores, extract_filter(query))
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        filter = self._filter(query)
+        docs_and_scores = []
+        if filter:
+            docs_and_scores = self.vectorstore.similarity_search_with_relevance_scores(
+                query, filter=filter, **self.search_kwargs
+            )
+        if not docs_and_scores:
+            docs_and_scores = self.vectorstore.similarity_search_with_relevance_scores(
+                query, **self.search_kwargs
+            )
+        return self._select(query, docs_and_scores)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        filter = self._filter(query)
+        docs_and_scores = []
+        if filter:
+            docs_and_scores = (
+                await self.vectorstore.asimilarity_search_with_relevance_scores(
+                    query, filter=filter, **self.search_kwargs
+                )
+            )
+        if not docs_and_scores:
+            docs_and_scores = (
+                await self.vectorstore.asimilarity_search_with_relevance_scores(
+                    query, **self.search_kwargs
+                )
+            )
+        return self._select(query, docs_and_scores)
@@ -0,0 +1,152 @@
+import asyncio
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.utils.catalog import CATEGORIES
+from backend.utils.catalog import NEGATIVE_SOURCE
+from backend.utils.catalog import NEGATIVE_TEXTS
+from backend.utils.constraint_extraction import extract_filter
+from backend.utils.metrics import CHAT_ROUTES
+
+# Tag of the runs of the fast path, their LLM answers in plain text instead of the JSON actions of the agent
+FAST_PATH_TAG = "rag_fast_path"
+
+# Questions needing fresh or general information from the web stay with the agent and its DuckDuckGo tool
+WEB_MARKERS = re.compile(
+    r"\b(?:news|latest|today|tonight|tomorrow|yesterday|this (?:week|month|year)|weather|"
+    r"history of|founded|founder|ceo|stock price|stock market|shares|share price|market cap|revenue|"
+    r"search the web|internet|websites?|google)\b|https?://|www\.",
+    re.IGNORECASE,
+)
+# General knowledge questions ("Who painted ...", "When did ...") aren't about the catalog either
+GENERAL_QUESTION = re.compile(r"^\W*(?:who|whom|whose|when|why)\b", re.IGNORECASE)
+# Wording of a product request, a query naming a brand or category without it is decided by the centroids
+PRODUCT_REQUEST = re.compile(
+    r"\b(?:recommend\w*|suggest\w*|looking for|look for|show me|find me|i need|i want|buy|shop\w*|"
+    r"options?|ideas?|something|anything|which|cheap\w*|affordable|budget|under|below|between)\b",
+    re.IGNORECASE,
+)
+# The frontend sends the previous turns in the prompt, the current question follows this marker
+HISTORY_MARKER = "answer following input question:"
+# Prototypes of in-domain queries, their centroid is compared with the centroid of the off-topic documents
+IN_DOMAIN_TEXTS = [f"Recommend {category.lower()}" for category in CATEGORIES] + [
+    "Recommend fashion products with a high rating within my budget",
+    "Which clothes and accessories are available for women and men",
+]
+
+
+def current_question(prompt: str) -> str:
+    """
+    Returns the current question of a prompt, without the chat history the frontend puts in front of it.
+    """
+    head, marker, question = prompt.rpartition(HISTORY_MARKER)
+    return question.strip() if marker else prompt
+
+
+def centroid(vectors: List[List[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    mean = matrix.mean(axis=0)
+    return mean / max(np.linalg.norm(mean), 1e-12)
+
+
+class QueryRouter:
+    """
+    A cheap local decision whether a query is clearly about the product catalog.
+
+    Args:
+        embeddings (Embeddings): The cached query embeddings model, so the routed query is embedded once
+            for the routing and the retrieval.
+        margin (float): Minimum difference of the cosine similarities of the query to the centroid of the
+            in-domain prototypes and to the centroid of the off-topic documents of the index.
+
+    Queries asking for web information go to the agent. Product requests naming a brand or a product category
+    of the catalog, or carrying constraints such as a price, take the fast path without an embedding. The
+    remaining queries, including other mentions of a brand, are decided by the centroids, which are embedded
+    on the first use.
+    """
+
+    def __init__(self, embeddings: Embeddings, margin: float = 0.02):
+        self.embeddings = embeddings
+        self.margin = margin
+        self._centroids: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    async def centroids(self) -> Tuple[np.ndarray, np.ndarray]:
+        # concurrent first calls may embed the prototypes twice, the embedding cache makes it cheap
+        if self._centroids is None:
+            inside, outside = await asyncio.gather(
+                self.embeddings.aembed_documents(IN_DOMAIN_TEXTS),
+                self.embeddings.aembed_documents(NEGATIVE_TEXTS),
+            )
+            self._centroids = (centroid(inside), centroid(outside))
+        return self._centroids
+
+    async def aroute(self, query: str) -> str:
+        """
+        Returns "rag" for clearly in-domain queries and "agent" for the others.
+        """
+        if WEB_MARKERS.search(query) or GENERAL_QUESTION.search(query):
+            return "agent"
+        filter = extract_filter(query)
+        catalog = "brand" in filter or "category" in filter
+        constraints = set(filter) - {"brand", "category"}
+        if catalog and (constraints or PRODUCT_REQUEST.search(query)):
+            return "rag"
+        inside, outside = await self.centroids()
+        vector = centroid([await self.embeddings.aembed_query(query)])
+        return "rag" if vector @ inside - vector @ outside >= self.margin else "agent"
+
+
+class FastPathAgent:
+    """
+    Wraps the agent: clearly in-domain queries are answered with one retrieval and one streamed call of the
+    product recommendation chain, all other queries and queries without a matching product go to the agent.
+
+    Args:
+        agent (object): The ReAct agent.
+        retriever (object): The product retriever.
+        llm_chain (object): The chain answering from the retrieved products (`input` and `context`).
+        router (QueryRouter): Decides which queries take the fast path.
+
+    It has the `acall` interface of the agent, so the streaming and non-streaming endpoints use it unchanged.
+    The routing and the retrieval only see the current question, constraints of earlier turns in the chat
+    history must not decide about a follow-up. The chain still gets the whole prompt to answer in context.
+    The fast path costs one LLM call instead of at least two (plan, then final answer) of the agent.
+    """
+
+    def __init__(
+        self, agent: object, retriever: object, llm_chain: object, router: QueryRouter
+    ):
+        self.agent = agent
+        self.retriever = retriever
+        self.llm_chain = llm_chain
+        self.router = router
+
+    async def acall(self, inputs: dict, callbacks: Optional[list] = None, **kwargs):
+        # /chat passes the Query model, /chat_no_stream the string
+        query = getattr(inputs["input"], "text", inputs["input"])
+        question = current_question(query)
+        if await self.router.aroute(question) == "rag":
+            docs = await self.retriever.ainvoke(
+                question, config={"callbacks": callbacks, "tags": [FAST_PATH_TAG]}
+            )
+            products = [
+                doc for doc in docs if doc.metadata.get("source") != NEGATIVE_SOURCE
+            ]
+            if products:
+                CHAT_ROUTES.inc(route="rag")
+                outputs = await self.llm_chain.acall(
+                    {
+                        "input": query,
+                        "context": "\n".join(doc.page_content for doc in products),
+                    },
+                    callbacks=callbacks,
+                    tags=[FAST_PATH_TAG],
+                )
+                return {**inputs, "output": outputs[self.llm_chain.output_key]}
+
+        CHAT_ROUTES.inc(route="agent")
+        return await self.agent.acall(inputs=inputs, callbacks=callbacks, **kwargs)
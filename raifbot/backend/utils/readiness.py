@@ -0,0 +1,89 @@
+import asyncio
+import contextlib
+import copy
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, Set
+
+
+class Readiness:
+    """
+    Tracks the initialization of the components the backend needs before it can serve traffic.
+
+    Args:
+        components (Iterable[str]): Names of the required components, all of them are "pending" at first.
+
+    Every component has a state ("pending", "starting", "ready" or "failed"), the duration of its
+    initialization and the error it failed with. The backend is ready once all components are ready.
+    """
+
+    def __init__(self, components: Iterable[str]):
+        self.started = time.perf_counter()
+        self.components: Dict[str, dict] = {
+            name: {"state": "pending"} for name in components
+        }
+        self._tasks: Set[asyncio.Task] = set()
+
+    @contextlib.contextmanager
+    def track(self, name: str) -> Iterator[dict]:
+        """
+        Marks the component as starting, then as ready or as failed when the block raises.
+
+        Yields:
+            dict: The state of the component, details of the initialization (e.g. step timings) can be added.
+        """
+        component = self.components.setdefault(name, {})
+        component.clear()
+        component["state"] = "starting"
+        start = time.perf_counter()
+        try:
+            yield component
+        except BaseException as e:
+            component.update(state="failed", error=str(e) or type(e).__name__)
+            raise
+        else:
+            component["state"] = "ready"
+        finally:
+            component["seconds"] = round(time.perf_counter() - start, 3)
+
+    def start(self, name: str, init: Callable[[], Awaitable[None]]) -> asyncio.Task:
+        """
+        Initializes the component in a background task, so startup doesn't wait for it.
+        """
+
+        async def run():
+            try:
+                with self.track(name):
+                    await init()
+            except Exception as e:
+                logging.error(f"Initialization of {name} failed: {e}")
+
+        # reported as starting right away, not with the state of a previous initialization
+        self.components[name] = {"state": "starting"}
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def close(self) -> None:
+        """
+        Cancels the initializations still running on shutdown.
+        """
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def is_ready(self) -> bool:
+        return all(c["state"] == "ready" for c in self.components.values())
+
+    def report(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "uptime_seconds": round(time.perf_counter() - self.started, 3),
+            "components": copy.deepcopy(self.components),
+        }
+
+
+# the chain is built on startup, the database and the warm-up are initialized in the background
+readiness = Readiness(["chain", "mongo", "warmup"])
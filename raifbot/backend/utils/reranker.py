@@ -0,0 +1,125 @@
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+AVAILABLE = "Available"
+
+
+def impute(column: np.ndarray) -> np.ndarray:
+    # a missing signal (e.g. of an off-topic document) counts as the average of the candidates
+    present = ~np.isnan(column)
+    if not present.any():
+        return np.zeros_like(column)
+    return np.where(present, column, column[present].mean())
+
+
+def min_max(column: np.ndarray) -> np.ndarray:
+    low, high = column.min(), column.max()
+    if high <= low:
+        return np.ones_like(column)
+    return (column - low) / (high - low)
+
+
+def max_scale(column: np.ndarray) -> np.ndarray:
+    # keeps the ratios, e.g. a rating of 4 is worth 0.8 of a rating of 5
+    high = column.max()
+    return column / high if high > 0 else np.ones_like(column)
+
+
+def price_fit(prices: np.ndarray, price: Optional[dict]) -> np.ndarray:
+    """
+    1 for prices within the requested range, decreasing linearly with the relative distance to it.
+    Without a requested price every product fits the same.
+    """
+    if not price:
+        return np.full_like(prices, np.nan)
+    low = price.get("$gte", price.get("$gt", 0.0))
+    high = price.get("$lte", price.get("$lt", math.inf))
+    below = np.maximum(low - prices, 0) / max(low, 1.0)
+    above = np.maximum(prices - high, 0) / high if math.isfinite(high) else 0.0
+    return 1 - np.clip(below + above, 0, 1)
+
+
+class Reranker:
+    """
+    Reorders the candidates of a product search by a weighted sum of their similarity and business signals,
+    and keeps the best `top_k`.
+
+    Args:
+        top_k (int): Number of documents returned.
+        similarity (float): Weight of the relevance score of the vector store.
+        ratings (float): Weight of the product rating.
+        click_rate (float): Weight of the click rate.
+        price_fit (float): Weight of the fit of the price to the price requested in the query.
+        availability (float): Weight of the product being available.
+
+    The signals of all candidates are scored at once with NumPy. The similarity is scaled to [0, 1] over the
+    candidates, ratings and click rates are divided by their maximum, so the weights don't depend on the units
+    of the fields.
+    """
+
+    def __init__(
+        self,
+        top_k: int = 4,
+        similarity: float = 0.5,
+        ratings: float = 0.2,
+        click_rate: float = 0.1,
+        price_fit: float = 0.1,
+        availability: float = 0.1,
+    ):
+        self.top_k = top_k
+        self.weights = np.array(
+            [similarity, ratings, click_rate, price_fit, availability]
+        )
+
+    def scores(
+        self, docs_and_scores: List[Tuple[Document, float]], constraints: dict
+    ) -> np.ndarray:
+        metadatas = [doc.metadata for doc, _ in docs_and_scores]
+
+        def column(field: str) -> np.ndarray:
+            return np.array(
+                [
+                    value if isinstance(value, (int, float)) else np.nan
+                    for value in (metadata.get(field) for metadata in metadatas)
+                ],
+                dtype=np.float64,
+            )
+
+        availability = np.array(
+            [
+                (
+                    np.nan
+                    if "availability" not in m
+                    else float(m["availability"] == AVAILABLE)
+                )
+                for m in metadatas
+            ]
+        )
+        signals = np.column_stack(
+            [
+                min_max(impute(np.array([score for _, score in docs_and_scores]))),
+                max_scale(impute(column("ratings"))),
+                max_scale(impute(column("click_rate"))),
+                impute(price_fit(column("price"), constraints.get("price"))),
+                impute(availability),
+            ]
+        )
+        return signals @ self.weights
+
+    def rerank(
+        self, docs_and_scores: List[Tuple[Document, float]], constraints: dict
+    ) -> List[Document]:
+        """
+        Returns the `top_k` best documents, ties keep the order of the vector store.
+
+        Args:
+            docs_and_scores (list): The candidates with their relevance scores.
+            constraints (dict): The requirements extracted from the query, the price range is used.
+        """
+        if not docs_and_scores:
+            return []
+        order = np.argsort(-self.scores(docs_and_scores, constraints), kind="stable")
+        return [docs_and_scores[i][0] for i in order[: self.top_k]]
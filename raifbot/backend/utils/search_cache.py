@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, Tuple, Union
+
+from backend.utils.answer_cache import normalize_query
+
+
+@dataclass
+class CachedResult:
+    result: str
+    created_at: float
+    duration: float
+
+
+class SearchCache:
+    """
+    An in-process LRU cache of web search results with a time to live.
+
+    Args:
+        ttl (float): Time to live of a result in seconds.
+        max_items (int): Maximum number of results kept, the least recently used are evicted first.
+
+    Queries are matched after normalization (case, whitespace, trailing punctuation). Concurrent lookups
+    of a query being searched share the in-flight search instead of starting their own. The cache is thread
+    safe, because the agent runs sync tools in the threads of the executor.
+    """
+
+    def __init__(self, ttl: float = 3600, max_items: int = 1000):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.saved_seconds = 0.0
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> Tuple[str, Union[str, Future]]:
+        """
+        Looks a normalized query up.
+
+        Returns:
+            tuple: `("hit", result)` for a cached result, `("wait", future)` if the query is being searched,
+            otherwise `("search", future)` and the caller must search and `complete` the future.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.created_at >= time.monotonic() - self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry.duration
+                return "hit", entry.result
+            if entry is not None:
+                del self._entries[key]
+            if key in self._inflight:
+                self.coalesced += 1
+                return "wait", self._inflight[key]
+            self.misses += 1
+            future = self._inflight[key] = Future()
+            return "search", future
+
+    def complete(self, key: str, future: Future, result: str, duration: float) -> None:
+        with self._lock:
+            del self._inflight[key]
+            self._entries[key] = CachedResult(result, time.monotonic(), duration)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+        # a future cancelled by one of its waiters must not fail the search
+        if not future.cancelled():
+            future.set_result(result)
+
+    def fail(self, key: str, future: Future, error: BaseException) -> None:
+        # errors aren't cached, the next lookup searches again
+        with self._lock:
+            del self._inflight[key]
+            self.errors += 1
+        if not future.cancelled():
+            future.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "items": len(self._entries),
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+class CachedSearch:
+    """
+    Wraps a web search function (e.g. `DuckDuckGoSearchRun().run`) with a `SearchCache`.
+
+    Args:
+        search (Callable): Blocking function returning the search result of a query.
+        cache (SearchCache): The cache shared by all wrappers of the process.
+
+    `run` serves the sync tool interface and `arun` the async one, which searches in a thread, so a slow
+    search never blocks the event loop.
+    """
+
+    def __init__(self, search: Callable[[str], str], cache: SearchCache):
+        self.search = search
+        self.cache = cache
+
+    def _search(self, key: str, future: Future, query: str) -> str:
+        start = time.perf_counter()
+        try:
+            result = self.search(query)
+        except BaseException as e:
+            self.cache.fail(key, future, e)
+            raise
+        self.cache.complete(key, future, result, time.perf_counter() - start)
+        return result
+
+    def run(self, query: str) -> str:
+        key = normalize_query(query)
+        state, value = self.cache.claim(key)
+        if state == "hit":
+            return value
+        if state == "wait":
+            return value.result()
+        return self._search(key, value, query)
+
+    async def arun(self, query: str) -> str:
+        key = normalize_query(query)
+        state, value = self.cache.claim(key)
+        if state == "hit":
+            return value
+        if state == "wait":
+            # a cancelled waiter leaves the shared future to the search and the other waiters
+            return await asyncio.shield(asyncio.wrap_future(value))
+        # the search completes the shared future even if this caller is cancelled
+        return await asyncio.to_thread(self._search, key, value, query)
+
+
+@lru_cache(maxsize=None)
+def get_search_cache(ttl: float, max_items: int) -> SearchCache:
+    """
+    Returns the process wide cache, so chain rebuilds keep the cached results.
+    """
+    return SearchCache(ttl=ttl, max_items=max_items)
@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from backend.utils.answer_cache import normalize_query
+
+
+def fanout_key(
+    kind: str,
+    query: str,
+    fingerprint: Optional[str],
+    chat_history: Optional[list] = None,
+    delay: float = 0.0,
+) -> str:
+    """
+    Returns the key of identical requests: the kind of stream, the normalized prompt, the model and API key
+    fingerprint, the chat history passed to the agent and the delay of the tokens.
+
+    The frontend sends the previous turns inside the prompt, so they are part of the normalized prompt.
+    """
+    payload = json.dumps(
+        [kind, normalize_query(query), fingerprint, chat_history or [], delay]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Broadcast:
+    """
+    Runs a stream once in its own task and lets any number of subscribers read it.
+
+    Args:
+        source (AsyncIterator): The stream, e.g. the token stream of an agent run.
+        on_finish (Callable): Called once when the stream ended, failed or was abandoned.
+
+    Items are kept in a buffer, so a subscriber joining late first receives the items produced so far and then
+    tails the live ones. A subscriber disconnecting doesn't affect the others. When the last one disconnects
+    before the end, the run is cancelled.
+    """
+
+    def __init__(self, source: AsyncIterator, on_finish: Callable[[], None]):
+        self.items: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._on_finish = on_finish
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._produce(source))
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _produce(self, source: AsyncIterator) -> None:
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+            self._notify()
+            self._on_finish()
+
+    async def subscribe(self) -> AsyncIterator:
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(self.items):
+                    index += 1
+                    yield self.items[index - 1]
+                elif self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.finished:
+                # nobody listens anymore, later identical requests start a new run
+                self._on_finish()
+                self._task.cancel()
+
+
+class StreamFanout:
+    """
+    A registry of in-flight streams, so N identical concurrent requests cost one agent run.
+
+    The first request of a key starts the stream, the following ones subscribe to it until it ends.
+    Finished streams are removed right away, later requests are served by the answer cache instead.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.shared = 0
+        self._streams: Dict[str, Broadcast] = {}
+
+    def _remove(self, key: str, broadcast: Broadcast) -> None:
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    async def subscribe(
+        self, key: str, factory: Callable[[], AsyncIterator]
+    ) -> AsyncIterator:
+        """
+        Yields the items of the in-flight stream of the key, starting it with `factory` if there is none.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = Broadcast(factory(), lambda: self._remove(key, broadcast))
+            self._streams[key] = broadcast
+            self.runs += 1
+        else:
+            self.shared += 1
+        items = broadcast.subscribe()
+        try:
+            async for item in items:
+                yield item
+        finally:
+            # unsubscribes right away when the client disconnected
+            await items.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "shared": self.shared,
+            "in_flight": len(self._streams),
+        }
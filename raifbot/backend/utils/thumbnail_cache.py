@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import httpx
+
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+# Widths of the stored thumbnails, a requested width is rounded up to the next one
+WIDTHS = (64, 150, 300, 600, 1024)
+
+Fetcher = Callable[[str], Awaitable[bytes]]
+
+
+def thumbnail_key(url: str, width: int, format: str) -> str:
+    return hashlib.sha256(f"{url}\x00{width}\x00{format}".encode("utf-8")).hexdigest()
+
+
+def snap_width(width: int) -> int:
+    """
+    Rounds a requested width up to the next stored width, so clients can't create arbitrary variants.
+    """
+    return next((w for w in WIDTHS if w >= width), WIDTHS[-1])
+
+
+def make_thumbnail(data: bytes, width: int, format: str, quality: int = 80) -> bytes:
+    """
+    Resizes an image to the given width, keeping its aspect ratio, and encodes it as WebP or JPEG.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width > width:
+            height = max(round(image.height * width / image.width), 1)
+            image = image.resize((width, height), Image.LANCZOS)
+        if format == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        output = io.BytesIO()
+        image.save(output, FORMATS[format][0], quality=quality)
+        return output.getvalue()
+
+
+class HttpFetcher:
+    """
+    Downloads original images with a pooled HTTP client, from the allowed hosts only.
+
+    Redirects are followed by hand, at most `max_redirects` of them, and every target is checked against the
+    allowed hosts, so an allowed host can't redirect the server to internal addresses.
+    """
+
+    def __init__(
+        self,
+        allowed_hosts: Tuple[str, ...],
+        timeout: float = 10.0,
+        max_redirects: int = 3,
+    ):
+        self.allowed_hosts = allowed_hosts
+        self.max_redirects = max_redirects
+        self.client = httpx.AsyncClient(timeout=timeout, follow_redirects=False)
+
+    def _check(self, url: str) -> None:
+        parsed = urlparse(url)
+        if (
+            parsed.scheme not in ("http", "https")
+            or parsed.hostname not in self.allowed_hosts
+        ):
+            raise ValueError(f"Host of {url} is not allowed")
+
+    async def __call__(self, url: str) -> bytes:
+        for _ in range(self.max_redirects + 1):
+            self._check(url)
+            response = await self.client.get(url)
+            if not response.is_redirect:
+                response.raise_for_status()
+                return response.content
+            url = urljoin(url, response.headers["location"])
+        raise ValueError(f"Too many redirects fetching {url}")
+
+
+class LocalFetcher:
+    """
+    Local stand-in for the image host: reads the originals from a directory mirroring the URL paths,
+    e.g. `<root>/400x/88/70/b0/<name>.jpg` for `http://i.pinimg.com/400x/88/70/b0/<name>.jpg`.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    async def __call__(self, url: str) -> bytes:
+        path = os.path.abspath(os.path.join(self.root, urlparse(url).path.lstrip("/")))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Path of {url} is outside of the image directory")
+        return await asyncio.to_thread(_read, path)
+
+
+def _read(path: str, touch: bool = False) -> bytes:
+    with open(path, "rb") as f:
+        data = f.read()
+    if touch:
+        os.utime(path)
+    return data
+
+
+def _scan(path: str) -> "OrderedDict[str, int]":
+    files = []
+    for directory, _, names in os.walk(path):
+        for name in names:
+            if name.endswith(".tmp"):
+                continue
+            stat = os.stat(os.path.join(directory, name))
+            files.append((stat.st_mtime, os.path.join(directory, name), stat.st_size))
+    return OrderedDict((file, size) for _, file, size in sorted(files))
+
+
+def _remove(files: List[str]) -> None:
+    for file in files:
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+
+
+class ThumbnailCache:
+    """
+    A content-addressed disk store of resized product images.
+
+    Args:
+        path (str): Directory of the store.
+        fetch (Callable): Coroutine function returning the original image bytes of a URL.
+        max_bytes (int): Size budget of the store, the least recently used thumbnails are deleted above it.
+
+    Thumbnails are stored under the SHA-256 of the URL, width and format, so they never need to be invalidated
+    and can be served with immutable cache headers. Concurrent requests for a missing thumbnail fetch and
+    resize it once, in a task of its own, so a cancelled request doesn't cancel it for the others. Widths are rounded up to `WIDTHS`. The recency of a thumbnail is its modification time,
+    which is refreshed on every hit, so the order survives restarts.
+    """
+
+    def __init__(self, path: str, fetch: Fetcher, max_bytes: int = 512 * 1024**2):
+        self.path = path
+        self.fetch = fetch
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # file -> size, least recently used first, read from the disk on first use
+        self._files: Optional["OrderedDict[str, int]"] = None
+        self._bytes = 0
+
+    def file(self, key: str, format: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.{format}")
+
+    async def get(
+        self, url: str, width: int = 150, format: str = "webp"
+    ) -> Tuple[str, bytes]:
+        """
+        Returns the key and the bytes of a thumbnail, creating it on first access.
+        """
+        width = snap_width(width)
+        key = thumbnail_key(url, width, format)
+        file = self.file(key, format)
+        if self._files is None:
+            self._files = await asyncio.to_thread(_scan, self.path)
+            self._bytes = sum(self._files.values())
+        if os.path.exists(file):
+            try:
+                data = await asyncio.to_thread(_read, file, touch=True)
+            except FileNotFoundError:
+                # evicted between the check and the read, created again like any missing thumbnail
+                pass
+            else:
+                self.hits += 1
+                if file in self._files:
+                    self._files.move_to_end(file)
+                return key, data
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._create(url, width, format, file))
+            self._inflight[key] = task
+            task.add_done_callback(lambda task: self._created(key, task))
+        return key, await asyncio.shield(task)
+
+    async def _create(self, url: str, width: int, format: str, file: str) -> bytes:
+        original = await self.fetch(url)
+        data = await asyncio.to_thread(make_thumbnail, original, width, format)
+        await asyncio.to_thread(_write, file, data)
+        await self._store(file, len(data))
+        return data
+
+    def _created(self, key: str, task: asyncio.Task) -> None:
+        del self._inflight[key]
+        # retrieve the exception, so it's not reported when nobody waits anymore
+        if not task.cancelled():
+            task.exception()
+
+    async def _store(self, file: str, size: int) -> None:
+        self._bytes += size - self._files.pop(file, 0)
+        self._files[file] = size
+        evicted = []
+        # the thumbnail just written is kept, even if it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            old, old_size = self._files.popitem(last=False)
+            self._bytes -= old_size
+            evicted.append(old)
+        if evicted:
+            await asyncio.to_thread(_remove, evicted)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+async def warm_thumbnails(
+    cache: ThumbnailCache,
+    urls: List[str],
+    width: int = 150,
+    format: str = "webp",
+    concurrency: int = 8,
+) -> int:
+    """
+    Creates the thumbnails of the given images ahead of the first request, e.g. at ingestion.
+
+    Returns:
+        int: Number of images which couldn't be fetched or decoded.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def warm(url: str) -> None:
+        nonlocal failed
+        async with semaphore:
+            try:
+                await cache.get(url, width, format)
+            except Exception:
+                failed += 1
+
+    await asyncio.gather(*(warm(url) for url in dict.fromkeys(urls)))
+    return failed
+
+
+def _write(file: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    tmp = f"{file}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, file)
+
+
+def create_fetcher(source_dir: Optional[str], allowed_hosts: str) -> Fetcher:
+    """
+    Uses the local stand-in when a source directory is configured and the image host otherwise.
+    """
+    if source_dir:
+        return LocalFetcher(source_dir)
+    return HttpFetcher(
+        tuple(host.strip() for host in allowed_hosts.split(",") if host.strip())
+    )
@@ -0,0 +1,46 @@
+import logging
+from functools import lru_cache
+from typing import List, Optional
+
+ENCODING_NAME = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = ENCODING_NAME) -> Optional[object]:
+    """
+    Loads the tiktoken encoding once per process.
+
+    Returns:
+        The encoding, or None if it can't be loaded (the BPE file is downloaded on first use), in which case
+        token counts are estimated from the text length.
+    """
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logging.warning(f"Tokenizer {name} not available, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def format_turn(turn: List[str]) -> str:
+    """
+    Formats a [question, answer] turn of the chat history the way it is put into the prompt.
+    """
+    return "\n".join(
+        f"{role}: {text}" for role, text in zip(("User", "Assistant"), turn)
+    )
+
+
+def turn_tokens(turn: List[str]) -> int:
+    """
+    Number of tokens of a turn in the prompt, stored alongside the turn so it isn't tokenized again.
+    """
+    return count_tokens(format_turn(turn))
@@ -0,0 +1,296 @@
+"""
+Load test of the /chat streaming path against fakes of OpenAI, the vector store and MongoDB.
+
+Usage (from the raifbot folder):
+    python -m benchmarks.chat --streams 32 --turns 4 --tokens-per-second 50 --output benchmarks/results/chat.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import AsyncIterator, List, Optional
+
+import numpy as np
+from bson import ObjectId
+
+from backend.main import app
+from tests.fakes import asgi_stream
+from tests.fakes import fake_backend
+from tests.fakes import random_question
+from tests.fakes import split_tokens
+
+
+async def parse_sse(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple]:
+    """
+    Yields `(event, data)` tuples of a server-sent events stream.
+    """
+    buffer = ""
+    async for chunk in chunks:
+        buffer += chunk.decode("utf-8")
+        while "\n\n" in buffer:
+            frame, buffer = buffer.split("\n\n", 1)
+            fields = dict(line.split(": ", 1) for line in frame.split("\n"))
+            yield fields["event"], json.loads(fields["data"])
+
+
+class Recorder:
+    """
+    Collects the measurements of all requests.
+    """
+
+    def __init__(self):
+        self.ttft: List[float] = []
+        self.latency: List[float] = []
+        self.tokens_per_second: List[float] = []
+        self.chat_errors = 0
+        self.save_latency: List[float] = []
+        self.save_errors = 0
+
+
+async def chat_turn(recorder: Recorder, question: str) -> Optional[str]:
+    """
+    Streams an answer from /chat and records its time to first token, latency and token rate.
+
+    Returns:
+        str: The answer, or None if the request failed.
+    """
+    start = time.perf_counter()
+    first_token = None
+    answer = ""
+    try:
+        events = parse_sse(
+            asgi_stream(app, "GET", "/chat", "sse=true", {"text": question})
+        )
+        async for event, data in events:
+            if event == "token":
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                answer += data["text"]
+            elif event == "error":
+                raise RuntimeError(data["detail"])
+        if not answer:
+            raise RuntimeError("The answer is empty")
+    except Exception as e:
+        recorder.chat_errors += 1
+        logging.warning(f"Chat request failed: {e}")
+        return None
+
+    latency = time.perf_counter() - start
+    recorder.ttft.append(first_token)
+    recorder.latency.append(latency)
+    if latency > first_token:
+        recorder.tokens_per_second.append(
+            len(split_tokens(answer)) / (latency - first_token)
+        )
+    return answer
+
+
+async def save_turn(recorder: Recorder, session_id: str, question: str, answer: str):
+    """
+    Saves a turn with /save_chat_history and records its latency.
+    """
+    start = time.perf_counter()
+    try:
+        async for _ in asgi_stream(
+            app, "POST", f"/save_chat_history/{session_id}", body=[[question, answer]]
+        ):
+            pass
+    except Exception as e:
+        recorder.save_errors += 1
+        logging.warning(f"Chat history save failed: {e}")
+        return
+    recorder.save_latency.append(time.perf_counter() - start)
+
+
+async def conversation(recorder: Recorder, turns: int, rng: random.Random):
+    """
+    One simulated user asking `turns` questions in a row and saving each turn.
+    """
+    session_id = str(ObjectId())
+    for _ in range(turns):
+        question = random_question(rng)
+        answer = await chat_turn(recorder, question)
+        if answer is not None:
+            await save_turn(recorder, session_id, question, answer)
+
+
+def distribution(values: List[float]) -> Optional[dict]:
+    """
+    Mean, percentiles and maximum of the measurements.
+    """
+    if not values:
+        return None
+    array = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(array, [50, 95, 99])
+    return {
+        "mean": round(float(array.mean()), 4),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "max": round(float(array.max()), 4),
+    }
+
+
+def error_rate(errors: int, requests: int) -> float:
+    return round(errors / requests, 4) if requests else 0.0
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run_benchmark(
+    streams: int = 32,
+    turns: int = 4,
+    tokens_per_second: float = 50.0,
+    answer_tokens: int = 100,
+    catalog_size: int = 1000,
+    write_behind: bool = False,
+    answer_cache: bool = False,
+    fast_path: bool = True,
+    seed: int = 0,
+) -> dict:
+    """
+    Runs `streams` concurrent conversations of `turns` questions each against `backend.main:app` with fakes.
+
+    Args:
+        streams (int): Number of concurrent conversations.
+        turns (int): Number of questions of each conversation.
+        tokens_per_second (float): Token rate of the fake chat model.
+        answer_tokens (int): Number of words of each answer.
+        catalog_size (int): Number of synthetic products in the vector store.
+        write_behind (bool): Whether chat history saves go through the write-behind queue.
+        answer_cache (bool): Whether similar questions are answered from the answer cache.
+        fast_path (bool): Whether in-domain questions skip the agent.
+        seed (int): Seed of the catalog and the questions.
+
+    Returns:
+        dict: The configuration and the results, ready to be written as JSON.
+    """
+    config = {
+        "streams": streams,
+        "turns": turns,
+        "tokens_per_second": tokens_per_second,
+        "answer_tokens": answer_tokens,
+        "catalog_size": catalog_size,
+        "write_behind": write_behind,
+        "answer_cache": answer_cache,
+        "fast_path": fast_path,
+        "seed": seed,
+    }
+    recorder = Recorder()
+    with tempfile.TemporaryDirectory() as workdir, fake_backend(
+        workdir,
+        tokens_per_second=tokens_per_second,
+        answer_tokens=answer_tokens,
+        catalog_size=catalog_size,
+        write_behind=write_behind,
+        answer_cache=answer_cache,
+        fast_path=fast_path,
+    ) as collection:
+        async with app.router.lifespan_context(app):
+            start = time.perf_counter()
+            await asyncio.gather(
+                *(
+                    conversation(recorder, turns, random.Random(seed + i))
+                    for i in range(streams)
+                )
+            )
+            duration = time.perf_counter() - start
+        # the write-behind queue is flushed on shutdown
+        saved_turns = sum(
+            len(document.get("chat_history", []))
+            for document in collection.documents.values()
+        )
+
+    requests = streams * turns
+    saves = len(recorder.save_latency) + recorder.save_errors
+    return {
+        "benchmark": "chat",
+        "commit": current_commit(),
+        "config": config,
+        "chat": {
+            "requests": requests,
+            "errors": recorder.chat_errors,
+            "error_rate": error_rate(recorder.chat_errors, requests),
+            "time_to_first_token": distribution(recorder.ttft),
+            "latency": distribution(recorder.latency),
+            "tokens_per_second": distribution(recorder.tokens_per_second),
+            "requests_per_second": round(len(recorder.latency) / duration, 4),
+        },
+        "save_chat_history": {
+            "requests": saves,
+            "errors": recorder.save_errors,
+            "error_rate": error_rate(recorder.save_errors, saves),
+            "latency": distribution(recorder.save_latency),
+            "saved_turns": saved_turns,
+        },
+        "duration": round(duration, 4),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--streams", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=100)
+    parser.add_argument("--catalog-size", type=int, default=1000)
+    parser.add_argument("--write-behind", action="store_true")
+    parser.add_argument("--answer-cache", action="store_true")
+    parser.add_argument("--no-fast-path", dest="fast_path", action="store_false")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmarks/results/chat.json")
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="keep the agent's own output, which is otherwise discarded",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        results = asyncio.run(
+            run_benchmark(
+                streams=args.streams,
+                turns=args.turns,
+                tokens_per_second=args.tokens_per_second,
+                answer_tokens=args.answer_tokens,
+                catalog_size=args.catalog_size,
+                write_behind=args.write_behind,
+                answer_cache=args.answer_cache,
+                fast_path=args.fast_path,
+                seed=args.seed,
+            )
+        )
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+    json.dump(results, sys.stdout, indent=2, sort_keys=True)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import pytest
+from backend.config import settings
+from benchmarks.chat import run_benchmark
+
+
+@pytest.mark.asyncio
+async def test_chat_benchmark_runs_against_fakes():
+    """
+    Tests that the hermetic benchmark streams and saves every turn without errors and restores the settings.
+    """
+    vector_store = settings.VECTOR_STORE
+    results = await run_benchmark(
+        streams=3, turns=2, tokens_per_second=0, catalog_size=50
+    )
+
+    assert results["chat"]["errors"] == 0
+    assert results["chat"]["time_to_first_token"]["p99"] is not None
+    assert results["save_chat_history"]["saved_turns"] == 6
+    assert settings.VECTOR_STORE == vector_store
@@ -13,6 +13,9 @@ class Settings(BaseSettings):
     AUTHOR_NAME: str = os.getenv("AUTHOR_NAME", "default_ambeddings")
     AUTHOR_EMAIL: str = os.getenv("AUTHOR_EMAIL", "default_LLM")
     ENDPOINT: str = os.getenv("ENDPOINT", "default_MONGO_DB_KEY")
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", 1000))
+    HISTORY_MAX_TURNS: int = int(os.getenv("HISTORY_MAX_TURNS", 10))
+    STREAM_FPS: float = float(os.getenv("STREAM_FPS", 10))
 
 
 # Instantiate settings to be imported by other modules
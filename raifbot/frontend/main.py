@@ -2,7 +2,9 @@ import streamlit as st
 from config import settings
 from routers.initialization import initialize_session_state
 from routers.ibm_generative_sdk import handle_ibm_sdk
-from utils.chat_history_api_client import save_chat_history
+from utils.history_writer import get_history_writer
+from utils.thumbnails import get_thumbnail
+from utils.chat_history_api_client import prefetch_chat_history
 from routers.intro import (
     set_page_configuration,
     display_author_info,
@@ -54,40 +56,41 @@ elif selected_option == "RaifBot: Pinterest + DuckGo":
         reset_conversation(selected_option, st.session_state)
 
     if prompt := st.chat_input("Write input to chatbot"):
+        # the history is fetched while the prompt is rendered
+        history = prefetch_chat_history(
+            str(st.session_state.session_id), ENDPOINT, settings.HISTORY_MAX_TURNS
+        )
         st.chat_message("user").markdown(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
         (response, source_init, source_name, products_description) = handle_ibm_sdk(
-            prompt, ENDPOINT
+            prompt, ENDPOINT, history
         )
         parsed_message = parse_response(response)
 
         with st.chat_message("assistant"):
             try:
                 st.markdown(parsed_message)
-                save_chat_history(
-                    str(st.session_state.session_id),
-                    [[prompt, parsed_message]],
-                    ENDPOINT,
+                # saved in the background, rendering doesn't wait for the database
+                get_history_writer(ENDPOINT).put(
+                    str(st.session_state.session_id), [[prompt, parsed_message]]
                 )
                 st.session_state.messages.append(
                     {"role": "assistant", "content": parsed_message}
                 )
             except:
                 st.markdown(response)
-                save_chat_history(
-                    str(st.session_state.session_id),
-                    [[prompt, response]],
-                    ENDPOINT,
+                get_history_writer(ENDPOINT).put(
+                    str(st.session_state.session_id), [[prompt, response]]
                 )
                 st.session_state.messages.append(
                     {"role": "assistant", "content": response}
                 )
 
-            if "xxx" not in source_init:
+            if source_init and "xxx" not in source_init:
                 st.markdown("**Related products:**")
                 for i, v in enumerate(source_init):
                     st.markdown(source_name[i])
-                    st.image(v, width=150)
+                    st.image(get_thumbnail(v, ENDPOINT, width=150), width=150)
                     st.markdown(
                         f'<span style="font-size: smaller;">{products_description[i]}.</span>',
                         unsafe_allow_html=True,
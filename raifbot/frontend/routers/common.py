@@ -1,8 +1,7 @@
 # common.py
 import streamlit as st
 import bson
-import ast
-import re
+from utils.token_counting import count_tokens, format_turn
 
 
 def reset_conversation(selected_option, session_state):
@@ -28,30 +27,16 @@ def reset_conversation(selected_option, session_state):
 
 def parse_response(full_response):
     """
-    Parses the full response text to format and clean it for display.
-    It tries to replace specific characters and handle Python literal structures to ensure the response text is cleanly formatted.
+    Formats the full response text for display.
+    The backend already streams the decoded final answer, so only code fences are replaced to keep the markdown rendering stable.
 
     Args:
         full_response: The raw response text that needs to be parsed and cleaned.
 
     Returns:
         str: The parsed and cleaned response text.
-
-    Note:
-        This function attempts multiple parsing strategies and falls back to returning the raw response if parsing fails.
     """
-    try:
-        current_message = full_response.replace("```", "~~~").replace("``", "~~")
-        parsed_message_strip = current_message.strip("'\"\n ")
-        parsed_message = ast.literal_eval(f'"{parsed_message_strip}"')
-        return parsed_message
-    except:
-        try:
-            full_response = full_response.replace("\\n", "\n")
-            parsed_message = re.sub(r'`|"|}|{', " ", str(full_response))
-            return parsed_message
-        except:
-            return full_response
+    return full_response.replace("```", "~~~").replace("``", "~~").strip()
 
 
 def on_select_change():
@@ -67,20 +52,68 @@ def on_select_change():
     reset_conversation(selected_option, st.session_state)
 
 
-def set_history_prompt(query, history, level=1):
+def pack_history(history, token_counts=None, budget=1000):
+    """
+    Greedily packs the most recent turns of the chat history into a token budget.
+
+    Args:
+        history: The chat history list of [question, answer] turns, oldest first.
+        token_counts (optional): Token counts of the turns stored by the backend, aligned to the end of the history.
+            Turns without a stored count are counted locally.
+        budget (int, optional): Maximum number of tokens of the packed history. Defaults to 1000.
+
+    Returns:
+        list: The formatted turns which fit into the budget, oldest first.
+    """
+    token_counts = list(token_counts or [])[-len(history) :] if history else []
+    offset = len(history) - len(token_counts)
+    packed = []
+    used = 0
+    for i in range(len(history) - 1, -1, -1):
+        text = format_turn(history[i])
+        tokens = token_counts[i - offset] if i >= offset else count_tokens(text)
+        if used + tokens > budget:
+            break
+        packed.append(text)
+        used += tokens
+    return packed[::-1]
+
+
+def set_history_prompt(
+    query,
+    history,
+    token_counts=None,
+    budget=1000,
+    summary=None,
+    summarized=0,
+    total=None,
+):
     """
     Formats a prompt that includes the chat history and the current query.
-    It generates a prompt string that combines the recent chat history with a new query for the conversational agent.
+    It generates a prompt string that combines the rolling summary and the recent chat history with a new query for the conversational agent.
 
     Args:
         query: The current query or question to be answered.
-        history: The chat history list containing past message exchanges.
-        level (int, optional): The number of recent chat messages to include from the history. Defaults to 2.
+        history: The chat history list containing past message exchanges (the most recent turns of the session).
+        token_counts (optional): Token counts of the turns stored by the backend.
+        budget (int, optional): Maximum number of tokens of the chat history in the prompt. Defaults to 1000.
+        summary (str, optional): Rolling summary of the session kept by the backend.
+        summarized (int, optional): Number of turns covered by the summary, these are left out of the prompt.
+        total (int, optional): Total number of turns of the session. Defaults to the length of the history.
 
     Returns:
         str: A formatted prompt string combining the chat history and the current query.
     """
-    # TODO:calculate max number of tokens dynamically
-    return "Chat history: {}.\nKeep in mind the above chat history to answer following input question: {}".format(
-        str(history[-level::]), query
+    if summary:
+        # turns of the window which are not covered by the summary
+        start = max((summarized or 0) - ((total or len(history)) - len(history)), 0)
+        history = history[start:]
+        token_counts = list(token_counts or [])[-len(history) :] if history else []
+    turns = pack_history(history, token_counts, budget)
+    if summary:
+        turns.insert(0, f"Summary of the earlier conversation: {summary}")
+    if not turns:
+        return query
+    return "Chat history:\n{}\n\nKeep in mind the above chat history to answer following input question: {}".format(
+        "\n\n".join(turns), query
     )
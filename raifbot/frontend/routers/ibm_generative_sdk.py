@@ -1,56 +1,80 @@
 # ibm_generative_sdk.py
 import requests
-from routers.common import set_history_prompt, parse_response
+from routers.common import set_history_prompt
 import streamlit as st
+from config import settings
 from utils.chat_history_api_client import get_chat_history
-from utils.retrieve_function import get_source
+from utils.http_client import request
+from utils.sse_client import iter_sse_events
+from utils.stream_renderer import iter_decoded_lines
+from utils.stream_renderer import ThrottledRenderer
 
 
-def handle_ibm_sdk(prompt, end_point):
+def handle_ibm_sdk(prompt, end_point, history=None):
     """
     Handles the interaction with the IBM SDK for processing user prompts in a Streamlit app.
 
     Args:
         prompt (str): The user's input prompt.
         end_point (str): The endpoint URL of the IBM SDK service.
+        history (Future, optional): The chat history prefetched by `prefetch_chat_history`, fetched here if not provided.
         session_state (SessionState): The current session state object of Streamlit.
 
     Returns:
-        str: The full response from the IBM SDK service.
+        tuple: The full response and the urls, names and descriptions of the recommended products.
 
     This function appends the user's prompt to the session state, fetches chat history, and sends the prompt to the IBM SDK service. It then streams and displays the response.
+    The answer and the products returned by product_search arrive in one server-sent events stream, so no extra retrieval call is needed.
     """
 
     try:
-        history = get_chat_history(st.session_state.session_id, end_point)[
-            "chat_history"
-        ]
+        if history is not None:
+            saved = history.result()
+        else:
+            saved = get_chat_history(
+                st.session_state.session_id, end_point, last=settings.HISTORY_MAX_TURNS
+            )
     except:
-        history = []
+        saved = {"chat_history": []}
 
-    prompt_parsed = set_history_prompt(prompt, history, level=3)
+    prompt_parsed = set_history_prompt(
+        prompt,
+        saved["chat_history"],
+        saved.get("token_counts"),
+        budget=settings.HISTORY_TOKEN_BUDGET,
+        summary=saved.get("summary"),
+        summarized=saved.get("summarized"),
+        total=saved.get("total"),
+    )
 
     with st.spinner("Generating..."):
         message_placeholder = st.empty()
+        # only new text is parsed and the placeholder is redrawn at a fixed frame rate
+        renderer = ThrottledRenderer(message_placeholder, fps=settings.STREAM_FPS)
         full_response = ""
+        products = []
         try:
-            with requests.get(
+            with request(
+                "GET",
                 "http://{}/chat".format(end_point),
+                params={"sse": "true"},
                 stream=True,
                 json={"text": prompt_parsed},
                 timeout=60,
             ) as r:
                 r.raise_for_status()
-                for line in r.iter_content(chunk_size=1024):
-                    if line:
-                        part = line.decode("utf-8")  # .replace("`", "~")
-                        full_response += part
+                lines = iter_decoded_lines(r.iter_content(chunk_size=None))
+                for event, data in iter_sse_events(lines):
+                    if event == "token":
+                        full_response += data["text"]
                         try:
-                            message_placeholder.markdown(
-                                parse_response(full_response) + "▌"
-                            )  #
+                            renderer.feed(data["text"])
                         except Exception as e:
                             print(f"Error updating message placeholder: {e}")
+                    elif event == "sources":
+                        products = data["products"]
+                    elif event == "error":
+                        print(f"Generation failed: {data['detail']}")
         except requests.exceptions.ChunkedEncodingError as e:
             print(f"Chunked Encoding Error occurred: {e}")
         except requests.exceptions.RequestException as e:
@@ -58,10 +82,10 @@ def handle_ibm_sdk(prompt, end_point):
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
         finally:
-            source, source_names, products_description = get_source(
-                prompt + full_response,
-                end_point,  # prompt + full_response
-            )
-
             message_placeholder.markdown("")
-            return (full_response, source, source_names, products_description)
+            return (
+                full_response,
+                [product["url"] for product in products],
+                [product["name"] for product in products],
+                [product["description"] for product in products],
+            )
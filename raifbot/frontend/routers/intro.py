@@ -18,6 +18,16 @@ def set_page_configuration():
     st.set_page_config(layout="wide", page_icon=PAGE_ICON, page_title=PAGE_TITLE)
 
 
+@st.cache_resource
+def load_image(path):
+    """
+    Decodes a branding image once per process instead of on every rerun.
+    """
+    image = Image.open(path)
+    image.load()
+    return image
+
+
 def display_author_info():
     """
     Displays the author's information in a sidebar expander on the Streamlit page.
@@ -26,14 +36,14 @@ def display_author_info():
     with st.sidebar:
         st.sidebar.title("RaifBot (demo)")
         st.write(f"  ")
-        image = Image.open(RAIF_IMAGE_PATH)
+        image = load_image(RAIF_IMAGE_PATH)
         st.image(image, width=150)
         st.write(f"  ")
         st.write(f"  ")
         st.write(f"  ")
 
         with st.expander("📬 Author"):
-            image = Image.open(PROFILE_IMAGE_PATH)
+            image = load_image(PROFILE_IMAGE_PATH)
             st.image(image)
             st.write(f"**Created by {AUTHOR_NAME}**")
             st.write(f"**Mail**: {AUTHOR_EMAIL}")
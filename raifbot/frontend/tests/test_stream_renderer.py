@@ -0,0 +1,52 @@
+from frontend.utils.sse_client import iter_sse_events
+from frontend.utils.stream_renderer import IncrementalResponseParser
+from frontend.utils.stream_renderer import ThrottledRenderer
+from frontend.utils.stream_renderer import iter_decoded_lines
+
+STREAM = (
+    'event: token\ndata: {"text": "Buy ```Adidas``` ★ 😀"}\n\n'
+    "event: token\r\ndata: " + '{"text": "ěšč"}' + "\r\n\r\n"
+).encode("utf-8")
+
+
+def test_multibyte_characters_split_across_chunks():
+    """
+    Tests that the event stream decodes the same when it's split into chunks of 1 byte, in the middle of
+    multi-byte UTF-8 sequences.
+    """
+    chunks = [STREAM[i : i + 1] for i in range(len(STREAM))]
+    events = list(iter_sse_events(iter_decoded_lines(chunks)))
+    assert events == [
+        ("token", {"text": "Buy ```Adidas``` ★ 😀"}),
+        ("token", {"text": "ěšč"}),
+    ]
+
+
+def test_incremental_parser_matches_full_parse():
+    """
+    Tests that fences split across pieces are replaced the same way as in the whole answer.
+    """
+    answer = "a ``` b `` c ```` d `"
+    parser = IncrementalResponseParser()
+    for char in answer:
+        parser.feed(char)
+    assert parser.text() == answer.replace("```", "~~~").replace("``", "~~")
+
+
+class Placeholder:
+    def __init__(self):
+        self.renders = []
+
+    def markdown(self, text):
+        self.renders.append(text)
+
+
+def test_renderer_is_throttled():
+    """
+    Tests that a burst of tokens is rendered once per frame.
+    """
+    placeholder = Placeholder()
+    renderer = ThrottledRenderer(placeholder, fps=1)
+    for _ in range(100):
+        renderer.feed("x")
+    assert placeholder.renders == ["x▌"]
@@ -1,6 +1,7 @@
-import requests
 from typing import List
 import os
+from utils.http_client import request, submit
+from utils.history_writer import get_history_writer
 
 
 def save_chat_history(session_id: str, history_items: List[List[str]], BASE_URL):
@@ -15,22 +16,44 @@ def save_chat_history(session_id: str, history_items: List[List[str]], BASE_URL)
     dict: The saved chat history from the server response.
     """
     url = f"http://{BASE_URL}/save_chat_history/{session_id}"
-    response = requests.post(url, json=history_items)
+    response = request("POST", url, json=history_items)
     response.raise_for_status()  # This will raise an exception for HTTP error codes
     return response.json()
 
 
-def get_chat_history(session_id: str, BASE_URL):
+def get_chat_history(session_id: str, BASE_URL, last: int = None):
     """
     Retrieves the chat history for a given session.
 
     Parameters:
     session_id (str): The session ID for the chat history.
+    last (int, optional): Number of most recent turns to retrieve. All turns are retrieved if not provided.
 
     Returns:
     dict: The chat history from the server response.
     """
     url = f"http://{BASE_URL}/get_chat_history/{session_id}"
-    response = requests.get(url)
+    params = {"last": last} if last else None
+    response = request("GET", url, params=params)
     response.raise_for_status()
     return response.json()
+
+
+def prefetch_chat_history(session_id: str, BASE_URL, last: int = None):
+    """
+    Starts retrieving the chat history in the background, so it overlaps with rendering the prompt.
+    Saves of the session still queued by the background writer are sent first, so the last turn is included.
+
+    Parameters:
+    session_id (str): The session ID for the chat history.
+    last (int, optional): Number of most recent turns to retrieve.
+
+    Returns:
+    Future: The future of `get_chat_history`.
+    """
+
+    def fetch():
+        get_history_writer(BASE_URL).wait(session_id)
+        return get_chat_history(session_id, BASE_URL, last)
+
+    return submit(fetch)
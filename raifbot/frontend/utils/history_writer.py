@@ -0,0 +1,135 @@
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from utils.http_client import request
+
+
+def not_sent(error):
+    """
+    Returns whether a request failed before it reached the backend, i.e. the connection couldn't be established.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        reason = getattr(error.args[0], "reason", None)
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+    return False
+
+
+class HistoryWriter:
+    """
+    A process-wide background writer of chat history saves.
+
+    Parameters:
+    end_point (str): The backend endpoint.
+    max_queue (int): Maximum number of queued saves. Saves arriving when the queue is full are dropped and logged.
+    max_batch (int): Maximum number of saves sent in one request.
+    retries (int): Number of retries of a batch which couldn't be sent because the backend was unreachable.
+    backoff (float): Backoff of the retries in seconds, doubled after each attempt.
+
+    A worker thread drains the queue, merges the saves of each session in their original order and sends them
+    to the bulk save endpoint of the backend, so rendering never waits for the database.
+    The bulk save appends the turns, so a batch which may have reached the backend (read timeouts, error
+    responses) is not sent again, it would duplicate the turns already written.
+    """
+
+    def __init__(
+        self, end_point, max_queue=1000, max_batch=100, retries=3, backoff=0.5
+    ):
+        self.end_point = end_point
+        self.max_batch = max_batch
+        self.retries = retries
+        self.backoff = backoff
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._unsaved = defaultdict(int)
+        self._saved = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="history-writer", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, session_id, history_items):
+        """
+        Queues chat history items of a session without waiting.
+        """
+        with self._saved:
+            self._unsaved[session_id] += 1
+        try:
+            self._queue.put_nowait((session_id, history_items))
+        except queue.Full:
+            self.dropped += 1
+            self._done([session_id])
+            logging.error(f"Chat history queue is full, dropped a save of {session_id}")
+
+    def wait(self, session_id, timeout=2.0):
+        """
+        Waits until the queued saves of a session were sent, e.g. before its history is read again.
+
+        Returns:
+        bool: False if the saves are still queued after the timeout.
+        """
+        with self._saved:
+            return self._saved.wait_for(
+                lambda: not self._unsaved.get(session_id), timeout=timeout
+            )
+
+    def _done(self, session_ids):
+        with self._saved:
+            for session_id in session_ids:
+                self._unsaved[session_id] -= 1
+                if self._unsaved[session_id] <= 0:
+                    del self._unsaved[session_id]
+            self._saved.notify_all()
+
+    def _send(self, histories):
+        url = f"http://{self.end_point}/save_chat_histories"
+        for attempt in range(self.retries + 1):
+            try:
+                response = request("POST", url, json=histories)
+                response.raise_for_status()
+                return
+            except Exception as e:
+                if attempt == self.retries or not not_sent(e):
+                    self.failed += 1
+                    logging.error(f"Failed to save chat histories: {e}")
+                    return
+                time.sleep(self.backoff * 2**attempt)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            histories = OrderedDict()
+            for session_id, history_items in batch:
+                histories.setdefault(session_id, []).extend(history_items)
+            try:
+                self._send(histories)
+            finally:
+                self._done([session_id for session_id, _ in batch])
+
+
+_lock = threading.Lock()
+_writer = None
+
+
+def get_history_writer(end_point):
+    """
+    Returns the writer shared by all Streamlit sessions of the process.
+    """
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = HistoryWriter(end_point)
+        return _writer
@@ -0,0 +1,80 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = 3.05
+
+_lock = threading.Lock()
+_session = None
+_executor = None
+
+
+def get_session(pool_size=20, retries=3, backoff=0.2):
+    """
+    Returns the process-wide session shared by all Streamlit sessions, so connections to the backend are pooled and kept alive.
+
+    Parameters:
+    pool_size (int): Maximum number of kept-alive connections per host.
+    retries (int): Number of retries of failed connections and of GET/DELETE requests answered with 502, 503 or 504.
+    backoff (float): Backoff factor of the retries in seconds.
+
+    Returns:
+    requests.Session: The shared session.
+
+    POST requests are only retried when the connection couldn't be established, so a save is never sent twice.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            retry = Retry(
+                total=retries,
+                connect=retries,
+                read=retries,
+                status=retries,
+                backoff_factor=backoff,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset({"GET", "DELETE"}),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def request(method, url, timeout=10.0, **kwargs):
+    """
+    Sends a request with the shared session.
+
+    Parameters:
+    method (str): The HTTP method.
+    url (str): The URL.
+    timeout (float): Read timeout in seconds, the connect timeout is fixed to a few seconds.
+
+    Returns:
+    requests.Response: The response.
+    """
+    return get_session().request(
+        method, url, timeout=(CONNECT_TIMEOUT, timeout), **kwargs
+    )
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Runs a blocking call (e.g. fetching the chat history) in a shared thread pool, so it overlaps with other work.
+
+    Returns:
+    concurrent.futures.Future: The future of the call.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="http")
+    return _executor.submit(fn, *args, **kwargs)
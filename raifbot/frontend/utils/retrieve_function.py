@@ -1,4 +1,4 @@
-import requests
+from utils.http_client import request
 
 
 def get_source(query: str, end_point: str):
@@ -13,6 +13,6 @@ def get_source(query: str, end_point: str):
     """
     url = f"http://{end_point}/get_document_source/"
     params = {"query": query}
-    response = requests.get(url, params=params)
+    response = request("GET", url, params=params)
     response.raise_for_status()
     return response.json()
@@ -0,0 +1,26 @@
+import json
+
+
+def iter_sse_events(lines):
+    """
+    Parses a server-sent events stream into typed events.
+
+    Parameters:
+    lines: Decoded lines of the stream, e.g. `response.iter_lines(decode_unicode=True)`.
+
+    Returns:
+    generator: `(event, data)` tuples with the JSON decoded data of each event.
+    """
+    event, data = "message", []
+    for line in lines:
+        if not line:
+            # a blank line dispatches the event
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:") :].lstrip())
+    if data:
+        yield event, json.loads("\n".join(data))
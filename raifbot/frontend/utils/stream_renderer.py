@@ -0,0 +1,82 @@
+import codecs
+import time
+
+
+def iter_decoded_lines(chunks):
+    """
+    Splits a stream of raw byte chunks into decoded lines.
+
+    Parameters:
+    chunks: Byte chunks of the response, e.g. `response.iter_content(chunk_size=None)`.
+
+    Returns:
+    generator: The lines without line terminators. A UTF-8 sequence split across two chunks is decoded once
+    both halves arrived, and only the new bytes of each chunk are processed.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+class IncrementalResponseParser:
+    """
+    Applies `parse_response` to a streamed answer piece by piece.
+
+    Code fences are replaced by runs of tildes. A run of backticks at the end of a piece is held back until
+    the run is complete, so a fence split across two pieces is replaced the same way as in one piece.
+    """
+
+    def __init__(self):
+        self.parsed = []
+        self.pending = ""
+
+    def feed(self, text):
+        """
+        Adds a piece of the answer and returns its parsed part.
+        """
+        text = self.pending + text
+        end = len(text.rstrip("`"))
+        self.pending = text[end:]
+        parsed = text[:end].replace("```", "~~~").replace("``", "~~")
+        self.parsed.append(parsed)
+        return parsed
+
+    def text(self):
+        return "".join(self.parsed) + self.pending.replace("```", "~~~").replace(
+            "``", "~~"
+        )
+
+
+class ThrottledRenderer:
+    """
+    Renders a streamed answer into a Streamlit placeholder at most `fps` times per second.
+
+    Parameters:
+    placeholder: The Streamlit placeholder, e.g. `st.empty()`.
+    fps (float): Maximum number of redraws per second.
+    """
+
+    def __init__(self, placeholder, fps=10.0):
+        self.placeholder = placeholder
+        self.interval = 1.0 / fps
+        self.parser = IncrementalResponseParser()
+        self.last_render = 0.0
+        self.frames = 0
+
+    def feed(self, text):
+        self.parser.feed(text)
+        now = time.monotonic()
+        if now - self.last_render >= self.interval:
+            self.render(cursor=True)
+            self.last_render = now
+
+    def render(self, cursor=False):
+        self.frames += 1
+        self.placeholder.markdown(self.parser.text() + ("▌" if cursor else ""))
@@ -0,0 +1,33 @@
+from functools import lru_cache
+
+from utils.http_client import request
+
+
+@lru_cache(maxsize=512)
+def _fetch_thumbnail(url, end_point, width):
+    response = request(
+        "GET",
+        f"http://{end_point}/thumbnail",
+        params={"url": url, "width": width},
+        timeout=5.0,
+    )
+    response.raise_for_status()
+    return response.content
+
+
+def get_thumbnail(url, end_point, width=150):
+    """
+    Returns a resized product image served by the backend thumbnail store.
+
+    Parameters:
+    url (str): URL of the original product image.
+    end_point (str): The backend endpoint.
+    width (int): Width of the thumbnail in pixels.
+
+    Returns:
+    bytes or str: The thumbnail, kept in memory by the process, or the original URL if it can't be fetched.
+    """
+    try:
+        return _fetch_thumbnail(url, end_point, width)
+    except Exception:
+        return url
@@ -0,0 +1,34 @@
+import logging
+from functools import lru_cache
+
+ENCODING_NAME = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name=ENCODING_NAME):
+    """
+    Loads the tiktoken encoding once per process, or returns None if it can't be loaded.
+    """
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logging.warning(f"Tokenizer {name} not available, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def format_turn(turn):
+    """
+    Formats a [question, answer] turn of the chat history, the same way as the backend counts its tokens.
+    """
+    return "\n".join(
+        f"{role}: {text}" for role, text in zip(("User", "Assistant"), turn)
+    )
@@ -0,0 +1,402 @@
+import asyncio
+import contextlib
+import hashlib
+import itertools
+import json
+import random
+import re
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from backend.config import settings
+from backend.routers import chat_history
+from backend.routers import generation
+from backend.utils import dependencies_generation
+from backend.utils.catalog import AVAILABILITIES
+from backend.utils.catalog import BRANDS
+from backend.utils.catalog import CATEGORIES
+from backend.utils.catalog import GENDERS
+from backend.utils.catalog import LOCATIONS
+from backend.utils.catalog import product_document
+from backend.utils.local_vector_store import LocalVectorStore
+
+ANSWER_WORDS = (
+    "Based on your requirements we recommend this product because it has a high rating "
+    "and is within your budget"
+).split()
+
+
+def split_tokens(text: str) -> List[str]:
+    """
+    Splits a text into tokens of up to four characters with their leading whitespace, about the size of
+    OpenAI tokens.
+    """
+    return re.findall(r"\s*\S{1,4}", text)
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Stand-in for the streaming ChatOpenAI model of the agent.
+
+    The first call of an agent run searches the products with the question, the second one answers with
+    `answer_tokens` words. All tokens, including the ones of the tool call, are streamed at `tokens_per_second`,
+    so the time to first token of the endpoint includes the tool round trip like with the real agent.
+    The product recommendation chain of the fast path is answered directly in plain text.
+    """
+
+    model_name: str = "fake-chat-model"
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 100
+    tool_name: str = "product_search"
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = messages[-1].content
+        answer = " ".join(
+            itertools.islice(itertools.cycle(ANSWER_WORDS), self.answer_tokens)
+        )
+        if prompt.rstrip().endswith("Answer:"):
+            text = answer
+        else:
+            if "Observation" in prompt:
+                action = {"action": "Final Answer", "action_input": answer}
+            else:
+                question = prompt.split("\n")[0]
+                action = {"action": self.tool_name, "action_input": {"query": question}}
+            text = "Action:\n```\n" + json.dumps(action) + "\n```"
+
+        interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for token in split_tokens(text):
+            await asyncio.sleep(interval)
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    @property
+    def _llm_type(self):
+        return "fake-streaming"
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings standing in for the OpenAI embeddings model.
+    """
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+async def ping(command: str) -> dict:
+    """
+    Stand-in for the `ping` command of the Motor database.
+    """
+    return {"ok": 1.0}
+
+
+class InMemoryCursor:
+    def __init__(self, documents: List[dict]):
+        self.documents = documents
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        await asyncio.sleep(0)
+        return self.documents[:length]
+
+
+def evaluate(document: dict, expression: Any) -> Any:
+    """
+    Evaluates the aggregation expressions used by the backend: field paths, `$ifNull` and `$size`.
+    """
+    if isinstance(expression, str) and expression.startswith("$"):
+        return document.get(expression[1:])
+    if isinstance(expression, dict) and "$ifNull" in expression:
+        value, default = expression["$ifNull"]
+        value = evaluate(document, value)
+        return evaluate(document, default) if value is None else value
+    if isinstance(expression, dict) and "$size" in expression:
+        return len(evaluate(document, expression["$size"]))
+    return expression
+
+
+class InMemoryCollection:
+    """
+    Stand-in for the Motor chat history collection, supporting the upserts of the save endpoints and the
+    reads and conditional updates of the rolling summary.
+    """
+
+    def __init__(self):
+        self.documents: Dict[Any, dict] = {}
+
+    def _matches(self, document: dict, filter: dict) -> bool:
+        for field, condition in filter.items():
+            value = document.get(field)
+            if isinstance(condition, dict) and "$in" in condition:
+                if value not in condition["$in"]:
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    def _update(self, filter: dict, update: dict, upsert: bool) -> SimpleNamespace:
+        key = filter["_id"]
+        upserted_id = None
+        if key not in self.documents:
+            if not upsert:
+                return SimpleNamespace(upserted_id=None, modified_count=0)
+            self.documents[key] = {"_id": key}
+            upserted_id = key
+        document = self.documents[key]
+        if not self._matches(document, filter):
+            return SimpleNamespace(upserted_id=None, modified_count=0)
+        for field, value in update.get("$push", {}).items():
+            items = value["$each"] if isinstance(value, dict) else [value]
+            document.setdefault(field, []).extend(items)
+        document.update(update.get("$set", {}))
+        return SimpleNamespace(
+            upserted_id=upserted_id, modified_count=int(upserted_id is None)
+        )
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False):
+        await asyncio.sleep(0)
+        return self._update(filter, update, upsert)
+
+    async def find_one(self, filter: dict, projection: Optional[dict] = None):
+        await asyncio.sleep(0)
+        document = next(
+            (d for d in self.documents.values() if self._matches(d, filter)), None
+        )
+        if document is None or projection is None:
+            return document
+        result = {}
+        for field, spec in projection.items():
+            if field in document and spec:
+                value = document[field]
+                if isinstance(spec, dict) and "$slice" in spec:
+                    skip, limit = spec["$slice"]
+                    value = value[skip : skip + limit]
+                result[field] = value
+        return result
+
+    def aggregate(self, pipeline: List[dict]) -> InMemoryCursor:
+        documents = list(self.documents.values())
+        for stage in pipeline:
+            if "$match" in stage:
+                documents = [d for d in documents if self._matches(d, stage["$match"])]
+            elif "$project" in stage:
+                documents = [
+                    {
+                        field: evaluate(d, expression)
+                        for field, expression in stage["$project"].items()
+                        if expression != 0
+                    }
+                    for d in documents
+                ]
+        return InMemoryCursor(documents)
+
+    async def bulk_write(self, requests: list, ordered: bool = True):
+        await asyncio.sleep(0)
+        results = [
+            self._update(request._filter, request._doc, request._upsert)
+            for request in requests
+        ]
+        return SimpleNamespace(
+            upserted_count=sum(result.upserted_id is not None for result in results)
+        )
+
+
+def random_product(rng: random.Random, i: int) -> dict:
+    """
+    A synthetic row of the Pinterest fashion dataset.
+    """
+    brand = rng.choice(BRANDS)
+    category = rng.choice(CATEGORIES)
+    return {
+        "brand": brand,
+        "category": category,
+        "price in $": round(rng.uniform(10, 500), 1),
+        "gender": rng.choice(GENDERS),
+        "age": rng.randint(18, 70),
+        "location": rng.choice(LOCATIONS),
+        "ratings": rng.randint(1, 5),
+        "click_rate": rng.randint(0, 100),
+        "image_description": f" A {category.lower()} by {brand}.",
+        "availability": rng.choice(AVAILABILITIES),
+        "image_url": f"http://i.pinimg.com/400x/bench/{i}.jpg",
+    }
+
+
+def build_catalog(
+    path: str, embeddings: Embeddings, size: int = 1000, seed: int = 0
+) -> LocalVectorStore:
+    """
+    Writes a local vector store with `size` synthetic products to `path`.
+    """
+    rng = random.Random(seed)
+    documents = [product_document(random_product(rng, i)) for i in range(size)]
+    return LocalVectorStore.from_texts(
+        [text for text, _ in documents],
+        embeddings,
+        metadatas=[metadata for _, metadata in documents],
+        path=path,
+    )
+
+
+def random_question(rng: random.Random) -> str:
+    """
+    A question with requirements the retriever turns into metadata filters.
+    """
+    return (
+        f"Recommend {rng.choice(BRANDS)} {rng.choice(CATEGORIES).lower()} for a "
+        f"{rng.choice(GENDERS).lower()} in {rng.choice(LOCATIONS)} under ${rng.randint(50, 500)}"
+    )
+
+
+@contextlib.contextmanager
+def fake_backend(
+    workdir: str,
+    tokens_per_second: float = 50.0,
+    answer_tokens: int = 100,
+    catalog_size: int = 1000,
+    write_behind: bool = False,
+    answer_cache: bool = False,
+    fast_path: bool = True,
+):
+    """
+    Points `backend.main:app` to the fakes for the duration of the context.
+
+    The chain is still built by `setup_conversational_chain`, only the OpenAI models are replaced, the vector
+    store is a local store of synthetic products in `workdir` and the chat history is kept in memory.
+    Summaries are disabled, because they would call OpenAI.
+
+    Yields:
+        InMemoryCollection: The chat history collection.
+    """
+    embeddings = HashEmbeddings()
+    build_catalog(f"{workdir}/local_store", embeddings, catalog_size)
+    collection = InMemoryCollection()
+
+    patches = [
+        (dependencies_generation, "OpenAIEmbeddings", lambda **kwargs: embeddings),
+        (
+            dependencies_generation,
+            "ChatOpenAI",
+            lambda **kwargs: FakeStreamingChatModel(
+                tokens_per_second=tokens_per_second, answer_tokens=answer_tokens
+            ),
+        ),
+        (
+            chat_history,
+            "database",
+            SimpleNamespace(chat_history_collection=collection, command=ping),
+        ),
+        (settings, "VECTOR_STORE", "local"),
+        (settings, "LOCAL_STORE_PATH", f"{workdir}/local_store"),
+        (settings, "EMBEDDING_CACHE_PATH", f"{workdir}/embeddings.sqlite"),
+        (settings, "CHAT_HISTORY_WRITE_BEHIND", write_behind),
+        (settings, "SUMMARY_ENABLED", False),
+        (settings, "FAST_PATH_ENABLED", fast_path),
+        # above 1 only exact repeats would be served from the answer cache, so every question reaches the agent
+        (
+            generation.answer_cache,
+            "similarity",
+            settings.ANSWER_CACHE_SIMILARITY if answer_cache else 2.0,
+        ),
+    ]
+    originals = [(owner, name, getattr(owner, name)) for owner, name, _ in patches]
+    try:
+        for owner, name, value in patches:
+            setattr(owner, name, value)
+        yield collection
+    finally:
+        for owner, name, value in reversed(originals):
+            setattr(owner, name, value)
+        generation.answer_cache.invalidate()
+
+
+async def asgi_stream(
+    app: object, method: str, path: str, query: str = "", body: object = None
+) -> AsyncIterator[bytes]:
+    """
+    Sends a request to the ASGI app in-process and yields the chunks of the response body as they are sent.
+
+    Unlike the ASGI transport of httpx, which buffers the whole response, this keeps the timing of a stream.
+
+    Raises:
+        RuntimeError: If the response status isn't 2xx.
+    """
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    messages: asyncio.Queue = asyncio.Queue()
+    disconnected = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # the client stays connected until the whole response was read
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        await messages.put(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "query_string": query.encode("utf-8"),
+        "root_path": "",
+        "headers": [(b"host", b"benchmark"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    task = asyncio.create_task(app(scope, receive, send))
+    task.add_done_callback(lambda _: messages.put_nowait(None))
+    try:
+        message = await messages.get()
+        if message is None:
+            await task
+            raise RuntimeError(f"No response to {method} {path}")
+        status = message["status"]
+        error = b""
+        while True:
+            message = await messages.get()
+            if message is None:
+                break
+            chunk = message.get("body", b"")
+            if status >= 300:
+                error += chunk
+            elif chunk:
+                yield chunk
+            if not message.get("more_body", False):
+                break
+        if status >= 300:
+            raise RuntimeError(f"{method} {path} returned {status}: {error.decode()}")
+    finally:
+        disconnected.set()
+        await task
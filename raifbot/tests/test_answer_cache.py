@@ -0,0 +1,108 @@
+import pytest
+from backend.utils.answer_cache import AnswerCache
+from backend.utils.answer_cache import record_answer
+from backend.utils.answer_cache import replay_answer
+
+
+class KeywordEmbeddings:
+    """
+    Fake embeddings: queries mentioning the same brand are considered identical.
+    """
+
+    brands = ["adidas", "gucci", "nike"]
+
+    async def aembed_query(self, text):
+        return [float(brand in text.lower()) for brand in self.brands] + [0.1]
+
+
+async def tokens(answer):
+    for token in answer.split(" "):
+        yield token + " "
+
+
+@pytest.mark.asyncio
+async def test_exact_and_semantic_hits():
+    """
+    Tests that a recorded stream is served again by exact match, by similarity, and not across kinds.
+    """
+    cache = AnswerCache(KeywordEmbeddings(), similarity=0.99)
+
+    streamed = [t async for t in record_answer(tokens("Buy Adidas"), cache, "Best Adidas shoes?")]
+    assert "".join(streamed) == "Buy Adidas "
+
+    assert await cache.aget("best adidas   shoes", "stream") == "Buy Adidas "
+    assert await cache.aget("cheap Adidas sneakers", "stream") == "Buy Adidas "
+    assert await cache.aget("Gucci bags", "stream") is None
+    assert await cache.aget("Best Adidas shoes?", "text") is None
+
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 2)
+
+    replayed = [t async for t in replay_answer("Buy Adidas ")]
+    assert "".join(replayed) == "Buy Adidas "
+
+
+@pytest.mark.asyncio
+async def test_similar_queries_with_other_constraints_miss():
+    """
+    Tests that queries differing only in the price or the brand don't share an answer, however similar their
+    embeddings are.
+    """
+    cache = AnswerCache(KeywordEmbeddings(), similarity=0.5)
+    await cache.aput("Nike shoes under $50", "Nike Revolution for $45", "text")
+
+    assert await cache.aget("Nike shoes under $150", "text") is None
+    assert await cache.aget("Adidas shoes under $50", "text") is None
+    assert await cache.aget("Nike sneakers under $50", "text") == "Nike Revolution for $45"
+
+
+    # constraints of earlier turns in the prompt don't count
+    history = "Human: Adidas shoes under $150\nAI: ...\nanswer following input question: "
+    assert await cache.aget(history + "Nike sneakers under $50", "text") == "Nike Revolution for $45"
+
+
+class EvictingEmbeddings(KeywordEmbeddings):
+    """
+    Fake embeddings storing another answer while a query is embedded, like a concurrent request would.
+    """
+
+    def __init__(self):
+        self.cache = None
+
+    async def aembed_query(self, text):
+        if self.cache is not None and text == "cheap Adidas sneakers":
+            cache, self.cache = self.cache, None
+            await cache.aput("Gucci bags", "Gucci Marmont", "stream")
+        return await super().aembed_query(text)
+
+
+@pytest.mark.asyncio
+async def test_answers_evicted_during_the_lookup_are_missed():
+    """
+    Tests that an answer evicted by a concurrent store while the query is embedded is a miss, not an error.
+    """
+    embeddings = EvictingEmbeddings()
+    cache = AnswerCache(embeddings, similarity=0.99, max_items=1)
+    await cache.aput("Best Adidas shoes", "Buy Adidas", "stream")
+    embeddings.cache = cache
+
+    assert await cache.aget("cheap Adidas sneakers", "stream") is None
+    assert await cache.aget("Gucci bags", "stream") == "Gucci Marmont"
+
+
+@pytest.mark.asyncio
+async def test_ttl_and_invalidation_on_model_change():
+    """
+    Tests that answers expire after the TTL and are dropped when the model changes.
+    """
+    cache = AnswerCache(None, similarity=2.0, ttl=-1.0)
+    await cache.aput("query", "answer", "text")
+    assert await cache.aget("query", "text") is None
+
+    cache = AnswerCache(None, similarity=2.0)
+    cache.reset(None, "gpt-4", "key")
+    await cache.aput("query", "answer", "text")
+    cache.reset(None, "gpt-4", "key")
+    assert await cache.aget("query", "text") == "answer"
+    cache.reset(None, "gpt-3.5-turbo", "key")
+    assert await cache.aget("query", "text") is None
@@ -0,0 +1,41 @@
+import json
+import pytest
+from backend.main import app
+from backend.utils.metrics import BATCH_ITEMS
+from tests.fakes import asgi_stream
+from tests.fakes import fake_backend
+
+
+async def post_batch(body: dict) -> list:
+    text = b"".join(
+        [chunk async for chunk in asgi_stream(app, "POST", "/chat_batch", body=body)]
+    )
+    return [json.loads(line) for line in text.decode("utf-8").splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_batch_streams_every_result(tmp_path):
+    """
+    Tests that every query of a batch gets one NDJSON line with its answer, latency and token usage,
+    and that an item running over its time limit is reported without failing the batch.
+    """
+    queries = [f"Recommend Nike shoes under ${price}" for price in range(100, 106)]
+    with fake_backend(str(tmp_path), tokens_per_second=0, catalog_size=50):
+        async with app.router.lifespan_context(app):
+            results = await post_batch({"queries": queries, "concurrency": 2})
+            timeouts = BATCH_ITEMS.value(status="timeout")
+    with fake_backend(str(tmp_path), tokens_per_second=20, catalog_size=50):
+        async with app.router.lifespan_context(app):
+            timed_out = await post_batch(
+                {"queries": ["Recommend shoes"], "timeout": 0.1}
+            )
+
+    assert sorted(result["index"] for result in results) == list(range(6))
+    for result in results:
+        assert result["status"] == "ok" and result["output"]
+        assert result["query"] == queries[result["index"]]
+        assert result["latency_seconds"] >= 0
+        assert result["usage"]["llm_calls"] >= 1
+        assert result["usage"]["total_tokens"] > 0
+    assert timed_out[0]["status"] == "timeout"
+    assert BATCH_ITEMS.value(status="timeout") == timeouts + 1
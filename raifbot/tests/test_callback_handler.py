@@ -0,0 +1,171 @@
+import asyncio
+import json
+import re
+import pytest
+from langchain.agents import AgentType, initialize_agent
+from langchain.agents.agent_toolkits import create_retriever_tool
+from langchain_community.tools import Tool
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.retrievers import BaseRetriever
+from backend.utils.callback_handler_agent import AsyncCallbackHandler
+from backend.utils.callback_handler_agent import FinalAnswerParser
+from backend.utils.callback_handler_agent import create_gen
+from backend.utils.callback_handler_agent import create_event_gen
+from backend.utils.callback_handler_agent import failure_table
+from backend.utils.callback_handler_agent import format_sse
+
+
+ANSWER = 'We recommend "Adidas" shoes:\n- rated 5\t★ 😀 \\ done'
+AGENT_OUTPUT = (
+    "Thought: I know what to respond\nAction:\n```json\n"
+    + json.dumps({"action": "Final Answer", "action_input": ANSWER})
+    + "\n```"
+)
+
+
+def split(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_parser_decodes_final_answer(size):
+    """
+    Tests that the final answer is decoded the same way regardless of how the output is split into tokens,
+    including JSON escapes, unicode escapes and surrogate pairs.
+    """
+    parser = FinalAnswerParser()
+    decoded = "".join(parser.feed(token) for token in split(AGENT_OUTPUT, size))
+    assert decoded == ANSWER
+    assert parser.finished
+
+
+def test_parser_ignores_tool_actions():
+    """
+    Tests that nothing is emitted for an action calling a tool.
+    """
+    parser = FinalAnswerParser()
+    output = json.dumps({"action": "product_search", "action_input": "shoes"})
+    assert parser.feed(output) == ""
+    assert not parser.found_final_answer
+
+
+def test_parser_finds_matches_overlapping_a_partial_match():
+    """
+    Tests that a pattern starting inside a partial match of itself is found.
+    """
+    assert failure_table("aabaaab") == [0, 0, 1, 0, 1, 2, 2, 3]
+    assert failure_table(FinalAnswerParser.ACTION_INPUT)[-1] == 1
+
+    parser = FinalAnswerParser()
+    output = 'FinalFinal Answer", "action_""action_input": "hi"}'
+    assert parser.feed(output) == "hi"
+    assert parser.finished
+
+
+@pytest.mark.asyncio
+async def test_handler_coalesces_tokens():
+    """
+    Tests that tokens are flushed in chunks of at least `flush_bytes` and that the stream ends after the final answer.
+    """
+    handler = AsyncCallbackHandler(0.0, flush_bytes=16, flush_interval=60)
+    for token in split(AGENT_OUTPUT, 1):
+        await handler.on_llm_new_token(token)
+    await handler.on_llm_end(None)
+
+    chunks = [chunk async for chunk in handler.aiter()]
+    assert "".join(chunks) == ANSWER
+    assert all(len(chunk.encode("utf-8")) >= 16 for chunk in chunks[:-1])
+    assert len(chunks) < len(ANSWER) / 4
+
+
+class EchoChatModel(BaseChatModel):
+    """
+    Fake streaming chat model calling the noop tool first and then answering with a Final Answer naming the query.
+    """
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        query = re.findall(r"query-\d+", messages[-1].content)[-1]
+        if "Observation" in messages[-1].content:
+            action = {"action": "Final Answer", "action_input": f"answer to {query}"}
+        else:
+            action = {"action": "noop", "action_input": {"query": query}}
+        text = "Action:\n```\n" + json.dumps(action) + "\n```"
+        for token in split(text, 3):
+            # yield to the other streams between tokens
+            await asyncio.sleep(0.001)
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    @property
+    def _llm_type(self):
+        return "echo"
+
+
+@pytest.mark.asyncio
+async def test_parallel_streams_are_isolated():
+    """
+    Tests that N parallel streams on one shared agent each receive their own answer.
+    """
+    tool = Tool(name="noop", func=lambda q: "nothing", description="Does nothing.")
+    agent = initialize_agent(
+        agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
+        tools=[tool],
+        llm=EchoChatModel(),
+    )
+
+    async def stream(i):
+        handler = AsyncCallbackHandler(0.0, flush_bytes=1)
+        return "".join([chunk async for chunk in create_gen(agent, f"query-{i}", handler)])
+
+    answers = await asyncio.gather(*(stream(i) for i in range(8)))
+    assert answers == [f"answer to query-{i}" for i in range(8)]
+
+
+class FixedRetriever(BaseRetriever):
+    """
+    Fake retriever always returning one product.
+    """
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return [
+            Document(
+                page_content="Product Adidas Shoes priced at $93.1",
+                metadata={"source": "http://img/1.jpg"},
+            )
+        ]
+
+
+@pytest.mark.asyncio
+async def test_event_stream_carries_tokens_and_sources():
+    """
+    Tests that the typed event stream carries the answer, the products returned by the retriever tool,
+    the timings and the final done event, and that the SSE framing survives newlines.
+    """
+    tool = create_retriever_tool(FixedRetriever(), "noop", "Searches products.")
+    agent = initialize_agent(
+        agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
+        tools=[tool],
+        llm=EchoChatModel(),
+    )
+    handler = AsyncCallbackHandler(0.0)
+    events = [e async for e in create_event_gen(agent, "query-1", handler)]
+
+    assert [name for name, _ in events][-3:] == ["sources", "timing", "done"]
+    assert "".join(d["text"] for name, d in events if name == "token") == "answer to query-1"
+    assert events[-3][1]["products"] == [
+        {
+            "url": "http://img/1.jpg",
+            "name": "Adidas Shoes",
+            "description": "Product Adidas Shoes priced at $93.1",
+        }
+    ]
+    assert events[-2][1]["time_to_first_token"] is not None
+
+    assert format_sse("token", {"text": "a\nb"}) == 'event: token\ndata: {"text": "a\\nb"}\n\n'
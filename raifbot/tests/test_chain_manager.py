@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import pytest
+from types import SimpleNamespace
+from backend.utils.chain_manager import ChainManager
+
+
+@pytest.mark.asyncio
+async def test_rebuild_swaps_a_complete_chain():
+    """
+    Tests that a rebuild happens off the event loop while the old chain keeps serving, that a failed probe
+    keeps the old chain and that the new chain is swapped in as a whole.
+    """
+    building = threading.Event()
+    release = threading.Event()
+
+    def build(settings, steps):
+        if settings.LLM_NAME != "initial":
+            building.set()
+            release.wait(1)
+        return f"agent-{settings.LLM_NAME}", "retriever", "llm"
+
+    swapped = []
+    chains = ChainManager(build, on_swap=swapped.append)
+    chains.load(SimpleNamespace(LLM_NAME="initial", OPENAI_API_KEY="key"))
+    old = chains.current
+
+    async def probe(chain):
+        if chain.model == "broken":
+            raise ValueError("invalid model")
+
+    rebuild = asyncio.create_task(
+        chains.rebuild(SimpleNamespace(LLM_NAME="new", OPENAI_API_KEY="key"), probe)
+    )
+    await asyncio.to_thread(building.wait, 1)
+    # the event loop isn't blocked and requests still see the old chain
+    assert chains.current is old
+    release.set()
+    new = await rebuild
+
+    assert (chains.current, new.agent, new.generation) == (new, "agent-new", 2)
+    assert old.agent == "agent-initial"
+    with pytest.raises(ValueError):
+        await chains.rebuild(
+            SimpleNamespace(LLM_NAME="broken", OPENAI_API_KEY="key"), probe
+        )
+    assert chains.current is new
+    assert swapped == [old, new]
+    assert chains.info()["rebuilds"] == 1 and chains.info()["failed_rebuilds"] == 1
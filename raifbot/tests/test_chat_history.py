@@ -27,7 +27,9 @@ async def test_mongo_DB_async():
     This test performs the following operations:
     - Creates and saves chat history for a unique session ID.
     - Updates the chat history for the same session ID.
+    - Appends to the chat history through the bulk save endpoint.
     - Retrieves the correct chat history for the session ID.
+    - Retrieves a tail window with the token counts and a window before a cursor with the total turn count.
     - Attempts to retrieve chat history for a nonexistent session, expecting a failure.
     - Deletes the chat history for the session ID.
     - Verifies that the chat history for the session ID has been deleted.
@@ -53,10 +55,32 @@ async def test_mongo_DB_async():
         )
         assert response.status_code == 200
 
+        # save chat histories of several sessions at once
+        response = await client.post(
+            "/save_chat_histories", json={session_id: history_items}
+        )
+        assert response.status_code == 200
+
         # get correct chat history
         response = await client.get(f"/get_chat_history/{session_id}")
         assert response.status_code == 200
 
+        # get tail window of chat history
+        response = await client.get(
+            f"/get_chat_history/{session_id}", params={"last": 1}
+        )
+        assert response.status_code == 200
+        assert response.json()["chat_history"] == history_items
+        assert response.json()["total"] == 3
+        assert len(response.json()["token_counts"]) == 1
+
+        # get window before cursor
+        response = await client.get(
+            f"/get_chat_history/{session_id}", params={"last": 5, "before": 1}
+        )
+        assert response.json()["chat_history"] == history_items
+        assert response.json()["total"] == 3
+
         # get wrong chat hisotry
         response = await client.get(f"/get_chat_history/ ")
         assert response.status_code == 500
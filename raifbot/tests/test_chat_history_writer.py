@@ -0,0 +1,137 @@
+import asyncio
+import bson
+import pytest
+from backend.utils.chat_history_writer import ChatHistoryWriter
+from backend.utils.metrics import CHAT_HISTORY_DROPPED_TURNS
+
+
+class RecordingCollection:
+    """
+    Fake collection recording the bulk writes.
+    """
+
+    def __init__(self):
+        self.bulk_writes = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.bulk_writes.append(operations)
+
+
+@pytest.mark.asyncio
+async def test_saves_are_grouped_into_bulk_writes():
+    """
+    Tests that many saves of a few sessions become one upsert per session in a single bulk write,
+    that the size trigger flushes early and that closing the writer flushes the rest.
+    """
+    db = RecordingCollection()
+    writer = ChatHistoryWriter(db, max_batch=100, flush_interval=60)
+    writer.start()
+    sessions = [str(bson.ObjectId()) for _ in range(3)]
+
+    for i in range(99):
+        writer.put(sessions[i % 3], [[f"question {i}", f"answer {i}"]])
+    await asyncio.sleep(0.01)
+    assert db.bulk_writes == []
+
+    writer.put(sessions[0], [["question 99", "answer 99"]])
+    await asyncio.sleep(0.01)
+    assert len(db.bulk_writes) == 1
+    operations = db.bulk_writes[0]
+    assert len(operations) == 3
+    turns = operations[0]._doc["$push"]["chat_history"]["$each"]
+    assert turns[:2] == [["question 0", "answer 0"], ["question 3", "answer 3"]]
+    assert len(turns) == 34
+
+    writer.put(sessions[1], [["last", "turn"]])
+    await writer.close()
+    assert len(db.bulk_writes) == 2
+    assert writer.stats()["queued_turns"] == 0
+
+
+class FlakyCollection(RecordingCollection):
+    """
+    Fake collection failing the first bulk writes and holding each write until it is released.
+    """
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.release = asyncio.Event()
+
+    async def bulk_write(self, operations, ordered=True):
+        await self.release.wait()
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("primary stepped down")
+        await super().bulk_write(operations, ordered)
+
+
+@pytest.mark.asyncio
+async def test_turns_stay_pending_until_written_and_failed_flushes_are_retried():
+    """
+    Tests that a session is pending while its bulk write is in flight and that the turns of a failed
+    write are written by the next flush, before the turns saved meanwhile.
+    """
+    db = FlakyCollection(failures=1)
+    writer = ChatHistoryWriter(db, flush_interval=60)
+    session = str(bson.ObjectId())
+
+    writer.put(session, [["first", "answer"]])
+    flush = asyncio.create_task(writer.flush())
+    await asyncio.sleep(0.01)
+    assert writer.pending(session)
+    writer.put(session, [["second", "answer"]])
+
+    db.release.set()
+    await flush
+    assert writer.pending(session)
+    assert writer.stats()["failed_flushes"] == 1
+
+    await writer.flush()
+    assert not writer.pending(session)
+    turns = db.bulk_writes[0][0]._doc["$push"]["chat_history"]["$each"]
+    assert turns == [["first", "answer"], ["second", "answer"]]
+
+
+@pytest.mark.asyncio
+async def test_turns_are_dropped_and_counted_after_the_last_retry():
+    """
+    Tests that turns failing more than `max_retries` flushes are dropped and counted.
+    """
+    db = FlakyCollection(failures=10)
+    db.release.set()
+    writer = ChatHistoryWriter(db, flush_interval=60, max_retries=1)
+    dropped = CHAT_HISTORY_DROPPED_TURNS.value()
+
+    writer.put(str(bson.ObjectId()), [["question", "answer"], ["again", "answer"]])
+    await writer.flush()
+    assert writer.stats()["queued_turns"] == 2
+    await writer.flush()
+
+    assert writer.stats()["queued_turns"] == 0
+    assert writer.stats()["dropped_turns"] == 2
+    assert CHAT_HISTORY_DROPPED_TURNS.value() == dropped + 2
+
+
+@pytest.mark.asyncio
+async def test_discard_waits_for_the_write_in_progress():
+    """
+    Tests that discarding a session whose turns are being written returns only after the write, so the
+    deletion which follows isn't undone, and that the discarded turns aren't retried.
+    """
+    db = FlakyCollection(failures=1)
+    writer = ChatHistoryWriter(db, flush_interval=60)
+    session = str(bson.ObjectId())
+    writer.put(session, [["question", "answer"]])
+    flush = asyncio.create_task(writer.flush())
+    await asyncio.sleep(0.01)
+
+    discard = asyncio.create_task(writer.discard(session))
+    await asyncio.sleep(0.01)
+    assert not discard.done()
+
+    db.release.set()
+    await discard
+    assert flush.done()
+    assert not writer.pending(session)
+    assert writer.stats()["queued_turns"] == 0
@@ -0,0 +1,115 @@
+import pytest
+from backend.utils.constraint_extraction import extract_filter
+from backend.utils.catalog import product_document
+from backend.utils.local_vector_store import LocalVectorStore
+from backend.utils.product_retriever import ProductRetriever
+from backend.utils.product_retriever import indexed_fields
+from tests.test_local_vector_store import HashEmbeddings
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        (
+            "best rated Adidas shoes under $100",
+            {
+                "price": {"$lte": 100.0},
+                "brand": {"$in": ["Adidas"]},
+                "category": {"$in": ["Shoes"]},
+            },
+        ),
+        (
+            "bag for women between 50 and 150 dollars in Sydney",
+            {
+                "price": {"$gte": 50.0, "$lte": 150.0},
+                "gender": {"$eq": "Female"},
+                "category": {"$in": ["Handbags, Wallets & Cases"]},
+                "location": {"$in": ["Sydney"]},
+            },
+        ),
+        (
+            "something for a 30 year old man, in stock",
+            {
+                "age": {"$gte": 20, "$lte": 40},
+                "gender": {"$eq": "Male"},
+                "availability": {"$eq": "Available"},
+            },
+        ),
+        ("I need a coach for my team", {}),
+        ("What is quantum computing?", {}),
+        ("shoes from 2023", {"category": {"$in": ["Shoes"]}}),
+        ("dresses from Zara 2", {"brand": {"$in": ["Zara"]}}),
+        ("jackets from 2019 to 2021", {"category": {"$in": ["Coats & Jackets"]}}),
+        ("sneakers from $50", {"price": {"$gte": 50.0}, "category": {"$in": ["Shoes"]}}),
+        ("skirts from 40 eur", {"price": {"$gte": 40.0}, "category": {"$in": ["Skirts"]}}),
+    ],
+)
+def test_extract_filter(query, expected):
+    """
+    Tests that the rule based extractor turns query requirements into metadata filters.
+    """
+    assert extract_filter(query) == expected
+
+
+def row(brand, category, price, gender):
+    return {
+        "brand": brand,
+        "category": category,
+        "price in $": price,
+        "gender": gender,
+        "age": "30",
+        "location": "Sydney",
+        "ratings": "4",
+        "click_rate": "200",
+        "image_description": " Nice.",
+        "availability": "Available",
+        "image_url": f"http://img/{brand}.jpg",
+    }
+
+
+def test_filter_pushdown_on_local_catalog(tmp_path):
+    """
+    Tests that the product retriever pre-filters the local catalog and falls back to the plain search
+    when no product meets the requirements.
+    """
+    texts, metadatas = zip(
+        *[
+            product_document(row("Adidas", "Shoes", "93.1", "Male")),
+            product_document(row("Adidas", "Shoes", "150.0", "Female")),
+            product_document(row("Gucci", "Shoes", "80.0", "Female")),
+        ]
+    )
+    assert texts[0].startswith("Product Adidas Shoes priced at $93.1 and bought by Male aged 30")
+    store = LocalVectorStore.from_texts(
+        list(texts), HashEmbeddings(), metadatas=list(metadatas), path=str(tmp_path)
+    )
+    retriever = ProductRetriever(vectorstore=store, search_kwargs={"k": 3})
+
+    docs = retriever.get_relevant_documents("Adidas shoes under $100")
+    assert [doc.metadata["source"] for doc in docs] == ["http://img/Adidas.jpg"]
+    assert docs[0].metadata["price"] == 93.1
+
+    docs = retriever.get_relevant_documents("Nike shoes")
+    assert len(docs) == 3
+
+
+def test_filters_skip_fields_missing_from_the_index(tmp_path):
+    """
+    Tests that an index without product metadata is searched without filters instead of a filtered search
+    finding nothing first.
+    """
+    texts = ["Product Adidas Shoes priced at $93.1", "Product Gucci Shoes priced at $80.0"]
+    store = LocalVectorStore.from_texts(
+        texts,
+        HashEmbeddings(),
+        metadatas=[{"source": "http://img/Adidas.jpg"}, {"source": "http://img/Gucci.jpg"}],
+        path=str(tmp_path),
+    )
+    fields = indexed_fields(store)
+    assert fields == {"source"}
+    retriever = ProductRetriever(
+        vectorstore=store, search_kwargs={"k": 2}, filter_fields=fields
+    )
+
+    assert retriever._filter("Adidas shoes under $100") == {}
+    assert len(retriever.get_relevant_documents("Adidas shoes under $100")) == 2
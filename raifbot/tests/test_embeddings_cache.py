@@ -0,0 +1,96 @@
+import pytest
+from langchain_core.embeddings import Embeddings
+from backend.utils.embeddings_cache import CachedEmbeddings
+from backend.utils.embeddings_cache import EmbeddingCache
+
+
+class CountingEmbeddings(Embeddings):
+    """
+    Fake embeddings model counting how many texts were really embedded.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_repeated_queries_skip_embedding(tmp_path):
+    """
+    Tests that normalized repeated queries are served from the cache and counted as hits,
+    and that the disk tier survives a new cache instance.
+    """
+    path = str(tmp_path / "embeddings.sqlite")
+    underlying = CountingEmbeddings()
+    embeddings = CachedEmbeddings(underlying, "model", EmbeddingCache(path))
+
+    first = embeddings.embed_query("best  rated Adidas shoes")
+    assert embeddings.embed_query(" best rated Adidas shoes ") == first
+    assert embeddings.embed_documents(["best rated Adidas shoes", "Gucci"]) == [
+        first,
+        [5.0, 1.0],
+    ]
+    assert underlying.calls == 2
+    assert embeddings.cache.stats()["memory_hits"] == 2
+
+    reopened = CachedEmbeddings(underlying, "model", EmbeddingCache(path))
+    assert reopened.embed_query("Gucci") == [5.0, 1.0]
+    assert underlying.calls == 2
+    assert reopened.cache.stats()["disk_hits"] == 1
+
+    # another embedding model must not reuse the vectors
+    CachedEmbeddings(underlying, "other", EmbeddingCache(path)).embed_query("Gucci")
+    assert underlying.calls == 3
+
+
+def test_disk_eviction_by_size(tmp_path):
+    """
+    Tests that the least recently used vectors are evicted once the disk limit is exceeded.
+    """
+    cache = EmbeddingCache(str(tmp_path / "e.sqlite"), memory_items=1, disk_max_bytes=40)
+    for i in range(10):
+        cache.put_many({f"key{i}": [float(i), 0.0]})
+    assert cache.stats()["disk_bytes"] <= 40
+    assert "key9" in cache.get_many(["key9"])
+    assert cache.get_many(["key0"]) == {}
+
+
+def test_memory_tier_is_lru_and_replacing_keeps_the_disk_size(tmp_path):
+    """
+    Tests that a memory hit refreshes the recency of the entry and that replacing a vector doesn't
+    count its old size twice.
+    """
+    cache = EmbeddingCache(str(tmp_path / "e.sqlite"), memory_items=2)
+    cache.put_many({"a": [1.0, 0.0], "b": [2.0, 0.0]})
+    cache.get_many(["a"])
+    cache.put_many({"c": [3.0, 0.0]})
+    assert list(cache._memory) == ["a", "c"]
+    assert cache.get_many(["b"]) == {"b": [2.0, 0.0]}
+    assert cache.stats()["disk_hits"] == 1
+
+    size = cache.stats()["disk_bytes"]
+    cache.put_many({"a": [5.0, 5.0]})
+    assert cache.stats()["disk_bytes"] == size
+
+
+@pytest.mark.asyncio
+async def test_async_embeddings_use_both_tiers(tmp_path):
+    """
+    Tests that the async methods serve repeated texts from memory and from disk.
+    """
+    path = str(tmp_path / "embeddings.sqlite")
+    underlying = CountingEmbeddings()
+    embeddings = CachedEmbeddings(underlying, "model", EmbeddingCache(path))
+    first = await embeddings.aembed_query("Adidas shoes")
+    assert await embeddings.aembed_documents(["Adidas shoes", "Gucci"]) == [first, [5.0, 1.0]]
+    assert underlying.calls == 2
+
+    reopened = CachedEmbeddings(underlying, "model", EmbeddingCache(path))
+    assert await reopened.aembed_query("Gucci") == [5.0, 1.0]
+    assert underlying.calls == 2
+    assert reopened.cache.stats()["disk_hits"] == 1
@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+import bson
+import pytest
+from backend.utils.history_summary import SummaryScheduler
+from backend.utils.history_summary import update_summary
+from tests.fakes import InMemoryCollection
+
+
+@pytest.mark.asyncio
+async def test_saves_during_an_update_are_coalesced():
+    """
+    Tests that saves arriving while the summary of a session is updated cause exactly one more update,
+    and that sessions are updated independently.
+    """
+    calls = []
+    release = asyncio.Event()
+
+    async def update(session_id):
+        calls.append(session_id)
+        await release.wait()
+
+    scheduler = SummaryScheduler(update)
+    scheduler.schedule("a")
+    scheduler.schedule("b")
+    await asyncio.sleep(0)
+    for _ in range(5):
+        scheduler.schedule("a")
+    release.set()
+    await scheduler.close()
+
+    assert sorted(calls) == ["a", "a", "b"]
+
+
+class SummaryModel:
+    """
+    Fake summary model, optionally running a concurrent change of the session while it writes the summary.
+    """
+
+    def __init__(self, during=None):
+        self.during = during
+        self.prompts = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        if self.during is not None:
+            await self.during()
+        return SimpleNamespace(content=f"summary {len(self.prompts)}")
+
+
+@pytest.mark.asyncio
+async def test_stale_summary_does_not_overwrite_a_newer_one():
+    """
+    Tests that the summary folds all turns but the most recent ones, and that an update whose summary was
+    computed from a stale state neither overwrites a newer summary nor loses the turns appended meanwhile.
+    """
+    db = InMemoryCollection()
+    session_id = str(bson.ObjectId())
+    oid = bson.ObjectId(session_id)
+    turns = [[f"question {i}", f"answer {i}"] for i in range(4)]
+    await db.update_one(
+        {"_id": oid}, {"$push": {"chat_history": {"$each": turns}}}, upsert=True
+    )
+
+    assert await update_summary(db, session_id, SummaryModel(), threshold_tokens=0)
+    assert db.documents[oid]["summary"] == "summary 1"
+    assert db.documents[oid]["summarized"] == 3
+
+    async def concurrent_update():
+        await db.update_one(
+            {"_id": oid},
+            {
+                "$push": {"chat_history": {"$each": [["new", "turn"]] * 2}},
+                "$set": {"summary": "newer summary", "summarized": 5},
+            },
+        )
+
+    await db.update_one(
+        {"_id": oid}, {"$push": {"chat_history": {"$each": [["late", "turn"]]}}}
+    )
+    stale = SummaryModel(during=concurrent_update)
+    assert not await update_summary(db, session_id, stale, threshold_tokens=0)
+    assert "question 3" in stale.prompts[0]
+    assert db.documents[oid]["summary"] == "newer summary"
+    assert db.documents[oid]["summarized"] == 5
+    assert len(db.documents[oid]["chat_history"]) == 7
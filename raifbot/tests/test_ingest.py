@@ -0,0 +1,159 @@
+import csv
+from types import SimpleNamespace
+import pinecone
+import pytest
+from backend.ingest import Checkpoint
+from backend.ingest import ingest
+from backend.ingest import local_upsert
+from backend.ingest import pinecone_upsert
+from backend.ingest import read_documents
+from backend.utils.catalog import NEGATIVE_TEXTS
+from backend.utils.local_vector_store import LocalVectorStore
+from tests.test_local_vector_store import HashEmbeddings
+
+COLUMNS = [
+    "",
+    "user_name",
+    "age",
+    "gender",
+    "location",
+    "category",
+    "brand",
+    "price in $",
+    "click_rate",
+    "availability",
+    "ratings",
+    "image_url",
+    "image_description",
+]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    """
+    A catalog of 20 products where the first one appears twice with different image URLs.
+    """
+    path = tmp_path / "catalog.csv"
+    rows = [
+        [
+            i,
+            f"Customer_{i}",
+            30,
+            "Female",
+            "Sydney",
+            "Shoes",
+            "Adidas",
+            50 + i,
+            100,
+            "Available",
+            4,
+            f"http://img/{i}.jpg",
+            f" Shoes number {i}.",
+        ]
+        for i in range(20)
+    ]
+    rows.append(rows[0][:11] + ["http://img/longer-0.jpg", rows[0][12]])
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_duplicates_keep_the_shortest_source(catalog):
+    """
+    Tests that a repeated product is read once with the shortest image URL, followed by the off-topic documents.
+    """
+    documents = list(read_documents(catalog))
+    assert len(documents) == 20 + len(NEGATIVE_TEXTS)
+    assert documents[0][2]["source"] == "http://img/0.jpg"
+    assert documents[0][1].startswith("Product Adidas Shoes priced at $50")
+
+
+@pytest.mark.asyncio
+async def test_crashed_run_resumes(catalog, tmp_path):
+    """
+    Tests that a run crashing in the upsert of the third batch is resumed from the checkpoint without
+    embedding the stored batches again and without duplicates.
+    """
+    embeddings = HashEmbeddings()
+    upsert = local_upsert(str(tmp_path / "store"), embeddings)
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), {"csv": catalog})
+    calls = []
+
+    def failing_upsert(batch, vectors):
+        calls.append(batch)
+        if len(calls) == 3:
+            raise OSError("disk full")
+        upsert(batch, vectors)
+
+    with pytest.raises(OSError):
+        await ingest(
+            read_documents(catalog),
+            embeddings,
+            failing_upsert,
+            checkpoint,
+            batch_size=5,
+            concurrency=2,
+            count_tokens=len,
+            log=lambda _: None,
+        )
+    assert checkpoint.load() == 2
+
+    embedded = []
+
+    class CountingEmbeddings(HashEmbeddings):
+        async def aembed_documents(self, texts):
+            embedded.extend(texts)
+            return self.embed_documents(texts)
+
+    stats = await ingest(
+        read_documents(catalog),
+        CountingEmbeddings(),
+        upsert,
+        checkpoint,
+        batch_size=5,
+        concurrency=2,
+        count_tokens=len,
+        log=lambda _: None,
+    )
+    total = 20 + len(NEGATIVE_TEXTS)
+    assert len(embedded) == total - 10
+    assert stats["upsert"].docs == total - 10
+    assert len(LocalVectorStore(str(tmp_path / "store"), embeddings)) == total
+
+
+def test_pinecone_index_takes_the_dimension_of_the_embeddings(monkeypatch):
+    """
+    Tests that a missing Pinecone index is created with the dimension of the first embedded batch and that an
+    existing index of another dimension is rejected.
+    """
+    indexes = {}
+    upserted = []
+    monkeypatch.setattr(pinecone, "init", lambda **kwargs: None)
+    monkeypatch.setattr(pinecone, "list_indexes", lambda: list(indexes))
+    monkeypatch.setattr(
+        pinecone,
+        "create_index",
+        lambda name, dimension, metric: indexes.__setitem__(name, dimension),
+    )
+    monkeypatch.setattr(
+        pinecone,
+        "describe_index",
+        lambda name: SimpleNamespace(dimension=indexes[name]),
+    )
+    monkeypatch.setattr(
+        pinecone,
+        "Index",
+        lambda name: SimpleNamespace(
+            upsert=lambda vectors, batch_size: upserted.extend(vectors)
+        ),
+    )
+    batch = [("id", "text", {"brand": "Adidas"})]
+
+    pinecone_upsert("products")(batch, [[0.1] * 1536])
+    assert indexes == {"products": 1536}
+    assert upserted[0][2] == {"brand": "Adidas", "text": "text"}
+
+    with pytest.raises(ValueError):
+        pinecone_upsert("products")(batch, [[0.1] * 3072])
@@ -0,0 +1,90 @@
+import hashlib
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from backend.utils.local_vector_store import LocalVectorStore
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings, so the tests don't need the OpenAI API.
+    """
+
+    dimension = 64
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+TEXTS = [
+    "Product Adidas Shoes priced at $93.1 rated 2",
+    "Product Converse Shoes priced at $66.5 rated 5",
+    "Product Gucci Bags priced at $450.0 rated 4",
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    """
+    A local vector store with three products written to a temporary directory.
+    """
+    return LocalVectorStore.from_texts(
+        TEXTS,
+        HashEmbeddings(),
+        metadatas=[{"source": f"http://img/{i}.jpg"} for i in range(len(TEXTS))],
+        path=str(tmp_path),
+    )
+
+
+def test_exact_cosine_top_k(store):
+    """
+    Tests that the most similar product is returned first and that k limits the result.
+    """
+    docs = store.similarity_search("Gucci Bags", k=2)
+    assert len(docs) == 2
+    assert docs[0].page_content == TEXTS[2]
+    assert docs[0].metadata == {"source": "http://img/2.jpg"}
+
+
+def test_reopen_existing_index(store):
+    """
+    Tests that an index written to disk is memory-mapped again with the same content.
+    """
+    reopened = LocalVectorStore.from_existing_index(store.path, HashEmbeddings())
+    assert len(reopened) == len(TEXTS)
+    assert reopened.similarity_search("Converse", k=1)[0].page_content == TEXTS[1]
+
+    reopened.add_texts(["Product Nike Shirt priced at $20.0"])
+    assert len(LocalVectorStore.from_existing_index(store.path, HashEmbeddings())) == 4
+
+
+def test_similarity_score_threshold(store):
+    """
+    Tests the retriever built the same way as in setup_conversational_chain.
+    Relevance scores are mapped from cosine similarity like in Pinecone, so a high threshold
+    keeps only the exact match.
+    """
+    retriever = store.as_retriever(
+        search_type="similarity_score_threshold",
+        search_kwargs={"score_threshold": 0.99},
+    )
+    docs = retriever.get_relevant_documents(TEXTS[0])
+    assert [doc.page_content for doc in docs] == [TEXTS[0]]
+
+
+def test_missing_index(tmp_path):
+    """
+    Tests that opening a nonexistent index fails instead of silently returning an empty store.
+    """
+    with pytest.raises(FileNotFoundError):
+        LocalVectorStore.from_existing_index(str(tmp_path / "missing"), HashEmbeddings())
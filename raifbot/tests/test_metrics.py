@@ -0,0 +1,70 @@
+import pytest
+from backend.main import app
+from backend.utils.metrics import Histogram
+from backend.utils.metrics import registry
+from tests.fakes import asgi_stream
+from tests.fakes import fake_backend
+
+
+def test_histogram_exposition():
+    """
+    Tests that buckets are cumulative, that the bounds are inclusive and that label values are escaped.
+    """
+    histogram = Histogram("test_seconds", "Test.", ("tool",), buckets=(0.1, 1))
+    registry.remove(histogram)
+    histogram.observe(0.1, tool='a"b')
+    histogram.observe(0.5, tool='a"b')
+    histogram.observe(2, tool='a"b')
+
+    assert histogram.render().split("\n") == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{tool="a\\"b",le="0.1"} 1',
+        'test_seconds_bucket{tool="a\\"b",le="1.0"} 2',
+        'test_seconds_bucket{tool="a\\"b",le="+Inf"} 3',
+        'test_seconds_sum{tool="a\\"b"} 2.6',
+        'test_seconds_count{tool="a\\"b"} 3',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_chat_stages_are_exposed(tmp_path):
+    """
+    Tests that a streamed chat records every stage and that no stream is left in flight.
+    """
+    with fake_backend(
+        str(tmp_path), tokens_per_second=0, catalog_size=50, fast_path=False
+    ):
+        async with app.router.lifespan_context(app):
+            for question in ["Recommend Nike shoes", "Recommend Gucci bags"]:
+                answer = b"".join(
+                    [
+                        chunk
+                        async for chunk in asgi_stream(
+                            app, "GET", "/chat", body={"text": question}
+                        )
+                    ]
+                )
+                save = asgi_stream(
+                    app,
+                    "POST",
+                    "/save_chat_history/65f1c0c0c0c0c0c0c0c0c0c0",
+                    body=[[question, answer.decode("utf-8")]],
+                )
+                async for _ in save:
+                    pass
+    text = b"".join([chunk async for chunk in asgi_stream(app, "GET", "/metrics")])
+    lines = text.decode("utf-8").split("\n")
+
+    for sample in [
+        'raifbot_http_request_duration_seconds_count{method="GET",route="/chat",status="200"}',
+        'raifbot_http_request_duration_seconds_count{method="POST",route="/save_chat_history/{session_id}",status="200"}',
+        "raifbot_llm_time_to_first_token_seconds_count",
+        'raifbot_tool_duration_seconds_count{tool="product_search"}',
+        "raifbot_retrieval_duration_seconds_count",
+        'raifbot_embedding_duration_seconds_count{operation="query",cache="miss"}',
+        'raifbot_agent_iterations_bucket{le="1.0"}',
+        'raifbot_mongo_operation_duration_seconds_count{operation="update_one"}',
+    ]:
+        assert any(line.startswith(sample + " ") for line in lines), sample
+    assert 'raifbot_streams_in_flight{route="/chat"} 0.0' in lines
@@ -0,0 +1,110 @@
+import pytest
+from langchain.chains import LLMChain
+from langchain.prompts import PromptTemplate
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from backend.utils.callback_handler_agent import AsyncCallbackHandler
+from backend.utils.callback_handler_agent import create_gen
+from backend.utils.query_router import FastPathAgent
+from backend.utils.query_router import QueryRouter
+from tests.fakes import FakeStreamingChatModel
+
+
+class TopicEmbeddings:
+    """
+    Fake embeddings: texts about clothes and texts about science point in different directions.
+    """
+
+    async def aembed_query(self, text):
+        text = text.lower()
+        return [
+            float("outfit" in text or "recommend" in text),
+            float("quantum" in text),
+        ]
+
+    async def aembed_documents(self, texts):
+        return [await self.aembed_query(text) for text in texts]
+
+
+class FixedRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager):
+        return [
+            Document(
+                page_content="Product Adidas Shoes priced at $93.1",
+                metadata={"source": "http://img/1.jpg"},
+            )
+        ]
+
+
+class UnusedAgent:
+    async def acall(self, inputs, callbacks=None, **kwargs):
+        raise AssertionError("The agent is not called for in-domain queries")
+
+
+@pytest.mark.asyncio
+async def test_router_decisions():
+    """
+    Tests that catalog constraints and the centroids select the fast path and web questions the agent.
+    """
+    router = QueryRouter(TopicEmbeddings(), margin=0.1)
+    assert await router.aroute("Adidas shoes under $100") == "rag"
+    assert await router.aroute("Any outfit ideas for a wedding?") == "rag"
+    assert await router.aroute("Explain quantum computing") == "agent"
+    assert await router.aroute("Latest news about Gucci bags") == "agent"
+    assert await router.aroute("Who painted the Mona Lisa?") == "agent"
+    # a brand without a product request is decided by the centroids
+    assert await router.aroute("Is Adidas stock up?") == "agent"
+
+
+class RecordingAgent:
+    def __init__(self):
+        self.inputs = []
+
+    async def acall(self, inputs, callbacks=None, **kwargs):
+        self.inputs.append(inputs)
+        return {**inputs, "output": "The Mona Lisa was painted by Leonardo da Vinci."}
+
+
+@pytest.mark.asyncio
+async def test_follow_up_ignores_constraints_of_the_history():
+    """
+    Tests that an off-topic follow-up of a product turn goes to the agent, although the chat history in the
+    prompt names a brand, a category and a gender.
+    """
+    prompt = (
+        "Chat history:\nUser: Recommend Nike shoes for women\nAssistant: We recommend the Nike Air.\n\n"
+        "Keep in mind the above chat history to answer following input question: Who painted the Mona Lisa?"
+    )
+    agent = RecordingAgent()
+    fast_path = FastPathAgent(
+        agent, FixedRetriever(), None, QueryRouter(TopicEmbeddings())
+    )
+
+    outputs = await fast_path.acall({"input": prompt, "chat_history": []})
+
+    assert outputs["output"].startswith("The Mona Lisa")
+    assert agent.inputs[0]["input"] == prompt
+
+
+@pytest.mark.asyncio
+async def test_fast_path_streams_plain_answer():
+    """
+    Tests that an in-domain query is answered by the chain, streamed as plain text with its sources.
+    """
+    prompt = PromptTemplate(
+        template="Context: {context}\nQuestion:{input}\nAnswer: ",
+        input_variables=["input", "context"],
+    )
+    chain = LLMChain(
+        prompt=prompt, llm=FakeStreamingChatModel(tokens_per_second=0, answer_tokens=5)
+    )
+    agent = FastPathAgent(
+        UnusedAgent(), FixedRetriever(), chain, QueryRouter(TopicEmbeddings())
+    )
+    handler = AsyncCallbackHandler(0.0, flush_bytes=1)
+
+    answer = "".join(
+        [c async for c in create_gen(agent, "Recommend Adidas shoes", handler)]
+    )
+    assert answer == "Based on your requirements we"
+    assert [doc.metadata["source"] for doc in handler.documents] == ["http://img/1.jpg"]
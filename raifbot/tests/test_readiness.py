@@ -0,0 +1,55 @@
+import asyncio
+import json
+import pytest
+from backend.main import app
+from backend.utils.readiness import Readiness
+from backend.utils.readiness import readiness
+from tests.fakes import asgi_stream
+from tests.fakes import fake_backend
+
+
+@pytest.mark.asyncio
+async def test_failed_component_is_reported():
+    """
+    Tests that a failing background initialization keeps the backend unready and records its error.
+    """
+    tracker = Readiness(["chain", "warmup"])
+    with tracker.track("chain"):
+        pass
+
+    async def fail():
+        raise ValueError("no connection")
+
+    await tracker.start("warmup", fail)
+    report = tracker.report()
+
+    assert not report["ready"]
+    assert report["components"]["chain"]["state"] == "ready"
+    assert report["components"]["warmup"]["state"] == "failed"
+    assert report["components"]["warmup"]["error"] == "no connection"
+
+
+@pytest.mark.asyncio
+async def test_ready_after_warm_up(tmp_path):
+    """
+    Tests that /ready succeeds once the background warm-up is done and reports the chain step timings.
+    """
+    with fake_backend(str(tmp_path), catalog_size=50):
+        async with app.router.lifespan_context(app):
+            for _ in range(100):
+                if readiness.is_ready():
+                    break
+                await asyncio.sleep(0.05)
+            body = b"".join(
+                [chunk async for chunk in asgi_stream(app, "GET", "/ready")]
+            )
+
+    report = json.loads(body)
+    assert report["ready"]
+    assert set(report["components"]) == {"chain", "mongo", "warmup"}
+    assert set(report["components"]["chain"]["steps"]) == {
+        "vector_store",
+        "llm",
+        "web_search",
+        "agent",
+    }
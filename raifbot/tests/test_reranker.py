@@ -0,0 +1,59 @@
+from langchain_core.documents import Document
+from backend.utils.catalog import NEGATIVE_SOURCE
+from backend.utils.reranker import Reranker
+
+
+def product(name: str, price: float, ratings: int, click_rate: int, available=True):
+    return Document(
+        page_content=name,
+        metadata={
+            "source": f"http://img/{name}.jpg",
+            "price": price,
+            "ratings": ratings,
+            "click_rate": click_rate,
+            "availability": "Available" if available else "Out of stock",
+        },
+    )
+
+
+def names(docs: list) -> list:
+    return [doc.page_content for doc in docs]
+
+
+def test_business_signals_reorder_similar_products():
+    """
+    Tests that among equally similar products the rating weighs more than the click rate, that unavailable
+    or over budget products fall behind and that only the top k are kept.
+    """
+    candidates = [
+        (product("low_rating", 90, 2, 500), 0.80),
+        (product("high_rating", 90, 5, 100), 0.80),
+        (product("high_rating_clicked", 90, 5, 300), 0.80),
+        (product("out_of_stock", 90, 5, 300, available=False), 0.80),
+        (product("over_budget", 300, 5, 300), 0.80),
+    ]
+    constraints = {"price": {"$lte": 100.0}}
+
+    docs = Reranker(top_k=3).rerank(candidates, constraints)
+    ranking = Reranker(top_k=10).rerank(candidates, constraints)
+
+    assert names(docs) == ["high_rating_clicked", "high_rating", "low_rating"]
+    assert names(ranking)[3:] == ["out_of_stock", "over_budget"]
+
+
+def test_similarity_still_counts():
+    """
+    Tests that an off-topic document without product fields is ranked with average signals by its similarity
+    and that a much more similar product beats a slightly better rated one.
+    """
+    off_topic = Document(page_content="off_topic", metadata={"source": NEGATIVE_SOURCE})
+    candidates = [
+        (product("similar", 90, 4, 200), 0.90),
+        (off_topic, 0.85),
+        (product("dissimilar", 90, 5, 200), 0.10),
+    ]
+
+    docs = Reranker(top_k=3).rerank(candidates, {})
+
+    assert names(docs) == ["similar", "off_topic", "dissimilar"]
+    assert Reranker().rerank([], {}) == []
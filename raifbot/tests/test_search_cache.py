@@ -0,0 +1,66 @@
+import asyncio
+import time
+import pytest
+from backend.utils.search_cache import CachedSearch
+from backend.utils.search_cache import SearchCache
+
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_are_coalesced():
+    """
+    Tests that identical concurrent queries share one search, that the result is cached until its TTL
+    and that failed searches aren't cached.
+    """
+    searched = []
+
+    def search(query):
+        searched.append(query)
+        time.sleep(0.05)
+        if "fail" in query:
+            raise RuntimeError("rate limited")
+        return f"result of {query}"
+
+    cache = SearchCache(ttl=60)
+    cached = CachedSearch(search, cache)
+    results = await asyncio.gather(*(cached.arun("Who won?") for _ in range(5)))
+    assert results == ["result of Who won?"] * 5
+    assert cached.run("who  won") == "result of Who won?"
+    assert searched == ["Who won?"]
+
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 1)
+    assert stats["saved_seconds"] >= 0.05
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await cached.arun("fail")
+    assert searched.count("fail") == 2
+
+    cache.ttl = 0
+    await asyncio.sleep(0.01)
+    await cached.arun("Who won?")
+    assert searched.count("Who won?") == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_search_to_the_others():
+    """
+    Tests that cancelling one of the callers waiting for a coalesced search, e.g. on a client disconnect,
+    neither fails the search nor the other waiters.
+    """
+
+    def search(query):
+        time.sleep(0.05)
+        return f"result of {query}"
+
+    cached = CachedSearch(search, SearchCache(ttl=60))
+    owner = asyncio.create_task(cached.arun("Who won?"))
+    await asyncio.sleep(0.01)
+    waiters = [asyncio.create_task(cached.arun("Who won?")) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    waiters[0].cancel()
+
+    assert await owner == "result of Who won?"
+    assert await waiters[1] == "result of Who won?"
+    with pytest.raises(asyncio.CancelledError):
+        await waiters[0]
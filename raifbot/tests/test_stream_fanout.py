@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from backend.utils.stream_fanout import StreamFanout
+
+
+@pytest.mark.asyncio
+async def test_identical_streams_share_one_run():
+    """
+    Tests that concurrent subscribers of a key share one run, that a late subscriber receives the tokens
+    produced before it joined and that a disconnected subscriber doesn't stop the others.
+    """
+    runs = []
+    release = asyncio.Event()
+
+    async def tokens():
+        runs.append(1)
+        for token in ["a", "b"]:
+            yield token
+        await release.wait()
+        yield "c"
+
+    fanout = StreamFanout()
+
+    async def read(limit=None):
+        items = []
+        gen = fanout.subscribe("key", tokens)
+        async for item in gen:
+            items.append(item)
+            if len(items) == limit:
+                await gen.aclose()
+                break
+        return items
+
+    first = [asyncio.create_task(read()) for _ in range(3)]
+    early = asyncio.create_task(read(limit=1))
+    await asyncio.sleep(0.01)
+    late = asyncio.create_task(read())
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await asyncio.gather(*first, late) == [["a", "b", "c"]] * 4
+    assert await early == ["a"]
+    assert len(runs) == 1
+    assert fanout.stats() == {"runs": 1, "shared": 4, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_is_cancelled():
+    """
+    Tests that the run is cancelled once the last subscriber disconnected and that the next request starts a new one.
+    """
+    cancelled = asyncio.Event()
+
+    async def tokens():
+        try:
+            yield "a"
+            await asyncio.sleep(60)
+        finally:
+            cancelled.set()
+
+    fanout = StreamFanout()
+    gen = fanout.subscribe("key", tokens)
+    assert await gen.__anext__() == "a"
+    await gen.aclose()
+
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert fanout.stats()["in_flight"] == 0
+    gen = fanout.subscribe("key", tokens)
+    assert await gen.__anext__() == "a"
+    await gen.aclose()
+    assert fanout.stats()["runs"] == 2
@@ -0,0 +1,146 @@
+import asyncio
+import io
+import os
+import httpx
+import pytest
+from backend.utils import thumbnail_cache
+from backend.utils.thumbnail_cache import HttpFetcher
+from backend.utils.thumbnail_cache import LocalFetcher
+from backend.utils.thumbnail_cache import ThumbnailCache
+
+
+@pytest.mark.asyncio
+async def test_thumbnail_is_created_once(tmp_path, monkeypatch):
+    """
+    Tests that concurrent requests fetch and resize a missing thumbnail once, that it's served from disk
+    afterwards and that the local fetcher doesn't read outside of its directory.
+    """
+    monkeypatch.setattr(thumbnail_cache, "make_thumbnail", lambda data, w, f: data[:w])
+    (tmp_path / "images" / "400x").mkdir(parents=True)
+    (tmp_path / "images" / "400x" / "a.jpg").write_bytes(b"x" * 1000)
+    fetched = []
+    local = LocalFetcher(str(tmp_path / "images"))
+
+    async def fetch(url):
+        fetched.append(url)
+        await asyncio.sleep(0.01)
+        return await local(url)
+
+    cache = ThumbnailCache(str(tmp_path / "thumbnails"), fetch)
+    url = "http://i.pinimg.com/400x/a.jpg"
+    results = await asyncio.gather(*(cache.get(url, 150) for _ in range(5)))
+    assert {data for _, data in results} == {b"x" * 150}
+    assert fetched == [url]
+
+    cache = ThumbnailCache(str(tmp_path / "thumbnails"), fetch)
+    assert (await cache.get(url, 150))[1] == b"x" * 150
+    assert cache.stats() == {"hits": 1, "misses": 0}
+
+    with pytest.raises(ValueError):
+        await local("http://i.pinimg.com/../../etc/passwd")
+
+
+@pytest.mark.asyncio
+async def test_store_keeps_a_byte_budget(tmp_path, monkeypatch):
+    """
+    Tests that widths are rounded up to the stored widths and that the least recently used thumbnails are
+    deleted above the size budget.
+    """
+    monkeypatch.setattr(thumbnail_cache, "make_thumbnail", lambda data, w, f: data[:w])
+
+    async def fetch(url):
+        return b"x" * 1000
+
+    cache = ThumbnailCache(str(tmp_path), fetch, max_bytes=800)
+    small, _ = await cache.get("http://i.pinimg.com/a.jpg", 150)
+    assert (await cache.get("http://i.pinimg.com/a.jpg", 140))[0] == small
+    medium, _ = await cache.get("http://i.pinimg.com/b.jpg", 300)
+    # a is used again, so b is the least recently used when c exceeds the budget
+    await cache.get("http://i.pinimg.com/a.jpg", 150)
+    large, data = await cache.get("http://i.pinimg.com/c.jpg", 500)
+
+    assert len(data) == 600
+    assert os.path.exists(cache.file(small, "webp"))
+    assert not os.path.exists(cache.file(medium, "webp"))
+    assert os.path.exists(cache.file(large, "webp"))
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_and_evicted_file(tmp_path, monkeypatch):
+    """
+    Tests that cancelling the request which started a thumbnail doesn't fail the requests waiting for it,
+    and that a thumbnail deleted before it's read is created again instead of failing.
+    """
+    monkeypatch.setattr(thumbnail_cache, "make_thumbnail", lambda data, w, f: data[:w])
+    fetched = []
+
+    async def fetch(url):
+        fetched.append(url)
+        await asyncio.sleep(0.02)
+        return b"x" * 1000
+
+    cache = ThumbnailCache(str(tmp_path), fetch)
+    url = "http://i.pinimg.com/a.jpg"
+    owner = asyncio.create_task(cache.get(url, 150))
+    await asyncio.sleep(0.005)
+    waiter = asyncio.create_task(cache.get(url, 150))
+    await asyncio.sleep(0.005)
+    owner.cancel()
+    key, data = await waiter
+    assert data == b"x" * 150
+    with pytest.raises(asyncio.CancelledError):
+        await owner
+
+    read = thumbnail_cache._read
+
+    def evicted(path, touch=False):
+        os.remove(path)
+        return read(path, touch)
+
+    monkeypatch.setattr(thumbnail_cache, "_read", evicted)
+    assert (await cache.get(url, 150))[1] == b"x" * 150
+    assert fetched == [url, url]
+
+
+@pytest.mark.asyncio
+async def test_redirects_are_checked_against_allowed_hosts():
+    """
+    Tests that redirects are followed only to allowed hosts and only a limited number of times.
+    """
+
+    def handler(request):
+        redirects = {
+            "/internal.jpg": "http://169.254.169.254/latest/meta-data/",
+            "/moved.jpg": "/400x/a.jpg",
+            "/loop.jpg": "/loop.jpg",
+        }
+        if request.url.path in redirects:
+            return httpx.Response(
+                302, headers={"location": redirects[request.url.path]}
+            )
+        return httpx.Response(200, content=b"image")
+
+    fetcher = HttpFetcher(("i.pinimg.com",))
+    assert fetcher.client.follow_redirects is False
+    fetcher.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    assert await fetcher("http://i.pinimg.com/moved.jpg") == b"image"
+    with pytest.raises(ValueError):
+        await fetcher("http://i.pinimg.com/internal.jpg")
+    with pytest.raises(ValueError):
+        await fetcher("http://i.pinimg.com/loop.jpg")
+    with pytest.raises(ValueError):
+        await fetcher("file://i.pinimg.com/etc/passwd")
+
+
+def test_make_thumbnail_keeps_aspect_ratio():
+    """
+    Tests that images are downscaled to the requested width and encoded as WebP.
+    """
+    Image = pytest.importorskip("PIL.Image")
+    original = io.BytesIO()
+    Image.new("RGB", (600, 400), "red").save(original, "PNG")
+
+    data = thumbnail_cache.make_thumbnail(original.getvalue(), 150, "webp")
+    with Image.open(io.BytesIO(data)) as thumbnail:
+        assert (thumbnail.format, thumbnail.size) == ("WEBP", (150, 100))